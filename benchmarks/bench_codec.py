@@ -0,0 +1,125 @@
+"""
+Size and speed of the JSON and binary message codecs for every message type the game sends.
+
+Sizes include the 4 byte frame header, since that is what goes on the wire.
+
+Run with: python benchmarks/bench_codec.py
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from shared.framing import HEADER_SIZE
+from shared.protocol import BINARY, JSON
+
+SAMPLE_MESSAGES = {
+    # Same dicts Network.send_* and the server produce.
+    "player": {
+        "object": "player",
+        "id": "7",
+        "position": (-41.83620071411133, 1.0000001192092896, 23.40911293029785),
+        "rotation": 1287.4400024414062,
+        "health": 78,
+        "joined": False,
+        "left": False
+    },
+    "bullet": {
+        "object": "bullet",
+        "position": (-41.2391357421875, 2.8199996948242188, 24.1522274017334),
+        "damage": 17,
+        "direction": 1287.4400024414062,
+        "x_direction": 3.8499999046325684,
+        "speed": 95.0,
+        "tick": 18233,
+        "team": None,
+    },
+    "health_update": {"object": "health_update", "id": "3", "health": 56},
+    "restart": {"object": "restart", "seed": 482913},
+    "join": {
+        "id": "4",
+        "object": "player",
+        "username": "player",
+        "position": (0, 1, 0),
+        "health": 100,
+        "joined": True,
+        "left": False
+    },
+    "leave": {"id": "4", "object": "player", "joined": False, "left": True},
+    "snapshot (10 players)": {
+        "object": "snapshot",
+        "tick": 18233,
+        "players": [{
+            "id": str(i + 1),
+            "position": (i * 7.123456 - 30, 1.0000001192092896, 50 - i * 9.87654),
+            "rotation": i * 37.77,
+            "health": 100 - i * 5
+        } for i in range(10)]
+    },
+    "snapshot delta (2 moved)": {
+        "object": "snapshot",
+        "tick": 18234,
+        "baseline": 18232,
+        "players": [
+            {"id": "2", "position": (-22.87654, 1.0000001192092896, 40.12346)},
+            {"id": "5", "position": (-1.506176, 1.0000001192092896, 10.49384), "rotation": 151.08},
+        ],
+        "removed": []
+    },
+    "welcome (9 players)": {
+        "object": "welcome",
+        "players": [{
+            "id": str(i + 1),
+            "username": f"player{i + 1}",
+            "position": (i * 7.123456 - 30, 1.0000001192092896, 50 - i * 9.87654),
+            "health": 100 - i * 5
+        } for i in range(9)]
+    },
+}
+
+
+def best_rate(func, arg, repeat: int, number: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func(arg)
+        best = min(best, time.perf_counter() - start)
+    return number / best
+
+
+def run(repeat: int, number: int) -> dict:
+    results = {}
+    for name, msg in SAMPLE_MESSAGES.items():
+        row = {}
+        for codec in (JSON, BINARY):
+            payload = codec.encode(msg)
+            row[codec.name] = {
+                "bytes": len(payload) + HEADER_SIZE,
+                "encode_per_sec": best_rate(codec.encode, msg, repeat, number),
+                "decode_per_sec": best_rate(codec.decode, payload, repeat, number),
+            }
+        row["ratio"] = row[JSON.name]["bytes"] / row[BINARY.name]["bytes"]
+        results[name] = row
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--number", type=int, default=20_000, help="encode/decode calls per timing run")
+    parser.add_argument("--repeat", type=int, default=5, help="timing runs, the fastest is reported")
+    args = parser.parse_args(argv)
+
+    results = run(args.repeat, args.number)
+    print(f"{'message':<22}{'json B':>8}{'binary B':>10}{'ratio':>8}{'json enc/s':>14}{'bin enc/s':>12}{'json dec/s':>14}{'bin dec/s':>12}")
+    for name, row in results.items():
+        print(f"{name:<22}{row['json']['bytes']:>8}{row['binary']['bytes']:>10}{row['ratio']:>7.1f}x"
+              f"{row['json']['encode_per_sec']:>14,.0f}{row['binary']['encode_per_sec']:>12,.0f}"
+              f"{row['json']['decode_per_sec']:>14,.0f}{row['binary']['decode_per_sec']:>12,.0f}")
+
+
+if __name__ == "__main__":
+    main()
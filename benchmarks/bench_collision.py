@@ -0,0 +1,152 @@
+"""
+Cost of the segment-vs-AABB tests bullets run every frame.
+
+Bullet.update used to define its slab test as a closure on every call and sweep it over every box in STATIC_AABBS,
+which game/map.py fills from shared/map_layout.py. This compares that pattern with the shared module level test over
+the same boxes, with the wall cell index the server's ProjectileSimulator uses to pick candidate boxes, and, when
+NumPy is installed, with the batched test game/bullets.py runs over every live bullet at once.
+Vectors are plain tuples here, so the numbers leave out ursina's Vec3 overhead.
+
+Run with: python benchmarks/bench_collision.py
+"""
+
+import argparse
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "server")))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "game")))
+
+from shared.ballistics import DEFAULT_SPEED, bullet_direction, segment_hits_box
+from shared.map_layout import FLOOR_BOX, wall_boxes
+from projectiles import ProjectileSimulator
+from bullets import MAX_LIVE, first_hits, np
+
+FRAME_TIME = 1 / 60
+
+
+def bullet_steps(count: int, seed: int) -> list:
+    # One frame of travel for bullets spread over the map at head and chest height
+    rng = random.Random(seed)
+    steps = []
+    for _ in range(count):
+        p0 = (rng.uniform(-75, 75), rng.uniform(0.5, 4.0), rng.uniform(-75, 75))
+        direction = bullet_direction(rng.uniform(0, 360), rng.uniform(-10, 10))
+        p1 = tuple(p + d * DEFAULT_SPEED * FRAME_TIME for p, d in zip(p0, direction))
+        steps.append((p0, p1))
+    return steps
+
+
+def sweep_nested(steps: list, boxes: list) -> int:
+    hits = 0
+    for p0, p1 in steps:
+        # Recreated for every bullet and frame, as in Bullet.update
+        def segment_hits_box(p0, p1, center, size, padding=0.0):
+            tmin, tmax = 0.0, 1.0
+            for axis in (0, 1, 2):
+                d = p1[axis] - p0[axis]
+                o = p0[axis]
+                mn = center[axis] - size[axis] * 0.5 - padding
+                mx = center[axis] + size[axis] * 0.5 + padding
+                if abs(d) < 1e-8:
+                    if o < mn or o > mx:
+                        return None
+                    continue
+                inv_d = 1.0 / d
+                t1 = (mn - o) * inv_d
+                t2 = (mx - o) * inv_d
+                if t1 > t2:
+                    t1, t2 = t2, t1
+                tmin = max(tmin, t1)
+                tmax = min(tmax, t2)
+                if tmin > tmax:
+                    return None
+            return tmin if 0.0 <= tmin <= 1.0 else None
+
+        for center, size in boxes:
+            if segment_hits_box(p0, p1, center, size) is not None:
+                hits += 1
+                break
+    return hits
+
+
+def sweep_shared(steps: list, boxes: list) -> int:
+    hits = 0
+    for p0, p1 in steps:
+        for center, size in boxes:
+            if segment_hits_box(p0, p1, center, size) is not None:
+                hits += 1
+                break
+    return hits
+
+
+def sweep_indexed(steps: list, simulator: ProjectileSimulator) -> int:
+    hits = 0
+    for p0, p1 in steps:
+        if simulator._hit_wall(p0, p1) is not None:
+            hits += 1
+    return hits
+
+
+def sweep_batched(batches: list, low, high) -> int:
+    hits = 0
+    for p0, delta in batches:
+        hits += int(np.count_nonzero(first_hits(p0, delta, low, high) <= 1.0))
+    return hits
+
+
+def run(steps_count: int, repeat: int, seed: int = 1) -> dict:
+    steps = bullet_steps(steps_count, seed)
+    boxes = [FLOOR_BOX] + wall_boxes()
+    simulator = ProjectileSimulator()
+    cases = (
+        ("nested_sweep", lambda: sweep_nested(steps, boxes)),
+        ("shared_sweep", lambda: sweep_shared(steps, boxes)),
+        ("indexed", lambda: sweep_indexed(steps, simulator)),
+    )
+    if np is not None:
+        # As many bullets per call as can be in flight at once
+        starts = np.array([p0 for p0, _ in steps])
+        deltas = np.array([p1 for _, p1 in steps]) - starts
+        batches = [(starts[i:i + MAX_LIVE], deltas[i:i + MAX_LIVE]) for i in range(0, len(steps), MAX_LIVE)]
+        centers = np.array([center for center, _ in boxes])
+        sizes = np.array([size for _, size in boxes])
+        cases += (("batched", lambda: sweep_batched(batches, centers - sizes / 2, centers + sizes / 2)),)
+
+    results = {"boxes": len(boxes)}
+    for name, case in cases:
+        best = math.inf
+        hits = 0
+        for _ in range(repeat):
+            start = time.perf_counter()
+            hits = case()
+            best = min(best, time.perf_counter() - start)
+        results[name] = {
+            "seconds": best,
+            "steps_per_sec": steps_count / best,
+            "hits": hits,
+        }
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--steps", type=int, default=20_000, help="bullet frames to test")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per case, the fastest is reported")
+    parser.add_argument("--seed", type=int, default=1, help="seed for the bullet positions")
+    args = parser.parse_args(argv)
+
+    results = run(args.steps, args.repeat, args.seed)
+    print(f"{args.steps} bullet frames against {results['boxes']} boxes")
+    for name, result in results.items():
+        if name == "boxes":
+            continue
+        print(f"{name:>14}: {result['steps_per_sec']:>12,.0f} frames/s  {result['hits']} hits")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Server fan-out: relaying a bullet to a room and building and queueing one snapshot tick, for growing room sizes.
+
+The GameServer runs its real message handling and snapshot code, but clients write into sockets that accept
+everything at once, so the numbers are the server's CPU cost without kernel or network time.
+
+Run with: python benchmarks/bench_fanout.py
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "server")))
+
+from shared.protocol import CODECS
+from main import Client, GameServer
+from room import Room
+
+
+class SinkSocket:
+    """Stands in for a client socket whose send buffer never fills up."""
+
+    def __init__(self):
+        self.writes = 0
+
+    def send(self, data) -> int:
+        self.writes += 1
+        return len(data)
+
+    def fileno(self) -> int:
+        return -1
+
+    def close(self):
+        pass
+
+
+def make_room(players: int, codec_name: str, seed: int):
+    server = GameServer(stats_interval=0, max_players=players)
+    room = server.rooms["bench"] = Room("bench", players, server.aoi_cell_size, server.aoi_radius)
+    rng = random.Random(seed)
+    codec = CODECS[codec_name]
+    clients = []
+    for index in range(players):
+        player_id = str(index + 1)
+        client = Client(SinkSocket(), player_id, f"bot{index}", codec=codec)
+        client.room = room
+        position = (rng.uniform(-30, 30), 1.0, rng.uniform(-30, 30))
+        room.players.add(player_id, {
+            "username": client.username, "position": position, "rotation": 0, "health": 100, "client": client
+        })
+        room.position_history.add(player_id)
+        server.clients.add(player_id, client)
+        clients.append(client)
+    room.world_changed = True
+    return server, room, clients
+
+
+def writes(clients: list) -> int:
+    return sum(client.conn.writes for client in clients)
+
+
+def relay_bullets(players: int, codec_name: str, number: int, seed: int) -> tuple:
+    server, room, clients = make_room(players, codec_name, seed)
+    shooter = clients[0]
+    msg = {
+        "object": "bullet", "position": room.players[shooter.id]["position"], "damage": 15, "direction": 45.0,
+        "x_direction": 0.0, "speed": 80.0, "tick": 0, "team": None
+    }
+    raw = shooter.codec.encode(msg)
+    # The first tick places everyone on the interest grid that picks the bullet's recipients
+    server.broadcast_snapshot(room)
+    before = writes(clients)
+    start = time.perf_counter()
+    for _ in range(number):
+        server.handle_message(shooter, shooter.codec.decode(raw), raw)
+    elapsed = time.perf_counter() - start
+    return elapsed, writes(clients) - before
+
+
+def snapshot_ticks(players: int, codec_name: str, number: int, seed: int) -> tuple:
+    server, room, clients = make_room(players, codec_name, seed)
+    rng = random.Random(seed)
+    elapsed = 0.0
+    for _ in range(number):
+        # Everyone moved and acknowledged the previous tick, the common case in a busy room
+        for client in clients:
+            x, y, z = room.players[client.id]["position"]
+            room.players[client.id]["position"] = (x + rng.uniform(-0.2, 0.2), y, z + rng.uniform(-0.2, 0.2))
+            client.acked_tick = room.tick
+        room.world_changed = True
+        start = time.perf_counter()
+        server.broadcast_snapshot(room)
+        elapsed += time.perf_counter() - start
+    return elapsed, writes(clients)
+
+
+def run(room_sizes: list, codecs: list, number: int, repeat: int, seed: int = 1) -> dict:
+    results = {}
+    for codec_name in codecs:
+        for players in room_sizes:
+            row = {}
+            for name, case in (("relay", relay_bullets), ("snapshot", snapshot_ticks)):
+                best, sends = min(case(players, codec_name, number, seed) for _ in range(repeat))
+                row[name] = {
+                    "seconds": best,
+                    "per_sec": number / best,
+                    "socket_writes_per_sec": sends / best,
+                }
+            results[f"{codec_name}_{players}"] = row
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--players", type=int, nargs="+", default=[2, 10, 32], help="room sizes to test")
+    parser.add_argument("--codecs", nargs="+", default=["json", "binary"], choices=sorted(CODECS), help="codecs to test")
+    parser.add_argument("--number", type=int, default=2_000, help="messages or ticks per timing run")
+    parser.add_argument("--repeat", type=int, default=3, help="timing runs, the fastest is reported")
+    args = parser.parse_args(argv)
+
+    results = run(args.players, args.codecs, args.number, args.repeat)
+    print(f"{'room':<12}{'relays/s':>12}{'writes/s':>12}{'ticks/s':>12}{'writes/s':>12}")
+    for name, row in results.items():
+        print(f"{name:<12}{row['relay']['per_sec']:>12,.0f}{row['relay']['socket_writes_per_sec']:>12,.0f}"
+              f"{row['snapshot']['per_sec']:>12,.0f}{row['snapshot']['socket_writes_per_sec']:>12,.0f}")
+
+
+if __name__ == "__main__":
+    main()
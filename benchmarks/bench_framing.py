@@ -0,0 +1,102 @@
+"""
+Throughput of length-prefixed framing against the old "slice between the first { and }" receive path.
+
+Both decoders are fed the same stream of player updates in fixed size reads, the way a socket would deliver it
+under load. The old approach decodes at most one message per read, so it also reports how many messages it lost.
+
+Run with: python benchmarks/bench_framing.py
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from shared.framing import FrameDecoder, encode_frame
+
+
+def player_payloads(count: int) -> list:
+    return [json.dumps({
+        "object": "player",
+        "id": str(i % 10 + 1),
+        "position": (i * 0.37 % 150 - 75, 1.0, i * 0.53 % 150 - 75),
+        "rotation": i * 1.7 % 360,
+        "health": 100,
+        "joined": False,
+        "left": False
+    }).encode("utf8") for i in range(count)]
+
+
+def chunked(stream: bytes, read_size: int) -> list:
+    return [stream[i:i + read_size] for i in range(0, len(stream), read_size)]
+
+
+def decode_slicing(reads: list) -> int:
+    decoded = 0
+    for msg in reads:
+        msg_decoded = msg.decode("utf8", errors="replace")
+        try:
+            left_bracket_index = msg_decoded.index("{")
+            right_bracket_index = msg_decoded.index("}") + 1
+            msg_decoded = msg_decoded[left_bracket_index:right_bracket_index]
+            json.loads(msg_decoded)
+        except ValueError:
+            continue
+        decoded += 1
+    return decoded
+
+
+def decode_framed(reads: list) -> int:
+    decoder = FrameDecoder()
+    decoded = 0
+    for msg in reads:
+        for payload in decoder.feed(msg):
+            json.loads(payload)
+            decoded += 1
+    return decoded
+
+
+def run(messages: int, read_size: int, repeat: int) -> dict:
+    payloads = player_payloads(messages)
+    results = {}
+    cases = (
+        ("slicing", decode_slicing, b"".join(payloads)),
+        ("framed", decode_framed, b"".join(encode_frame(p) for p in payloads)),
+    )
+
+    for name, decode, stream in cases:
+        reads = chunked(stream, read_size)
+        best = float("inf")
+        decoded = 0
+        for _ in range(repeat):
+            start = time.perf_counter()
+            decoded = decode(reads)
+            best = min(best, time.perf_counter() - start)
+        results[name] = {
+            "seconds": best,
+            "messages_per_sec": decoded / best,
+            "megabytes_per_sec": len(stream) / best / 1e6,
+            "delivered": decoded / messages,
+        }
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, default=100_000, help="messages in the simulated stream")
+    parser.add_argument("--read-size", type=int, default=2048, help="bytes returned by each simulated recv")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per decoder, the fastest is reported")
+    args = parser.parse_args(argv)
+
+    results = run(args.messages, args.read_size, args.repeat)
+    print(f"{args.messages} player updates, {args.read_size} byte reads")
+    for name, result in results.items():
+        print(f"{name:>8}: {result['messages_per_sec']:>12,.0f} msg/s  {result['megabytes_per_sec']:7.2f} MB/s  "
+              f"delivered {result['delivered']:7.2%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,319 @@
+"""
+Headless load generator: simulated players join a running server, circle around their room on scripted paths and
+shoot at the rates real weapons allow, while the script measures how quickly the server relays their bullets.
+
+Every bot speaks through game/network.py, so this exercises the same wire protocol as the game without ursina.
+Bullets are matched to the shot that caused them by their quantized position and direction, which both codecs
+preserve. Runs are seeded, so two runs against different server versions generate the same traffic.
+
+Run with: python benchmarks/bot_swarm.py --port 8000 --bots 40 --duration 30 --json results.json
+"""
+
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "game")))
+
+from network import Network
+from shared.protocol import quantize_position, quantize_yaw
+from shared.weapons import WEAPON_CLASSES
+
+# Shots older than this are assumed lost and no longer matched.
+SHOT_TIMEOUT = 5.0
+
+
+def shot_key(position, direction) -> tuple:
+    return quantize_position(position) + (quantize_yaw(direction),)
+
+
+def percentile(samples: list, fraction: float) -> float:
+    # Nearest rank on a sorted list
+    if not samples:
+        return None
+    return samples[min(len(samples) - 1, max(0, math.ceil(fraction * len(samples)) - 1))]
+
+
+class RelayTracker:
+    """
+    Send times of every bullet fired by the swarm and the delay until other bots received it.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sent = {}
+        self.latencies = []
+        self.unmatched = 0
+
+    def fired(self, key: tuple, now: float):
+        with self.lock:
+            self.sent[key] = now
+
+    def received(self, key: tuple, now: float):
+        with self.lock:
+            sent_at = self.sent.get(key)
+            if sent_at is None:
+                self.unmatched += 1
+                return
+            self.latencies.append(now - sent_at)
+
+    def prune(self, now: float):
+        with self.lock:
+            self.sent = {key: sent_at for key, sent_at in self.sent.items() if now - sent_at < SHOT_TIMEOUT}
+
+
+class Shot:
+    """The attributes Network.send_bullet reads from a Bullet entity."""
+
+    def __init__(self, position: tuple, direction: float, damage: int, speed: float):
+        self.world_x, self.world_y, self.world_z = position
+        self.direction = direction
+        self.x_direction = 0.0
+        self.damage = damage
+        self.speed = speed
+        self.shooter_team = None
+
+
+class Bot:
+    """
+    One simulated player. It runs around a circle centered on its room and shoots across it, so the other bots in
+    the room are in the line of fire and get its bullets relayed.
+
+    Args:
+        index (int): position of the bot in the swarm
+        network (Network): connected client
+        weapon (str): key into WEAPON_CLASSES
+        rng (random.Random): the bot's own random source
+        tracker (RelayTracker): where shots and receptions are recorded
+    """
+
+    def __init__(self, index: int, network: Network, weapon: str, rng: random.Random, tracker: RelayTracker):
+        self.index = index
+        self.network = network
+        self.id = network.id
+        self.weapon = weapon
+        self.stats = WEAPON_CLASSES[weapon]
+        self.rng = rng
+        self.tracker = tracker
+        self.radius = rng.uniform(6.0, 14.0)
+        self.angular_speed = rng.uniform(0.3, 0.8) * rng.choice((-1, 1))
+        self.phase = rng.uniform(0, 2 * math.pi)
+        self.world_x = self.world_z = 0.0
+        self.world_y = 1.0
+        self.rotation_y = 0.0
+        self.health = 100
+        self.ammo = self.stats["mag_size"]
+        self.next_shot = rng.uniform(0, self.stats["fire_rate"])
+        self.sent = {"player": 0, "bullet": 0, "health_update": 0}
+        self.received = {}
+        self.thread = threading.Thread(target=self.receive_loop, name=f"bot-{index}", daemon=True)
+
+    def move(self, elapsed: float):
+        angle = self.phase + self.angular_speed * elapsed
+        # Positions on a 1 cm grid survive the binary codec unchanged
+        self.world_x = round(self.radius * math.cos(angle), 2)
+        self.world_z = round(self.radius * math.sin(angle), 2)
+        # Face the middle of the circle, so shots cross it
+        self.rotation_y = round(math.degrees(math.atan2(-self.world_x, -self.world_z)) % 360, 2)
+        self.network.send_player(self)
+        self.sent["player"] += 1
+
+    def shoot(self, elapsed: float, now: float):
+        if elapsed < self.next_shot:
+            return
+        if self.ammo == 0:
+            self.ammo = self.stats["mag_size"]
+            self.next_shot = elapsed + self.stats["reload_time"]
+            return
+        position = (self.world_x, round(self.world_y + 1.0, 2), self.world_z)
+        shot = Shot(position, self.rotation_y, self.rng.randint(*self.stats["damage"]), self.stats["speed"])
+        self.tracker.fired(shot_key(position, shot.direction), now)
+        self.network.send_bullet(shot)
+        self.sent["bullet"] += 1
+        self.ammo -= 1
+        self.next_shot = elapsed + self.stats["fire_rate"]
+
+    def receive_loop(self):
+        while True:
+            batch = self.network.receive_messages()
+            if batch is None:
+                return
+            now = time.perf_counter()
+            for msg in batch:
+                kind = msg.get("object")
+                self.received[kind] = self.received.get(kind, 0) + 1
+                if kind == "bullet":
+                    self.tracker.received(shot_key(msg["position"], msg["direction"]), now)
+                elif kind == "health_update" and msg.get("id") == self.id:
+                    # Players report their health back after being hit, like the game used to
+                    self.health = msg["health"]
+                    self.network.send_health(self)
+                    self.sent["health_update"] += 1
+
+    def close(self):
+        for sock in (self.network.client, self.network.udp):
+            if sock is not None:
+                try:
+                    sock.close()
+                except OSError:
+                    pass
+
+
+def run_swarm(args) -> dict:
+    """
+    Connect the swarm, drive it for the configured duration and summarize what happened
+
+    Args:
+        args (argparse.Namespace): parsed command line
+
+    Returns:
+        dict: the report
+    """
+
+    rng = random.Random(args.seed)
+    tracker = RelayTracker()
+    weapons = list(WEAPON_CLASSES)
+    codecs = [args.codec] if args.codec else None
+    bots = []
+    connect_times = []
+    failures = 0
+
+    for index in range(args.bots):
+        room = f"{args.room}-{index // args.room_size}"
+        network = Network(args.host, args.port, f"bot{index}", codecs=codecs, udp=args.udp, room=room,
+                          update_rate=args.update_rate)
+        network.settimeout(args.connect_timeout)
+        started = time.perf_counter()
+        try:
+            network.connect()
+        except OSError as e:
+            failures += 1
+            print(f"Bot {index} could not connect: {e}")
+            continue
+        connect_times.append(time.perf_counter() - started)
+        network.settimeout(None)
+        bot = Bot(index, network, weapons[index % len(weapons)], random.Random(rng.random()), tracker)
+        bot.thread.start()
+        bots.append(bot)
+    print(f"{len(bots)} bots connected, running for {args.duration:.0f}s...")
+
+    interval = 1 / args.update_rate
+    started = time.perf_counter()
+    next_update = started
+    next_prune = started + SHOT_TIMEOUT
+    while True:
+        now = time.perf_counter()
+        elapsed = now - started
+        if elapsed >= args.duration:
+            break
+        for bot in bots:
+            bot.move(elapsed)
+            bot.shoot(elapsed, now)
+            # One write per bot and frame, like the game's update
+            bot.network.flush()
+        if now >= next_prune:
+            tracker.prune(now)
+            next_prune = now + SHOT_TIMEOUT
+        next_update += interval
+        time.sleep(max(0.0, next_update - time.perf_counter()))
+    duration = time.perf_counter() - started
+    # Let bullets that are still in flight arrive before counting
+    time.sleep(0.5)
+    for bot in bots:
+        bot.close()
+
+    sent = {}
+    received = {}
+    for bot in bots:
+        for kind, count in bot.sent.items():
+            sent[kind] = sent.get(kind, 0) + count
+        for kind, count in bot.received.items():
+            received[kind] = received.get(kind, 0) + count
+    latencies = sorted(tracker.latencies)
+    connect_times.sort()
+    return {
+        "config": {
+            "host": args.host,
+            "port": args.port,
+            "bots": args.bots,
+            "room_size": args.room_size,
+            "duration": args.duration,
+            "update_rate": args.update_rate,
+            "codec": args.codec or "negotiated",
+            "udp": args.udp,
+            "seed": args.seed
+        },
+        "machine": {"python": platform.python_version(), "platform": platform.platform()},
+        "connected": len(bots),
+        "connect_failures": failures,
+        "connect_ms": {name: None if value is None else value * 1000 for name, value in (
+            ("p50", percentile(connect_times, 0.5)),
+            ("p99", percentile(connect_times, 0.99)),
+            ("max", connect_times[-1] if connect_times else None)
+        )},
+        "sent_per_second": {kind: count / duration for kind, count in sorted(sent.items())},
+        "received_per_second": {kind: count / duration for kind, count in sorted(received.items())},
+        "relay": {
+            "samples": len(latencies),
+            "unmatched": tracker.unmatched,
+            "latency_ms": {name: None if value is None else value * 1000 for name, value in (
+                ("p50", percentile(latencies, 0.5)),
+                ("p90", percentile(latencies, 0.9)),
+                ("p99", percentile(latencies, 0.99)),
+                ("max", latencies[-1] if latencies else None)
+            )}
+        }
+    }
+
+
+def print_report(report: dict):
+    config = report["config"]
+    print(f"{report['connected']}/{config['bots']} bots in rooms of {config['room_size']}, {config['duration']:.0f}s, "
+          f"codec {config['codec']}, {'UDP' if config['udp'] else 'TCP only'}, seed {config['seed']}")
+    connect = report["connect_ms"]
+    if connect["p50"] is not None:
+        print(f"connect      p50 {connect['p50']:8.1f} ms   p99 {connect['p99']:8.1f} ms   max {connect['max']:8.1f} ms")
+    for direction in ("sent", "received"):
+        rates = report[f"{direction}_per_second"]
+        print(f"{direction:<12} " + ", ".join(f"{kind} {rate:.0f}/s" for kind, rate in rates.items()))
+    relay = report["relay"]
+    latency = relay["latency_ms"]
+    if latency["p50"] is None:
+        print("relay        no bullets were relayed")
+        return
+    print(f"relay        p50 {latency['p50']:8.2f} ms   p90 {latency['p90']:8.2f} ms   p99 {latency['p99']:8.2f} ms   "
+          f"max {latency['max']:8.2f} ms   ({relay['samples']} samples, {relay['unmatched']} unmatched)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1", help="server address")
+    parser.add_argument("--port", type=int, default=8000, help="server port")
+    parser.add_argument("--bots", type=int, default=20, help="simulated players")
+    parser.add_argument("--room-size", type=int, default=8, help="bots per room")
+    parser.add_argument("--room", default="swarm", help="prefix of the room names")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds to run after everyone connected")
+    parser.add_argument("--update-rate", type=float, default=30.0, help="position updates per bot per second")
+    parser.add_argument("--codec", choices=("json", "binary"), default=None, help="force a codec instead of negotiating")
+    parser.add_argument("--no-udp", dest="udp", action="store_false", help="keep all traffic on TCP")
+    parser.add_argument("--connect-timeout", type=float, default=10.0, help="seconds to wait for each handshake")
+    parser.add_argument("--seed", type=int, default=1, help="seed for paths, weapons and damage rolls")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args(argv)
+
+    report = run_swarm(args)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
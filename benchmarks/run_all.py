@@ -0,0 +1,136 @@
+"""
+Run every micro-benchmark and save the results as JSON, optionally flagging regressions against an earlier run.
+
+Covers the codecs on the Network.send_* payloads, framed against "{ }" sliced receiving, server fan-out of bullets
+and snapshots, and the bullet segment-vs-AABB sweeps over the map. Nothing here needs a GPU or a running server.
+
+Run with: python benchmarks/run_all.py --output results.json [--compare baseline.json]
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+
+import bench_codec
+import bench_collision
+import bench_fanout
+import bench_framing
+
+# Work per benchmark for a full run and for --quick, which only checks that everything still runs.
+SIZES = {
+    "full": {"codec": (5, 20_000), "framing": (100_000, 2048, 5), "fanout": ([2, 10, 32], 2_000, 3),
+             "collision": (20_000, 5)},
+    "quick": {"codec": (1, 500), "framing": (2_000, 2048, 1), "fanout": ([2, 10], 50, 1), "collision": (500, 1)},
+}
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(size: str) -> dict:
+    sizes = SIZES[size]
+    return {
+        "codec": bench_codec.run(*sizes["codec"]),
+        "framing": bench_framing.run(*sizes["framing"]),
+        "fanout": bench_fanout.run(sizes["fanout"][0], ["json", "binary"], *sizes["fanout"][1:]),
+        "collision": bench_collision.run(*sizes["collision"]),
+    }
+
+
+def rates(results: dict, prefix: str = "") -> dict:
+    """
+    Flatten the throughput figures of a result tree
+
+    Args:
+        results (dict): nested benchmark results
+        prefix (str): path of the tree within the whole report
+
+    Returns:
+        dict: slash separated path to every value measured per second, where higher is better
+    """
+
+    flat = {}
+    for key, value in results.items():
+        path = f"{prefix}/{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(rates(value, path))
+        elif key.endswith("per_sec") and isinstance(value, (int, float)):
+            flat[path] = value
+    return flat
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> list:
+    """
+    Find throughput figures that dropped since a baseline run
+
+    Args:
+        current (dict): benchmarks of this run
+        baseline (dict): benchmarks of the earlier run
+        tolerance (float): relative drop that is still considered noise
+
+    Returns:
+        list: (path, baseline value, current value) for every regression
+    """
+
+    before = rates(baseline)
+    regressions = []
+    for path, value in rates(current).items():
+        old = before.get(path)
+        if old and value < old * (1 - tolerance):
+            regressions.append((path, old, value))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--output", default="benchmark-results.json", help="file to write the results to")
+    parser.add_argument("--compare", help="results of an earlier run to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="relative slowdown reported as a regression")
+    parser.add_argument("--quick", action="store_true", help="tiny workloads, only checks that everything runs")
+    args = parser.parse_args(argv)
+
+    report = {
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "revision": git_revision(),
+        "machine": {
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "processor": platform.processor() or platform.machine(),
+            "cpus": os.cpu_count(),
+        },
+        "size": "quick" if args.quick else "full",
+        "benchmarks": run("quick" if args.quick else "full"),
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {len(rates(report['benchmarks']))} throughput figures to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline.get("size") != report["size"]:
+            print(f"Baseline is a {baseline.get('size')} run and this is a {report['size']} run")
+        if baseline.get("machine") != report["machine"]:
+            print("Baseline was recorded on a different machine or Python, differences may not mean much")
+        regressions = compare(report["benchmarks"], baseline["benchmarks"], args.tolerance)
+        for path, old, new in regressions:
+            print(f"REGRESSION {path}: {old:,.0f} -> {new:,.0f} ({new / old - 1:+.0%})")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions beyond {args.tolerance:.0%} against {args.compare}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,335 @@
+"""
+Bullets in flight, recycled instead of left behind.
+
+A finished bullet only disables itself, so without reuse every shot fired in a session would stay in the scene. The
+pool hands finished bullets out again for the next shots and never builds more than a fixed number: when all of
+them are in flight, the oldest one is taken for the new shot, which only cuts short a bullet about to expire.
+
+With NumPy installed, BulletSystem goes further and moves every bullet itself: positions, velocities, lifetimes and
+shooters live in arrays, one vectorised step per frame moves them all and tests them against the map and the
+players at once, and the bullet entities are only drawn where the arrays say. Without NumPy the game falls back to
+the pool, whose bullets move themselves one by one.
+"""
+
+import os
+import sys
+from typing import TYPE_CHECKING
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+if TYPE_CHECKING:
+    from bullet import Bullet
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from shared.ballistics import (
+    BODY_OFFSET, BODY_SIZE, BULLET_LIFETIME, HEAD_OFFSET, HEAD_RADII, PLAY_AREA_BOTTOM, PLAY_AREA_HALF_SIZE,
+    PLAY_AREA_TOP
+)
+from shared.map_layout import FLOOR_BOX, wall_boxes
+
+# Bullets built up front.
+POOL_SIZE = 32
+# Most bullets in flight at once, ten players firing rifles for the whole 2 s lifetime need about 170.
+MAX_LIVE = 256
+# Team of a bullet or player in the arrays, 0 for none.
+TEAMS = {"red": 1, "blue": 2}
+# Shooter of a bullet whose shooter is not known, e.g. shots relayed by the server.
+NO_OWNER = -1
+
+
+def create_bullets(factory, max_live: int = MAX_LIVE):
+    """
+    Pick the fastest way to run bullets this installation supports
+
+    Args:
+        factory (callable): builds a new bullet
+        max_live (int): bullets in flight at once
+
+    Returns:
+        BulletSystem or BulletPool: a BulletSystem when NumPy is available, otherwise a BulletPool
+    """
+
+    if np is not None:
+        return BulletSystem(factory, max_live)
+    return BulletPool(factory, max_live=max_live)
+
+
+class BulletPool:
+    """
+    Every bullet the game draws, in flight or waiting to be fired again.
+
+    Args:
+        factory (callable): builds a new bullet
+        size (int): bullets built up front
+        max_live (int): bullets in flight at once, and so bullets ever built
+    """
+
+    def __init__(self, factory, size: int = POOL_SIZE, max_live: int = MAX_LIVE):
+        self.factory = factory
+        self.max_live = max_live
+        # In flight by id(), oldest first
+        self.live = {}
+        self.idle = []
+        # Shots served by a finished bullet, by a new one and by the oldest bullet still in flight
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        for _ in range(min(size, max_live)):
+            bullet = self.factory()
+            bullet.retire()
+            bullet.pool = self
+            self.idle.append(bullet)
+
+    def __len__(self):
+        return len(self.live)
+
+    def spawn(self, *args, owner=None, **kwargs) -> "Bullet":
+        """
+        Fire a bullet, taking the arguments of Bullet.fire
+
+        Args:
+            owner (str): identifier of the player who fired, unused since pooled bullets hit whatever they touch
+
+        Returns:
+            Bullet: the bullet in flight
+        """
+
+        if self.idle:
+            bullet = self.idle.pop()
+            self.hits += 1
+        elif len(self.idle) + len(self.live) < self.max_live:
+            bullet = self.factory()
+            bullet.pool = self
+            self.misses += 1
+        else:
+            bullet = self.live.pop(next(iter(self.live)))
+            self.evictions += 1
+        bullet.fire(*args, **kwargs)
+        self.live[id(bullet)] = bullet
+        return bullet
+
+    def step(self, dt: float, targets=()):
+        # Pooled bullets move themselves in Bullet.update
+        pass
+
+    def release(self, bullet: "Bullet"):
+        # Called by the bullet once it is done; a bullet that was already given back is ignored
+        if self.live.pop(id(bullet), None) is not None:
+            self.idle.append(bullet)
+
+    def stats(self) -> dict:
+        return {
+            "live": len(self.live), "idle": len(self.idle), "hits": self.hits, "misses": self.misses,
+            "evictions": self.evictions
+        }
+
+
+def segment_box_hits(p0, delta, low, high):
+    """
+    Slab test of segments against axis aligned boxes, pair by pair, like segment_hits_box in shared/ballistics.py
+
+    Args:
+        p0 (np.ndarray): (n, 3) segment starts
+        delta (np.ndarray): (n, 3) segment directions, start to end
+        low (np.ndarray): (n, 3) lowest corners of the boxes
+        high (np.ndarray): (n, 3) highest corners of the boxes
+
+    Returns:
+        np.ndarray: (n,) fraction of each segment at its first contact with its box, inf where it misses
+    """
+
+    parallel = np.abs(delta) < 1e-8
+    step = np.where(parallel, 1.0, delta)
+    t1 = (low - p0) / step
+    t2 = (high - p0) / step
+    # Segments parallel to a slab are either inside it for their whole length or miss the box
+    near = np.where(parallel, -np.inf, np.minimum(t1, t2)).max(axis=1)
+    far = np.where(parallel, np.inf, np.maximum(t1, t2)).min(axis=1)
+    outside = (parallel & ((p0 < low) | (p0 > high))).any(axis=1)
+    near = np.maximum(near, 0.0)
+    hit = (near <= np.minimum(far, 1.0)) & ~outside
+    return np.where(hit, near, np.inf)
+
+
+def first_hits(p0, delta, low, high, skip=None):
+    """
+    Where each segment first touches any of the boxes
+
+    Only pairs whose extents overlap on the ground plane get the full slab test, which leaves a handful per
+    segment however many bullets and boxes there are.
+
+    Args:
+        p0 (np.ndarray): (n, 3) segment starts
+        delta (np.ndarray): (n, 3) segment directions, start to end
+        low (np.ndarray): (m, 3) lowest corners of the boxes
+        high (np.ndarray): (m, 3) highest corners of the boxes
+        skip (np.ndarray): (n, m) pairs to leave out, None tests every pair
+
+    Returns:
+        np.ndarray: (n,) fraction of each segment at its first contact, inf where it touches nothing
+    """
+
+    p1 = p0 + delta
+    seg_low = np.minimum(p0, p1)
+    seg_high = np.maximum(p0, p1)
+    candidates = (
+        (seg_low[:, None, 0] <= high[:, 0]) & (seg_high[:, None, 0] >= low[:, 0])
+        & (seg_low[:, None, 2] <= high[:, 2]) & (seg_high[:, None, 2] >= low[:, 2])
+    )
+    if skip is not None:
+        candidates &= ~skip
+    rows, columns = np.nonzero(candidates)
+    result = np.full(len(p0), np.inf)
+    if rows.size:
+        np.minimum.at(result, rows, segment_box_hits(p0[rows], delta[rows], low[columns], high[columns]))
+    return result
+
+
+class BulletSystem:
+    """
+    Every bullet the game draws, simulated in arrays.
+
+    Each slot of the arrays belongs to one bullet entity, built the first time the slot is used and kept for the
+    rest of the session. The entities do not update themselves; step moves all of them.
+
+    Args:
+        factory (callable): builds a new bullet
+        max_live (int): bullets in flight at once, and so bullets ever built
+        boxes (list): static (center, size) boxes bullets stop at, the map and its floor by default
+    """
+
+    def __init__(self, factory, max_live: int = MAX_LIVE, boxes: list = None):
+        self.factory = factory
+        self.max_live = max_live
+        boxes = wall_boxes() + [FLOOR_BOX] if boxes is None else list(boxes)
+        centers = np.array([center for center, _ in boxes], dtype=float).reshape(-1, 3)
+        sizes = np.array([size for _, size in boxes], dtype=float).reshape(-1, 3)
+        self.box_low = centers - sizes / 2
+        self.box_high = centers + sizes / 2
+
+        self.positions = np.zeros((max_live, 3))
+        self.velocities = np.zeros((max_live, 3))
+        self.lifetimes = np.zeros(max_live)
+        self.owners = np.full(max_live, NO_OWNER, dtype=np.int64)
+        self.teams = np.zeros(max_live, dtype=np.int8)
+        self.alive = np.zeros(max_live, dtype=bool)
+        # Order the bullets were fired in, the oldest is replaced when every slot is taken
+        self.fired = np.zeros(max_live, dtype=np.int64)
+        self.shots = 0
+        self.entities = [None] * max_live
+        self.free = list(range(max_live - 1, -1, -1))
+        # Shots served by an entity built before, by a new one and by the oldest bullet still in flight
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return int(np.count_nonzero(self.alive))
+
+    def spawn(self, *args, owner=None, **kwargs) -> "Bullet":
+        """
+        Fire a bullet, taking the arguments of Bullet.fire
+
+        Args:
+            owner (str): identifier of the player who fired, None if not known
+
+        Returns:
+            Bullet: the bullet's entity
+        """
+
+        if self.free:
+            slot = self.free.pop()
+            bullet = self.entities[slot]
+            if bullet is None:
+                bullet = self.entities[slot] = self.factory()
+                self.misses += 1
+            else:
+                self.hits += 1
+        else:
+            slot = int(np.argmin(np.where(self.alive, self.fired, np.iinfo(np.int64).max)))
+            bullet = self.entities[slot]
+            bullet.retire()
+            self.evictions += 1
+        bullet.fire(*args, **kwargs)
+        # Moved by step from now on
+        bullet.ignore = True
+
+        self.positions[slot] = tuple(bullet.world_position)
+        self.velocities[slot] = tuple(bullet.velocity)
+        self.lifetimes[slot] = 0.0
+        self.owners[slot] = int(owner) if owner is not None else NO_OWNER
+        self.teams[slot] = TEAMS.get(bullet.shooter_team, 0)
+        self.alive[slot] = True
+        self.shots += 1
+        self.fired[slot] = self.shots
+        return bullet
+
+    def _target_hits(self, live, p0, delta, targets):
+        # Players as their body box and a box around their head, the shooter and its teammates are skipped
+        ids = np.array([int(player_id) for player_id, _, _ in targets], dtype=np.int64)
+        teams = np.array([TEAMS.get(team, 0) for _, team, _ in targets], dtype=np.int8)
+        positions = np.array([position for _, _, position in targets], dtype=float).reshape(-1, 3)
+        body = positions + BODY_OFFSET
+        head = positions + HEAD_OFFSET
+        low = np.concatenate((body - np.array(BODY_SIZE) / 2, head - HEAD_RADII))
+        high = np.concatenate((body + np.array(BODY_SIZE) / 2, head + HEAD_RADII))
+
+        owners = self.owners[live][:, None]
+        bullet_teams = self.teams[live][:, None]
+        skip = (owners == ids) | ((bullet_teams != 0) & (bullet_teams == teams))
+        return first_hits(p0, delta, low, high, np.concatenate((skip, skip), axis=1))
+
+    def step(self, dt: float, targets=()):
+        """
+        Move every bullet by one frame and retire the ones that hit something, expired or left the play area
+
+        Args:
+            dt (float): the frame time
+            targets (list): (identifier, team, position) of every living player a bullet may hit
+        """
+
+        live = np.flatnonzero(self.alive)
+        if dt <= 0 or not live.size:
+            return
+
+        p0 = self.positions[live]
+        delta = self.velocities[live] * dt
+        t = first_hits(p0, delta, self.box_low, self.box_high)
+        if targets:
+            t = np.minimum(t, self._target_hits(live, p0, delta, targets))
+        hit = t <= 1.0
+        # Hits end the bullet where it touched, the server decides what the shot did
+        p1 = p0 + delta * np.where(hit, t, 1.0)[:, None]
+        self.positions[live] = p1
+        self.lifetimes[live] += dt
+
+        outside = (
+            (np.abs(p1[:, 0]) > PLAY_AREA_HALF_SIZE) | (np.abs(p1[:, 2]) > PLAY_AREA_HALF_SIZE)
+            | (p1[:, 1] < PLAY_AREA_BOTTOM) | (p1[:, 1] > PLAY_AREA_TOP)
+        )
+        done = hit | (self.lifetimes[live] >= BULLET_LIFETIME) | outside
+
+        entities = self.entities
+        for slot, position in zip(live[~done].tolist(), p1[~done].tolist()):
+            entities[slot].position = position
+        if done.any():
+            finished = live[done]
+            self.alive[finished] = False
+            for slot, position, impact in zip(finished.tolist(), p1[done].tolist(), hit[done].tolist()):
+                bullet = entities[slot]
+                bullet.position = position
+                if impact:
+                    bullet._spawn_hit_effect(position)
+                bullet.retire()
+                self.free.append(slot)
+
+    def stats(self) -> dict:
+        built = sum(entity is not None for entity in self.entities)
+        return {
+            "live": len(self), "idle": built - len(self), "hits": self.hits, "misses": self.misses,
+            "evictions": self.evictions
+        }
@@ -0,0 +1,119 @@
+"""
+The other players in the match, by identifier.
+
+Building an enemy creates a handful of entities, a collider and a name tag, and destroying one tears them all down
+again, which shows as a hitch whenever someone joins or leaves. Enemies are therefore built up front and recycled:
+a player leaving hides its enemy and puts it back in the pool, a player joining takes one out and assigns it.
+"""
+
+from collections import deque
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from enemy import Enemy
+
+# Enemies built up front, enough for a full room at the server's default of 10 players.
+POOL_SIZE = 9
+# Hidden enemies kept for reuse, more than that are destroyed once their players leave.
+MAX_IDLE = 32
+
+
+class EnemyRegistry:
+    """
+    Enemies of connected players by identifier, backed by a pool of hidden ones.
+
+    Args:
+        factory (callable): builds a new enemy, hidden until it is assigned a player
+        destroy (callable): tears down an enemy the pool has no room for
+        size (int): enemies built up front
+        max_idle (int): hidden enemies kept for reuse
+    """
+
+    def __init__(self, factory, destroy, size: int = POOL_SIZE, max_idle: int = MAX_IDLE):
+        self.factory = factory
+        self.destroy = destroy
+        self.max_idle = max_idle
+        self.active = {}
+        self.idle = deque()
+        # Joins served from the pool and joins that had to build a new enemy
+        self.hits = 0
+        self.misses = 0
+        for _ in range(size):
+            self.idle.append(self._build())
+
+    def _build(self) -> "Enemy":
+        enemy = self.factory()
+        enemy.release()
+        return enemy
+
+    def __len__(self):
+        return len(self.active)
+
+    def __contains__(self, identifier: str):
+        return identifier in self.active
+
+    def __iter__(self):
+        return iter(self.active.values())
+
+    def get(self, identifier: str):
+        """
+        Find the enemy of a player
+
+        Args:
+            identifier (str): the player's identifier
+
+        Returns:
+            Enemy: the player's enemy, None if the player is not in the match
+        """
+
+        return self.active.get(identifier)
+
+    def spawn(self, identifier: str, username: str, position, team: str = None) -> "Enemy":
+        """
+        Give a player that joined an enemy, from the pool while it has any
+
+        Args:
+            identifier (str): the player's identifier
+            username (str): the player's username
+            position (tuple): x, y, z
+            team (str): the player's team
+
+        Returns:
+            Enemy: the player's enemy
+        """
+
+        # A repeated join replaces the enemy instead of leaving a second one behind
+        self.release(identifier)
+        if self.idle:
+            enemy = self.idle.pop()
+            self.hits += 1
+        else:
+            enemy = self._build()
+            self.misses += 1
+        enemy.assign(position, identifier, username, team)
+        self.active[identifier] = enemy
+        return enemy
+
+    def release(self, identifier: str) -> bool:
+        """
+        Take the enemy of a player that left out of the match
+
+        Args:
+            identifier (str): the player's identifier
+
+        Returns:
+            bool: True if the player had an enemy
+        """
+
+        enemy = self.active.pop(identifier, None)
+        if enemy is None:
+            return False
+        enemy.release()
+        if len(self.idle) < self.max_idle:
+            self.idle.append(enemy)
+        else:
+            self.destroy(enemy)
+        return True
+
+    def stats(self) -> dict:
+        return {"active": len(self.active), "idle": len(self.idle), "hits": self.hits, "misses": self.misses}
@@ -1,5 +1,9 @@
+import time
+
 import ursina
 
+from interpolation import InterpolationBuffer
+
 
 class Enemy(ursina.Entity):
     def __init__(self, position: ursina.Vec3, identifier: str, username: str):
@@ -31,7 +35,12 @@ class Enemy(ursina.Entity):
         self.id = identifier
         self.username = username
         self._death_started = False
+        # Pending end of the death animation, cancelled when the enemy is recycled before it runs
+        self._death_sequence = None
         self.team = getattr(self, "team", None)
+        # Updates from the server, drawn a little in the past so movement stays smooth between them
+        self.motion = InterpolationBuffer()
+        self.motion.push(time.monotonic(), position, 0)
 
     def _build_humanoid(self):
         """Create a simple humanoid silhouette using primitives."""
@@ -128,6 +137,10 @@ class Enemy(ursina.Entity):
             return
 
         self._death_started = False
+        state = self.motion.sample(time.monotonic())
+        if state is not None:
+            self.world_position = ursina.Vec3(*state[0])
+            self.rotation_y = state[1]
         self.color = new_color
         for part in getattr(self, "body_parts", []):
             try:
@@ -150,13 +163,26 @@ class Enemy(ursina.Entity):
             # If animation fails, fall back to instant hide.
             self._finish_death()
             return
-        ursina.invoke(self._finish_death, delay=0.5)
+        self._death_sequence = ursina.invoke(self._finish_death, delay=0.5)
 
     def _finish_death(self):
+        self._death_sequence = None
         self.enabled = False
         self.collision = False
         self.visible = False
 
+    def move_to(self, position, rotation: float, received_at: float):
+        """
+        Queue an update from the server
+
+        Args:
+            position (tuple): x, y, z
+            rotation (float): yaw in degrees
+            received_at (float): time.monotonic() when the update arrived
+        """
+
+        self.motion.push(received_at, position, rotation)
+
     def reset_state(self):
         """Restore default appearance and state after being revived."""
         self._death_started = False
@@ -175,3 +201,44 @@ class Enemy(ursina.Entity):
                     part.color = base_color
             except Exception:
                 pass
+
+    def assign(self, position, identifier: str, username: str, team: str = None):
+        """
+        Turn a pooled enemy into the given player, as if it was just built for it
+
+        Args:
+            position (tuple): x, y, z
+            identifier (str): unique identifier of the player
+            username (str): username shown above the enemy
+            team (str): the player's team, None outside of team matches
+        """
+
+        self.id = identifier
+        if username != self.username:
+            self.username = username
+            self.name_tag.text = username
+        self.team = team
+        self.health = 100
+        self.motion.clear()
+        self.motion.push(time.monotonic(), position, 0)
+        self.world_position = ursina.Vec3(*position)
+        self.reset_state()
+
+    def release(self):
+        """Hide the enemy and stop whatever it was doing, so it can wait in the pool for the next player."""
+        if self._death_sequence is not None:
+            try:
+                self._death_sequence.kill()
+            except Exception:
+                pass
+            self._death_sequence = None
+        for animation in list(getattr(self, "animations", ())):
+            try:
+                animation.kill()
+            except Exception:
+                pass
+        self.id = None
+        self.motion.clear()
+        self.enabled = False
+        self.collision = False
+        self.visible = False
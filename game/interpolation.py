@@ -0,0 +1,135 @@
+"""
+Smooth movement of remote players from the updates the server sends at its tick rate.
+
+Each update is stored with the time it arrived and players are drawn a fixed delay in the past, between the two
+updates around that moment. As long as the delay covers a couple of ticks there is always an update on both sides,
+so movement looks continuous whatever the tick rate. When updates are late the last movement is continued for a
+short while and then eased back to where the player was last seen: the server sends nothing for players that stand
+still, so a pause in updates usually means the player stopped.
+"""
+
+import os
+import sys
+from collections import deque
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+# The server rewinds shots by the same delay, so it is shared with it
+from shared.snapshot import INTERPOLATION_DELAY
+# Seconds the last movement is continued when updates stop coming, it is taken back over the same time after that.
+MAX_EXTRAPOLATION = 0.1
+# Moving further than this between two updates is a respawn or teleport, drawn as a jump.
+SNAP_DISTANCE = 10.0
+BUFFER_SIZE = 32
+# Weight of each new gap in the estimate of the time between updates.
+INTERVAL_GAIN = 0.1
+
+
+def lerp_angle(start: float, end: float, t: float) -> float:
+    """
+    Interpolate between two angles in degrees along the shorter way around
+
+    Args:
+        start (float): angle at t = 0
+        end (float): angle at t = 1
+        t (float): position between them, above 1 extrapolates
+
+    Returns:
+        float: the interpolated angle
+    """
+
+    delta = (end - start + 180) % 360 - 180
+    return start + delta * t
+
+
+class InterpolationBuffer:
+    """
+    Recent positions and rotations of one remote player.
+
+    Args:
+        delay (float): seconds behind the latest update the player is drawn
+        max_extrapolation (float): seconds the last movement is continued when updates are late
+        snap_distance (float): distance between two updates above which the player jumps instead of moving
+        size (int): updates kept
+    """
+
+    def __init__(self, delay: float = INTERPOLATION_DELAY, max_extrapolation: float = MAX_EXTRAPOLATION,
+                 snap_distance: float = SNAP_DISTANCE, size: int = BUFFER_SIZE):
+        self.delay = delay
+        self.max_extrapolation = max_extrapolation
+        self.snap_distance = snap_distance
+        self.samples = deque(maxlen=size)
+        # Usual time between updates while the player moves
+        self.interval = delay / 2
+
+    def __len__(self):
+        return len(self.samples)
+
+    def clear(self):
+        self.samples.clear()
+
+    def push(self, now: float, position, rotation: float):
+        """
+        Store an update
+
+        Args:
+            now (float): arrival time from time.monotonic()
+            position (tuple): x, y, z
+            rotation (float): yaw in degrees
+        """
+
+        position = tuple(position)
+        if self.samples:
+            last_time, last_position, last_rotation = self.samples[-1]
+            gap = now - last_time
+            if gap <= 0:
+                # Updates that arrived in the same read carry no movement between them, keep only the newest
+                self.samples.pop()
+            elif sum((a - b) ** 2 for a, b in zip(position, last_position)) > self.snap_distance ** 2:
+                self.samples.clear()
+            elif gap > 2 * self.delay:
+                # Longer than a lost update or two: the player stood still until about one update ago
+                self.samples.append((now - self.interval, last_position, last_rotation))
+            elif gap <= self.delay:
+                self.interval += (gap - self.interval) * INTERVAL_GAIN
+        self.samples.append((now, position, rotation))
+
+    def sample(self, now: float):
+        """
+        Where the player is drawn at a moment
+
+        Args:
+            now (float): current time from time.monotonic()
+
+        Returns:
+            tuple: position and rotation, or None before the first update
+        """
+
+        samples = self.samples
+        if not samples:
+            return None
+        render_time = now - self.delay
+
+        # Updates older than the one right before the render time are never needed again
+        while len(samples) > 2 and samples[1][0] <= render_time:
+            samples.popleft()
+
+        first_time, first_position, first_rotation = samples[0]
+        if render_time <= first_time or len(samples) == 1:
+            return first_position, first_rotation
+
+        if render_time <= samples[1][0]:
+            start, end = samples[0], samples[1]
+        else:
+            # Past the newest update: continue the last movement for a while, then ease back to the newest update
+            start, end = samples[-2], samples[-1]
+            late = render_time - end[0]
+            if late > self.max_extrapolation:
+                late = max(0.0, 2 * self.max_extrapolation - late)
+            render_time = end[0] + late
+
+        start_time, start_position, start_rotation = start
+        end_time, end_position, end_rotation = end
+        t = (render_time - start_time) / (end_time - start_time)
+        position = tuple(a + (b - a) * t for a, b in zip(start_position, end_position))
+        return position, lerp_angle(start_rotation, end_rotation, t)
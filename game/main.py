@@ -15,12 +15,21 @@ from floor import Floor
 from map import Map
 from player import Player
 from enemy import Enemy
+from enemies import EnemyRegistry
 from bullet import Bullet
+from bullets import create_bullets
+from prediction import MovementPredictor
 from ursina import Button, invoke
+from shared.ballistics import assign_team
+from shared.map_layout import spawn_position
+from shared.movement import MovementModel
 
 
 server_process = None
 incoming_events = queue.SimpleQueue()
+# Written by the receive thread and the render thread respectively, see receive_stats
+events_received = 0
+events_handled = 0
 server_stopped = False
 connected_players = set()
 game_mode = "ffa"
@@ -71,17 +80,8 @@ def ensure_server_running(port: int) -> bool:
     return False
 
 
-def assign_team(player_id) -> str:
-    """Deterministic team assignment based on player id for TDM."""
-    try:
-        pid = int(player_id)
-    except Exception:
-        pid = 0
-    return "blue" if pid % 2 == 0 else "red"
-
-
-def prompt_connection_details(default_username="player", default_ip="127.0.0.1", default_port="8000", error_text=""):
-    """Tkinter modal to collect username, IP, and port with defaults."""
+def prompt_connection_details(default_username="player", default_ip="127.0.0.1", default_port="8000", error_text="", default_room=""):
+    """Tkinter modal to collect username, IP, port and room with defaults."""
     result = {}
 
     def detect_host_ip(default="127.0.0.1"):
@@ -101,7 +101,7 @@ def prompt_connection_details(default_username="player", default_ip="127.0.0.1",
 
     root = tk.Tk()
     root.title("Ursina FPS - Connect")
-    root.geometry("360x200")
+    root.geometry("360x230")
     root.resizable(False, False)
 
     tk.Label(root, text="Username").grid(row=0, column=0, padx=10, pady=(10, 2), sticky="w")
@@ -116,10 +116,14 @@ def prompt_connection_details(default_username="player", default_ip="127.0.0.1",
     port_var = tk.StringVar(value=default_port)
     tk.Entry(root, textvariable=port_var, width=24).grid(row=2, column=1, padx=10, pady=2)
 
+    tk.Label(root, text="Room").grid(row=3, column=0, padx=10, pady=2, sticky="w")
+    room_var = tk.StringVar(value=default_room)
+    tk.Entry(root, textvariable=room_var, width=24).grid(row=3, column=1, padx=10, pady=2)
+
     mode_var = tk.StringVar(value="join")
-    tk.Label(root, text="Mode").grid(row=3, column=0, padx=10, pady=(4, 2), sticky="w")
+    tk.Label(root, text="Mode").grid(row=4, column=0, padx=10, pady=(4, 2), sticky="w")
     mode_frame = tk.Frame(root)
-    mode_frame.grid(row=3, column=1, padx=10, pady=(4, 2), sticky="w")
+    mode_frame.grid(row=4, column=1, padx=10, pady=(4, 2), sticky="w")
     tk.Radiobutton(mode_frame, text="Join", variable=mode_var, value="join").pack(side="left")
     tk.Radiobutton(mode_frame, text="Host", variable=mode_var, value="host").pack(side="left")
 
@@ -128,14 +132,14 @@ def prompt_connection_details(default_username="player", default_ip="127.0.0.1",
 
     error_label = tk.Label(root, text=error_text, fg="red")
     if error_text:
-        error_label.grid(row=3, column=0, columnspan=2, padx=10, pady=(4, 2))
+        error_label.grid(row=4, column=0, columnspan=2, padx=10, pady=(4, 2))
 
     def update_host_hint():
         if mode_var.get() == "host":
             ip_to_share = detect_host_ip(default_ip)
             port_to_share = port_var.get().strip() or default_port
             host_ip_text.set(f"Share this IP: {ip_to_share}:{port_to_share}")
-            host_ip_label.grid(row=4, column=0, columnspan=2, padx=10, pady=(2, 2))
+            host_ip_label.grid(row=5, column=0, columnspan=2, padx=10, pady=(2, 2))
         else:
             host_ip_text.set("")
             host_ip_label.grid_remove()
@@ -148,20 +152,21 @@ def prompt_connection_details(default_username="player", default_ip="127.0.0.1",
             port_num = int(port_str)
         except ValueError:
             error_label.config(text="Port must be a number.")
-            error_label.grid(row=3, column=0, columnspan=2, padx=10, pady=(4, 2))
+            error_label.grid(row=4, column=0, columnspan=2, padx=10, pady=(4, 2))
             return
         result["username"] = username
         result["ip"] = ip
         result["port"] = port_num
         result["mode"] = mode_var.get()
+        result["room"] = room_var.get().strip()
         root.destroy()
 
     def cancel():
         root.destroy()
         sys.exit(0)
 
-    tk.Button(root, text="Connect", command=submit, width=12).grid(row=5, column=0, padx=10, pady=10, sticky="e")
-    tk.Button(root, text="Quit", command=cancel, width=12).grid(row=5, column=1, padx=10, pady=10, sticky="w")
+    tk.Button(root, text="Connect", command=submit, width=12).grid(row=6, column=0, padx=10, pady=10, sticky="e")
+    tk.Button(root, text="Quit", command=cancel, width=12).grid(row=6, column=1, padx=10, pady=10, sticky="w")
     root.bind("<Return>", lambda event: submit())
     root.protocol("WM_DELETE_WINDOW", cancel)
     port_var.trace_add("write", lambda *args: update_host_hint())
@@ -184,24 +189,27 @@ def get_network():
     username = "player"
     server_addr = "127.0.0.1"
     server_port = 8000
+    room = ""
     while True:
-        details = prompt_connection_details(username, server_addr, str(server_port))
+        details = prompt_connection_details(username, server_addr, str(server_port), default_room=room)
         username = details.get("username", username)
         server_addr = details.get("ip", server_addr)
         server_port = details.get("port", server_port)
         mode = details.get("mode", "join")
+        room = details.get("room", room)
 
         if mode == "host" and not ensure_server_running(server_port):
             continue
 
-        n = Network(server_addr, server_port, username)
+        n = Network(server_addr, server_port, username, room=room or None)
         n.settimeout(5)
         error_message = ""
 
         try:
             n.connect()
-        except ConnectionRefusedError:
-            error_message = "Connection refused. Is the server running?"
+        except ConnectionRefusedError as e:
+            # Refusals by the server itself carry a reason, socket level ones an errno
+            error_message = "Connection refused. Is the server running?" if e.errno else str(e)
         except socket.timeout:
             error_message = "Server timed out. Try again."
         except socket.gaierror:
@@ -241,9 +249,14 @@ try:
     player.set_team(player_team)
 except Exception:
     player.team = player_team
+if n.server_movement:
+    # The server moves the player by its inputs, the same movement predicts them here until the server confirms
+    player.predictor = MovementPredictor(MovementModel(), tuple(player.world_position), n.codec)
+    player.network = n
 prev_pos = player.world_position
 prev_dir = player.world_rotation_y
-enemies = []
+enemies = EnemyRegistry(lambda: Enemy(ursina.Vec3(0, 0, 0), None, ""), ursina.destroy)
+bullets = create_bullets(lambda: Bullet(ursina.Vec3(0, 0, 0), 0, 0, n))
 paused = False
 pause_ui = None
 lobby_ui = None
@@ -253,21 +266,17 @@ score_ui = ursina.Text(parent=ursina.camera.ui, text="", origin=(0, 0), position
 lobby_scroll_container = None
 
 
-def random_spawn(seed=None):
-    rng = random.Random()
-    if seed is not None:
-        rng.seed(seed)
-    return ursina.Vec3(rng.randint(-60, 60), 1, rng.randint(-60, 60))
-
 def restart_round(seed=None, is_local=False):
     global paused, prev_pos, prev_dir, team_scores
 
     if seed is None:
         seed = random.randint(1, 1_000_000)
-    # Deterministic per-player spawn using seed and player id to reduce overlap.
-    per_player_seed = f"{seed}-{n.id}"
-    spawn = random_spawn(per_player_seed)
+    # Deterministic per-player spawn using seed and player id to reduce overlap; the server derives the same one.
+    spawn = ursina.Vec3(*spawn_position(seed, n.id))
 
+    # Inform server/others when triggered locally, before the respawn reports where we reappear.
+    if is_local:
+        n.send_restart(seed)
     player.respawn(spawn)
     try:
         player._scored_death = False
@@ -296,9 +305,8 @@ def restart_round(seed=None, is_local=False):
 
     hide_pause()
 
-    # Inform server/others when triggered locally.
-    if is_local:
-        n.send_restart(seed)
+    if is_local and player.predictor is None:
+        # A predicted player already told the server where it respawned
         n.send_player(player)
 
 
@@ -376,55 +384,68 @@ def show_victory(winning_team: str):
 
 
 def receive():
+    global events_received
+    # Everything that arrived in one read goes to the render thread as one batch
     while True:
-        try:
-            info = n.receive_info()
-        except Exception as e:
-            print(e)
-            continue
-
-        if not info:
-            incoming_events.put({"object": "server_stopped"})
+        batch = n.receive_messages()
+        if batch is None:
+            incoming_events.put((time.monotonic(), [{"object": "server_stopped"}]))
             break
+        events_received += len(batch)
+        # Remote players are drawn relative to when their updates arrived, not when the render thread got to them
+        incoming_events.put((time.monotonic(), batch))
+
 
-        incoming_events.put(info)
+def receive_stats() -> dict:
+    """Counters of the receive pipeline; backlog is how many events the render thread has not handled yet."""
+    return {
+        "reads": n.reads,
+        "messages": n.messages_received,
+        "bytes": n.bytes_received,
+        "malformed": n.malformed_messages,
+        "events": events_received,
+        "handled": events_handled,
+        "backlog": events_received - events_handled,
+    }
 
 
-def handle_info(info):
+def handle_info(info, received_at: float = None):
     global server_stopped, tdm_victory_announced
+    received_at = time.monotonic() if received_at is None else received_at
 
     if info["object"] == "player":
         enemy_id = info["id"]
 
         if info["joined"]:
-            new_enemy = Enemy(ursina.Vec3(*info["position"]), enemy_id, info["username"])
+            new_enemy = enemies.spawn(enemy_id, info["username"], info["position"], assign_team(enemy_id))
             new_enemy.health = info["health"]
-            new_enemy.team = assign_team(enemy_id)
-            enemies.append(new_enemy)
             connected_players.add(enemy_id)
             update_lobby_status_text()
             return
 
-        enemy = None
-
-        for e in enemies:
-            if e.id == enemy_id:
-                enemy = e
-                break
+        enemy = enemies.get(enemy_id)
 
         if not enemy:
             return
 
         if info["left"]:
-            enemies.remove(enemy)
-            ursina.destroy(enemy)
+            enemies.release(enemy_id)
             if enemy_id in connected_players:
                 connected_players.discard(enemy_id)
                 update_lobby_status_text()
             return
 
-        enemy.world_position = ursina.Vec3(*info["position"])
-        enemy.rotation_y = info["rotation"]
+        enemy.move_to(info["position"], info["rotation"], received_at)
+
+    elif info["object"] == "snapshot":
+        # One message per server tick carrying every player's latest state; our own entry is not an enemy.
+        for state in info["players"]:
+            enemy = enemies.get(state["id"])
+            if enemy is not None:
+                enemy.move_to(state["position"], state["rotation"], received_at)
+
+    elif info["object"] == "moved":
+        player.reconcile(info)
 
     elif info["object"] == "bullet":
         b_pos = ursina.Vec3(*info["position"])
@@ -432,7 +453,7 @@ def handle_info(info):
         b_x_dir = info["x_direction"]
         b_damage = info["damage"]
         b_speed = info.get("speed", 80.0)
-        Bullet(b_pos, b_dir, b_x_dir, n, b_damage, slave=True, speed=b_speed)
+        bullets.spawn(b_pos, b_dir, b_x_dir, n, b_damage, slave=True, speed=b_speed)
         try:
             player.play_shoot_sound_at(b_pos)
         except Exception:
@@ -441,15 +462,7 @@ def handle_info(info):
     elif info["object"] == "health_update":
         enemy_id = info["id"]
 
-        enemy = None
-
-        if enemy_id == n.id:
-            enemy = player
-        else:
-            for e in enemies:
-                if e.id == enemy_id:
-                    enemy = e
-                    break
+        enemy = player if enemy_id == n.id else enemies.get(enemy_id)
 
         if not enemy:
             return
@@ -664,7 +677,7 @@ def fire_player_bullet():
     damage = player.get_bullet_damage()
     bullet_speed = getattr(player, "get_bullet_speed", lambda: 80.0)()
     shooter_team = player.get_team() if hasattr(player, "get_team") and game_mode == "tdm" else None
-    bullet = Bullet(b_pos, player.world_rotation_y, -player.camera_pivot.world_rotation_x, n, damage=damage, speed=bullet_speed, shooter_team=shooter_team)
+    bullet = bullets.spawn(b_pos, player.world_rotation_y, -player.camera_pivot.world_rotation_x, n, damage=damage, speed=bullet_speed, shooter_team=shooter_team, owner=n.id)
     n.send_bullet(bullet)
     player.record_shot()
     player.play_shoot_sound()
@@ -674,23 +687,45 @@ def fire_player_bullet():
 
 
 def update():
-    while not incoming_events.empty():
+    global events_handled
+    while True:
         try:
-            info = incoming_events.get_nowait()
-        except Exception:
+            received_at, batch = incoming_events.get_nowait()
+        except queue.Empty:
             break
-        handle_info(info)
+        for info in batch:
+            handle_info(info, received_at)
+        events_handled += len(batch)
 
-    if in_lobby:
-        return
+    bullets.step(ursina.time.dt, bullet_targets())
+
+    if not in_lobby:
+        update_player()
 
+    # Everything queued this frame leaves in one write, player state at the network's update rate
+    n.flush()
+
+
+def bullet_targets() -> list:
+    # Players bullets stop at, dead ones have no collider
+    targets = [(e.id, e.team, tuple(e.world_position)) for e in enemies if e.health > 0]
+    if player.health > 0:
+        targets.append((n.id, getattr(player, "team", None), tuple(player.world_position)))
+    return targets
+
+
+def update_player():
     if player.health > 0:
         global prev_pos, prev_dir
 
         if not paused and player.trigger_held and getattr(player, "auto_fire", False) and player.can_fire():
             fire_player_bullet()
 
-        if prev_pos != player.world_position or prev_dir != player.world_rotation_y:
+        if player.predictor is not None:
+            for command in player.commands:
+                n.send_input(command)
+            player.commands.clear()
+        elif prev_pos != player.world_position or prev_dir != player.world_rotation_y:
             n.send_player(player)
 
         prev_pos = player.world_position
@@ -725,6 +760,12 @@ def input(key):
         toggle_pause()
         return
 
+    if key == "f3":
+        print(", ".join(f"{name} {value}" for name, value in receive_stats().items()))
+        print("enemies " + ", ".join(f"{name} {value}" for name, value in enemies.stats().items()))
+        print("bullets " + ", ".join(f"{name} {value}" for name, value in bullets.stats().items()))
+        return
+
     if paused:
         return
 
@@ -1,9 +1,28 @@
+import os
+import sys
 import socket
+import select
 import json
+import threading
+import time
+from collections import deque
+from typing import TYPE_CHECKING
 
-from player import Player
-from enemy import Enemy
-from bullet import Bullet
+if TYPE_CHECKING:
+    # Only for annotations, so headless tools can use this module without ursina
+    from player import Player
+    from enemy import Enemy
+    from bullet import Bullet
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from shared.datagram import MAX_PAYLOAD_SIZE, decode_datagram, encode_datagram
+from shared.framing import HEADER_SIZE, FrameDecoder, encode_frame, recv_frame
+from shared.protocol import CODECS, JSON, choose_codec
+from shared.snapshot import SnapshotReceiver
+
+# Player state samples sent per second, however fast the game renders.
+UPDATE_RATE = 30.0
 
 
 class Network:
@@ -14,48 +33,282 @@ class Network:
         server_addr (str): IPv4 address of the server
         server_port (int): Port at which server is running
         username (str): Username of this client's player
+        codecs (list): Message codecs to offer the server, in order of preference
+        udp (bool): Send position updates over UDP when the server offers it
+        room (str): Room to join or create on the server, the server's default room if None
+        update_rate (float): Player state samples sent per second, 0 sends one on every flush
     """
 
-    def __init__(self, server_addr: str, server_port: int, username: str):
+    def __init__(self, server_addr: str, server_port: int, username: str, codecs=None, udp: bool = True, room: str = None,
+                 update_rate: float = UPDATE_RATE):
         self.client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        # Everything is batched per frame already, Nagle would only hold the batch back for the previous one's ACK
+        self.client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
         self.addr = server_addr
         self.port = server_port
         self.username = username
-        self.recv_size = 2048
+        self.room = room
+        self.decoder = FrameDecoder()
+        self.pending = deque()
+        # Decoded messages not handed out yet by receive_info
+        self.inbox = deque()
+        self.codecs = codecs
+        self.codec = JSON
+        self.snapshots = SnapshotReceiver()
+        # The receive thread acknowledges snapshots while the game thread sends updates.
+        self.send_lock = threading.Lock()
+        # Frames queued since the last flush, written together in one call
+        self.outgoing = []
+        # Latest player state not sent yet, each sample replaces the previous one
+        self.state = None
+        self.state_interval = 1 / update_rate if update_rate > 0 else 0.0
+        self.next_state_time = 0.0
+        self.use_udp = udp
+        self.udp = None
+        self.udp_token = 0
+        self.udp_ready = False
+        self.udp_sequence = 0
         self.id = 0
+        # Whether the server moves the player by its input commands, see game/prediction.py
+        self.server_movement = False
+        # Receive counters, only updated by the thread that receives
+        self.reads = 0
+        self.messages_received = 0
+        self.bytes_received = 0
+        self.malformed_messages = 0
 
     def settimeout(self, value):
         self.client.settimeout(value)
 
     def connect(self):
         """
-        Connect to the server and get a unique identifier
+        Connect to the server, get a unique identifier and agree on the message codec
         """
 
         self.client.connect((self.addr, self.port))
-        self.id = self.client.recv(self.recv_size).decode("utf8")
-        self.client.send(self.username.encode("utf8"))
+        handshake = []
+        while True:
+            hello = handshake.pop(0) if handshake else recv_frame(self.client, self.decoder, handshake)
+            if hello is None:
+                raise ConnectionRefusedError("Server closed the connection during the handshake")
+            try:
+                hello_json = json.loads(hello)
+            except ValueError:
+                hello_json = None
+            # A full server holds the connection in its admission queue until a slot frees up
+            if not isinstance(hello_json, dict) or hello_json.get("object") != "queued":
+                break
+            print(f"Server is full, waiting in queue at position {hello_json['position']}...")
+            self.client.settimeout(None)
+        if not isinstance(hello_json, dict):
+            # Older servers send the bare identifier and expect the bare username back.
+            self.id = hello.decode("utf8")
+            self.pending.extend(handshake)
+            self.client.sendall(encode_frame(self.username.encode("utf8")))
+            return
 
-    def receive_info(self):
+        self.id = hello_json["id"]
+        self.server_movement = hello_json.get("movement") == "server"
+        offered = [name for name in hello_json.get("codecs", ()) if self.codecs is None or name in self.codecs]
+        self.codec = CODECS[choose_codec(offered)]
+        join = {"object": "join", "username": self.username, "codec": self.codec.name}
+        if self.room:
+            join["room"] = self.room
+        self.client.sendall(encode_frame(JSON.encode(join)))
+
+        if "rooms" in hello_json:
+            # Servers hosting rooms confirm which one we ended up in, or say why we can not join
+            while True:
+                reply = handshake.pop(0) if handshake else recv_frame(self.client, self.decoder, handshake)
+                reply_json = json.loads(reply) if reply is not None else {"object": "rejected", "reason": "connection closed"}
+                # A full room keeps us in its queue until someone in it leaves
+                if reply_json.get("object") != "queued":
+                    break
+                print(f"Room {reply_json.get('room')} is full, waiting in queue at position {reply_json['position']}...")
+                self.client.settimeout(None)
+            if reply_json.get("object") == "rejected":
+                raise ConnectionRefusedError(f"Server rejected the connection: {reply_json.get('reason')}")
+            self.room = reply_json.get("name", self.room)
+            # Servers running several worker processes only know the UDP port once the room is picked
+            if reply_json.get("udp"):
+                hello_json["udp"] = reply_json["udp"]
+                hello_json["token"] = reply_json["token"]
+        self.pending.extend(handshake)
+
+        if self.use_udp and hello_json.get("udp"):
+            self.udp_token = hello_json["token"]
+            self.udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.udp.connect((self.addr, hello_json["udp"]))
+            self._send_datagram(b"")
+
+    def _receive(self) -> bool:
+        # Wait on both channels; returns False once the TCP connection is closed or broken
         try:
-            msg = self.client.recv(self.recv_size)
-        except socket.error as e:
-            print(e)
+            if self.udp is not None:
+                readable = select.select([self.client, self.udp], [], [])[0]
+            else:
+                readable = [self.client]
+
+            if self.udp in readable:
+                try:
+                    data = self.udp.recv(65535)
+                    _, token, _, payload = decode_datagram(data)
+                except (OSError, ValueError):
+                    payload = None
+                else:
+                    self.bytes_received += len(data)
+                    if token != self.udp_token:
+                        payload = None
+                if payload:
+                    self.pending.append(payload)
+
+            if self.client in readable:
+                self.reads += 1
+                frames = self.decoder.recv_from(self.client)
+                if frames is None:
+                    return False
+                self.bytes_received += sum(map(len, frames)) + HEADER_SIZE * len(frames)
+                self.pending.extend(frames)
+        except (OSError, ValueError) as e:
+            # A reset connection, a socket closed by another thread or a corrupt stream all end the session
+            print(f"Connection to the server lost: {e}")
+            return False
+        return True
+
+    def _decode(self, payload: bytes, messages: list):
+        # Protocol messages are handled here, whatever the game has to see is appended to messages
+        self.messages_received += 1
+        try:
+            msg = self.codec.decode(payload)
+            kind = msg["object"]
+        except Exception:
+            self.malformed_messages += 1
+            return
+        if kind == "udp_ready":
+            self.udp_ready = True
+        elif kind == "welcome":
+            # Everyone already in the room arrives at once, the game handles each of them as a join
+            messages.extend({
+                "id": entry["id"],
+                "object": "player",
+                "username": entry["username"],
+                "position": entry["position"],
+                "health": entry["health"],
+                "joined": True,
+                "left": False
+            } for entry in msg["players"])
+        elif kind == "snapshot":
+            # Snapshots may be deltas or arrive late over UDP; hand out the rebuilt full snapshot and acknowledge it.
+            full = self.snapshots.receive(msg)
+            if full is not None:
+                self._send_unreliable({"object": "ack", "tick": full["tick"]})
+                messages.append(full)
+        else:
+            messages.append(msg)
+
+    def receive_messages(self):
+        """
+        Block until the server sent something for the game, then return everything that arrived with it
+
+        Returns:
+            list: the decoded messages in the order they arrived, or None if the connection is closed
+        """
+
+        messages = list(self.inbox)
+        self.inbox.clear()
+        while True:
+            while self.pending:
+                self._decode(self.pending.popleft(), messages)
+            if messages:
+                return messages
+            if not self._receive():
+                return None
+
+    def receive_info(self):
+        """
+        Return the next message from the server, reading from the socket only when none are buffered
 
-        if not msg:
-            return None
+        Returns:
+            dict: the decoded message, or None if the server closed the connection
+        """
+
+        if not self.inbox:
+            messages = self.receive_messages()
+            if messages is None:
+                return None
+            self.inbox.extend(messages)
+        return self.inbox.popleft()
+
+    def _send(self, info: dict):
+        # Reliable messages wait for the next flush, in the order they were sent
+        frame = encode_frame(self.codec.encode(info))
+        with self.send_lock:
+            self.outgoing.append(frame)
+
+    def flush(self, now: float = None):
+        """
+        Write everything queued since the last call in one go, once per frame
 
-        msg_decoded = msg.decode("utf8")
+        Reliable events go first, the player state follows them if the update rate allows another sample.
 
-        left_bracket_index = msg_decoded.index("{")
-        right_bracket_index = msg_decoded.index("}") + 1
-        msg_decoded = msg_decoded[left_bracket_index:right_bracket_index]
+        Args:
+            now (float): current time from time.monotonic()
+        """
+
+        now = time.monotonic() if now is None else now
+        state = None
+        with self.send_lock:
+            if self.state is not None and now >= self.next_state_time:
+                state, self.state = self.state, None
+                self.next_state_time += self.state_interval
+                if self.next_state_time <= now:
+                    # More than an interval behind, e.g. after a long frame, so start over instead of catching up
+                    self.next_state_time = now + self.state_interval
+        if state is not None:
+            # Goes out over UDP right away, or is queued behind the reliable events on TCP
+            self._send_unreliable(state)
 
-        msg_json = json.loads(msg_decoded)
+        with self.send_lock:
+            if not self.outgoing:
+                return
+            data = b"".join(self.outgoing)
+            self.outgoing.clear()
+            try:
+                self.client.sendall(data)
+            except socket.error as e:
+                print(e)
 
-        return msg_json
+    def _send_datagram(self, payload: bytes):
+        with self.send_lock:
+            self.udp_sequence += 1
+            data = encode_datagram(int(self.id), self.udp_token, self.udp_sequence, payload)
+        try:
+            self.udp.send(data)
+        except socket.error:
+            # Datagrams may be lost anyway; the next update replaces this one.
+            pass
 
-    def send_player(self, player: Player):
+    def _send_unreliable(self, info: dict):
+        """
+        Send state that is superseded by the next update, over UDP once the server confirmed the channel
+        """
+
+        if self.udp is None:
+            self._send(info)
+            return
+        if not self.udp_ready:
+            # Keep registering until the server confirms, meanwhile TCP carries the update.
+            self._send_datagram(b"")
+            self._send(info)
+            return
+
+        payload = self.codec.encode(info)
+        if len(payload) > MAX_PAYLOAD_SIZE:
+            self._send(info)
+            return
+        self._send_datagram(payload)
+
+    def send_player(self, player: "Player"):
         player_info = {
             "object": "player",
             "id": self.id,
@@ -65,14 +318,20 @@ class Network:
             "joined": False,
             "left": False
         }
-        player_info_encoded = json.dumps(player_info).encode("utf8")
+        if self.server_movement:
+            # The server moves the player itself, so this only happens on respawn and has to arrive in order with
+            # the input commands
+            self._send(player_info)
+            return
+        # Sampled by the next flush that the update rate allows
+        with self.send_lock:
+            self.state = player_info
 
-        try:
-            self.client.send(player_info_encoded)
-        except socket.error as e:
-            print(e)
+    def send_input(self, command: dict):
+        # Every command counts for the server's movement, so none may be lost or replaced
+        self._send(command)
 
-    def send_bullet(self, bullet: Bullet):
+    def send_bullet(self, bullet: "Bullet"):
         bullet_info = {
             "object": "bullet",
             "position": (bullet.world_x, bullet.world_y, bullet.world_z),
@@ -80,36 +339,26 @@ class Network:
             "direction": bullet.direction,
             "x_direction": bullet.x_direction,
             "speed": getattr(bullet, "speed", 80.0),
+            # The server rewinds other players to this snapshot, and the interpolation delay behind it, before
+            # deciding what the bullet hits
+            "tick": self.snapshots.latest_tick,
+            "team": getattr(bullet, "shooter_team", None),
         }
 
-        bullet_info_encoded = json.dumps(bullet_info).encode("utf8")
+        self._send(bullet_info)
 
-        try:
-            self.client.send(bullet_info_encoded)
-        except socket.error as e:
-            print(e)
-
-    def send_health(self, player: Enemy):
+    def send_health(self, player: "Enemy"):
         health_info = {
             "object": "health_update",
             "id": player.id,
             "health": player.health
         }
 
-        health_info_encoded = json.dumps(health_info).encode("utf8")
-
-        try:
-            self.client.send(health_info_encoded)
-        except socket.error as e:
-            print(e)
+        self._send(health_info)
 
     def send_restart(self, seed: int):
         restart_info = {
             "object": "restart",
             "seed": seed
         }
-        restart_info_encoded = json.dumps(restart_info).encode("utf8")
-        try:
-            self.client.send(restart_info_encoded)
-        except socket.error as e:
-            print(e)
+        self._send(restart_info)
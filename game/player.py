@@ -1,7 +1,13 @@
+import os
+import sys
 import random
 import ursina
 from ursina.prefabs.first_person_controller import FirstPersonController
 
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from shared.weapons import WEAPON_CLASSES
+
 
 class Player(FirstPersonController):
     def __init__(self, position: ursina.Vec3):
@@ -37,36 +43,17 @@ class Player(FirstPersonController):
         self.jump_sound_path = "assets/jump-land.wav"
         self.jump_volume = 0.4
         self.jump_sound = None
+        # Set when the server owns movement: the player then moves by the predictor, not by FirstPersonController
+        self.predictor = None
+        # Set together with the predictor, the server has to hear about respawns before the next input
+        self.network = None
+        self.jump_requested = False
+        # Input commands applied since main last sent them
+        self.commands = []
         self.weapon_classes = {
-            "pistol": {
-                "mag_size": 12,
-                "reload_time": 2.3,
-                "fire_rate": 0.35,
-                "damage": (12, 22),
-                "auto": False,
-                "shoot_sound": "assets/audiomass-output.wav",
-                "shoot_volume": 0.4,
-            },
-            # Rifle hits for roughly half the pistol damage but fires faster and has a bigger mag.
-            "rifle": {
-                "mag_size": 30,
-                "reload_time": 2.0,
-                "fire_rate": 0.12,
-                "damage": (6, 11),
-                "auto": True,
-                "shoot_sound": "assets/audiomass-output.wav",
-                "shoot_volume": 0.35,
-            },
-            # Sniper packs the highest punch by a wide margin.
-            "sniper": {
-                "mag_size": 5,
-                "reload_time": 3.0,
-                "fire_rate": 2.4,
-                "damage": (55, 75),
-                "auto": False,
-                "shoot_sound": "assets/snipershot.wav",
-                "shoot_volume": 0.6,
-            },
+            "pistol": dict(WEAPON_CLASSES["pistol"], shoot_sound="assets/audiomass-output.wav", shoot_volume=0.4),
+            "rifle": dict(WEAPON_CLASSES["rifle"], shoot_sound="assets/audiomass-output.wav", shoot_volume=0.35),
+            "sniper": dict(WEAPON_CLASSES["sniper"], shoot_sound="assets/snipershot.wav", shoot_volume=0.6),
         }
         self.weapon_class = "pistol"
         self.auto_fire = False
@@ -241,12 +228,7 @@ class Player(FirstPersonController):
         return random.randint(lo, hi)
 
     def get_bullet_speed(self):
-        # Faster rounds for sniper; rifle slightly faster than pistol.
-        if self.weapon_class == "sniper":
-            return 180.0
-        if self.weapon_class == "rifle":
-            return 95.0
-        return 80.0
+        return self.weapon_classes.get(self.weapon_class, self.weapon_classes["pistol"])["speed"]
 
     def get_team(self):
         return getattr(self, "team", None)
@@ -274,6 +256,10 @@ class Player(FirstPersonController):
             self.jump_sound = ursina.Audio(self.jump_sound_path, autoplay=True, loop=False, volume=self.jump_volume)
         except Exception:
             pass
+        if self.predictor is not None:
+            # Part of the next input command, so the server jumps too
+            self.jump_requested = True
+            return
         super().jump()
 
     def play_shoot_sound(self):
@@ -314,6 +300,10 @@ class Player(FirstPersonController):
         self.rotation = 0
         self.camera_pivot.rotation_x = 0
         self.world_position = spawn_pos
+        if self.predictor is not None:
+            self.predictor.teleport(tuple(self.world_position))
+            # Otherwise the server keeps moving the player from where it died and snaps it back there
+            self.network.send_player(self)
         self.cursor.color = ursina.color.rgb(255, 0, 0, 122)
         self.ammo = self.mag_size
         self.reloading = False
@@ -399,7 +389,35 @@ class Player(FirstPersonController):
                     self.reloading = False
                     self.ammo = self.mag_size
                 self._update_ammo_ui()
+            if self.predictor is not None:
+                self._predict_movement(sprinting)
+                return
             super().update()
             # Clamp position to stay off the walls a bit.
             self.x = max(-self.move_bounds, min(self.move_bounds, self.x))
             self.z = max(-self.move_bounds, min(self.move_bounds, self.z))
+
+    def _predict_movement(self, sprinting: bool):
+        # FirstPersonController's mouse look; the movement itself is the shared model the server runs too
+        self.rotation_y += ursina.mouse.velocity[0] * self.mouse_sensitivity[1]
+        self.camera_pivot.rotation_x -= ursina.mouse.velocity[1] * self.mouse_sensitivity[0]
+        self.camera_pivot.rotation_x = ursina.clamp(self.camera_pivot.rotation_x, -90, 90)
+
+        held = ursina.held_keys
+        forward = int(bool(held.get("w"))) - int(bool(held.get("s")))
+        right = int(bool(held.get("d"))) - int(bool(held.get("a")))
+        command = self.predictor.apply(forward, right, self.rotation_y, sprinting, self.jump_requested, ursina.time.dt)
+        self.jump_requested = False
+        self.commands.append(command)
+        self.position = ursina.Vec3(*self.predictor.position)
+
+    def reconcile(self, msg: dict):
+        """
+        Correct the predicted position by the state the server reported
+
+        Args:
+            msg (dict): a "moved" message
+        """
+
+        if self.predictor is not None and self.predictor.reconcile(msg):
+            self.position = ursina.Vec3(*self.predictor.position)
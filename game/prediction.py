@@ -0,0 +1,116 @@
+"""
+Client side prediction of the local player's movement for servers that own movement.
+
+Every frame's input becomes a numbered command that is applied locally right away and sent to the server. The
+server answers with the state its movement reached and the number of the last command it applied. Commands up to
+that number are done with; the ones after it are still on their way, so the predictor goes back to the server's
+state and applies them again. When the prediction was right this lands exactly where the player already is.
+"""
+
+import os
+import sys
+from collections import deque
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from shared.movement import MovementModel, MovementState
+
+# Commands kept while waiting for the server, about four seconds at 60 frames per second.
+MAX_PENDING = 256
+# Corrections smaller than this are rounding between the two sides and not counted.
+CORRECTION_THRESHOLD = 0.01
+
+
+class MovementPredictor:
+    """
+    Predicted movement of the local player.
+
+    Args:
+        model (MovementModel): the movement the server runs
+        position (tuple): where the player starts
+        codec: message codec the commands are sent with; commands are applied as the server decodes them, so
+            rounding in the encoding does not make the two sides drift apart
+    """
+
+    def __init__(self, model: MovementModel, position, codec=None):
+        self.model = model
+        self.codec = codec
+        self.state = MovementState(position)
+        self.seq = 0
+        self.pending = deque(maxlen=MAX_PENDING)
+        # Reports for commands before this one predate the last teleport
+        self.teleport_seq = 0
+        self.acked_seq = 0
+        self.corrections = 0
+
+    @property
+    def position(self) -> tuple:
+        return self.state.position
+
+    def apply(self, forward: int, right: int, yaw: float, sprint: bool, jump: bool, dt: float) -> dict:
+        """
+        Turn one frame's input into a command and move the player by it
+
+        Args:
+            forward (int): 1 forward, -1 backward, 0 neither
+            right (int): 1 right, -1 left, 0 neither
+            yaw (float): where the player faces in degrees
+            sprint (bool): whether the sprint key is down
+            jump (bool): whether the player jumps in this frame
+            dt (float): the frame time
+
+        Returns:
+            dict: the command to send to the server
+        """
+
+        self.seq += 1
+        command = {
+            "object": "input", "seq": self.seq, "dt": dt, "forward": forward, "right": right, "yaw": yaw,
+            "sprint": sprint, "jump": jump
+        }
+        if self.codec is not None:
+            command = self.codec.decode(self.codec.encode(command))
+        self.model.step(self.state, command)
+        self.pending.append(command)
+        return command
+
+    def reconcile(self, msg: dict) -> bool:
+        """
+        Take the server's state and apply the commands it has not seen yet on top of it
+
+        Args:
+            msg (dict): a "moved" message
+
+        Returns:
+            bool: True if the player ended up somewhere else than predicted
+        """
+
+        seq = msg["seq"]
+        if seq < self.teleport_seq or seq <= self.acked_seq:
+            # Older than the last report or than the last teleport, UDP may deliver reports out of order
+            return False
+        self.acked_seq = seq
+        while self.pending and self.pending[0]["seq"] <= seq:
+            self.pending.popleft()
+
+        predicted = self.state.position
+        self.state = MovementState.from_message(msg)
+        for command in self.pending:
+            self.model.step(self.state, command)
+        error = sum((a - b) ** 2 for a, b in zip(predicted, self.state.position))
+        if error > CORRECTION_THRESHOLD ** 2:
+            self.corrections += 1
+            return True
+        return False
+
+    def teleport(self, position):
+        """
+        Put the player somewhere without moving it there, e.g. on respawn
+
+        Args:
+            position (tuple): x, y, z
+        """
+
+        self.state = MovementState(position)
+        self.pending.clear()
+        self.teleport_seq = self.seq + 1
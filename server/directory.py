@@ -0,0 +1,113 @@
+"""
+Room directory of the supervisor.
+
+A fixed table maps room names to the worker that hosts them and the room's current player count. Only the
+supervisor reads and writes it: workers learn about their rooms from the clients handed to them and report back
+over their control connection, so the table lives in the supervisor's own memory.
+"""
+
+from room import MAX_ROOM_NAME
+
+# Owning worker of a free slot.
+FREE = -1
+
+
+class RoomDirectory:
+    """
+    Table of hosted rooms.
+
+    Args:
+        slots (int): number of rooms the table can hold
+    """
+
+    def __init__(self, slots: int):
+        self.slots = slots
+        self.names = [""] * slots
+        self.workers = [FREE] * slots
+        self.players = [0] * slots
+
+    def close(self):
+        for slot in range(self.slots):
+            self.free(slot)
+
+    def entry(self, slot: int) -> tuple:
+        """
+        Read one slot
+
+        Args:
+            slot (int): index into the table
+
+        Returns:
+            tuple: room name, worker index and player count
+        """
+
+        return self.names[slot], self.workers[slot], self.players[slot]
+
+    def find(self, room: str):
+        """
+        Look a room up
+
+        Args:
+            room (str): room name
+
+        Returns:
+            tuple: slot and worker index, None if no worker hosts the room
+        """
+
+        for slot in range(self.slots):
+            if self.workers[slot] != FREE and self.names[slot] == room:
+                return slot, self.workers[slot]
+        return None
+
+    def assign(self, room: str, worker: int):
+        """
+        Record that a worker hosts a room
+
+        Args:
+            room (str): room name
+            worker (int): index of the worker
+
+        Returns:
+            int: the slot used, None if the table is full
+        """
+
+        for slot in range(self.slots):
+            if self.workers[slot] == FREE:
+                self.names[slot] = room[:MAX_ROOM_NAME]
+                self.workers[slot] = worker
+                self.players[slot] = 0
+                return slot
+        return None
+
+    def free(self, slot: int):
+        self.names[slot] = ""
+        self.workers[slot] = FREE
+        self.players[slot] = 0
+
+    def set_players(self, slot: int, players: int):
+        self.players[slot] = players
+
+    def rooms(self) -> dict:
+        """Player count of every hosted room, by name."""
+        return {
+            self.names[slot]: self.players[slot] for slot in range(self.slots) if self.workers[slot] != FREE
+        }
+
+    def loads(self, workers: int) -> list:
+        """
+        Players and rooms hosted by each worker
+
+        Args:
+            workers (int): number of workers
+
+        Returns:
+            list: (players, rooms) per worker index
+        """
+
+        loads = [[0, 0] for _ in range(workers)]
+        for slot in range(self.slots):
+            worker = self.workers[slot]
+            if 0 <= worker < workers:
+                loads[worker][0] += self.players[slot]
+                loads[worker][1] += 1
+        return [tuple(load) for load in loads]
@@ -0,0 +1,254 @@
+"""
+Recent state of every player, used to rewind the world for lag compensation and to look at the past in general.
+
+Each player gets a fixed size ring buffer of timestamped samples backed by preallocated arrays, so recording an
+update never allocates. Lookups binary search the ring and interpolate between the two samples around the
+requested time.
+"""
+
+from array import array
+
+# Seconds of movement kept per player.
+HISTORY_DURATION = 1.0
+# Slots per player; updates arriving faster than duration / capacity overwrite the newest slot.
+HISTORY_CAPACITY = 64
+
+
+def _lerp_angle(a: float, b: float, f: float) -> float:
+    # Turn the short way round so 350 -> 10 goes through 0, not 180
+    delta = (b - a + 180.0) % 360.0 - 180.0
+    return a + delta * f
+
+
+class PlayerHistory:
+    """
+    Ring buffer of one player's (time, position, rotation, health) samples.
+
+    Args:
+        capacity (int): number of samples kept
+        resolution (float): minimum spacing in seconds between kept samples
+    """
+
+    def __init__(self, capacity: int = HISTORY_CAPACITY, resolution: float = HISTORY_DURATION / HISTORY_CAPACITY):
+        self.capacity = capacity
+        self.resolution = resolution
+        self.times = array("d", bytes(8 * capacity))
+        self.xs = array("d", bytes(8 * capacity))
+        self.ys = array("d", bytes(8 * capacity))
+        self.zs = array("d", bytes(8 * capacity))
+        self.rotations = array("d", bytes(8 * capacity))
+        self.healths = array("d", bytes(8 * capacity))
+        self.start = 0
+        self.count = 0
+        self.opened = 0.0
+
+    def clear(self):
+        self.start = 0
+        self.count = 0
+
+    def record(self, now: float, position, rotation: float, health: float):
+        """
+        Store a sample
+
+        Args:
+            now (float): time of the sample, from time.monotonic()
+            position (tuple): x, y, z
+            rotation (float): yaw in degrees
+            health (float): health at that time
+        """
+
+        capacity = self.capacity
+        if self.count and now < self.times[(self.start + self.count - 1) % capacity]:
+            return
+        if self.count and now - self.opened < self.resolution:
+            # Too close to when the newest slot was opened to deserve its own; keep the latest data in it instead.
+            slot = (self.start + self.count - 1) % capacity
+        elif self.count < capacity:
+            slot = (self.start + self.count) % capacity
+            self.count += 1
+            self.opened = now
+        else:
+            slot = self.start
+            self.start = (self.start + 1) % capacity
+            self.opened = now
+
+        self.times[slot] = now
+        self.xs[slot] = position[0]
+        self.ys[slot] = position[1]
+        self.zs[slot] = position[2]
+        self.rotations[slot] = rotation
+        self.healths[slot] = health
+
+    def oldest(self) -> float:
+        return self.times[self.start] if self.count else None
+
+    def newest(self) -> float:
+        return self.times[(self.start + self.count - 1) % self.capacity] if self.count else None
+
+    def _slot(self, index: int) -> int:
+        return (self.start + index) % self.capacity
+
+    def _search(self, when: float) -> int:
+        # Number of samples at or before when
+        times = self.times
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if times[self._slot(middle)] <= when:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def sample(self, index: int) -> tuple:
+        """
+        Read one stored sample
+
+        Args:
+            index (int): 0 for the oldest sample, -1 for the newest
+
+        Returns:
+            tuple: time, position, rotation and health
+        """
+
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError("history index out of range")
+        slot = self._slot(index)
+        return self.times[slot], (self.xs[slot], self.ys[slot], self.zs[slot]), self.rotations[slot], self.healths[slot]
+
+    def state_at(self, when: float):
+        """
+        Interpolated state at a given time
+
+        Args:
+            when (float): time from time.monotonic()
+
+        Returns:
+            tuple: position, rotation and health, clamped to the oldest and newest sample, None without samples
+        """
+
+        if not self.count:
+            return None
+        index = self._search(when)
+        if index == 0:
+            _, position, rotation, health = self.sample(0)
+            return position, rotation, health
+        if index == self.count:
+            _, position, rotation, health = self.sample(-1)
+            return position, rotation, health
+
+        a = self._slot(index - 1)
+        b = self._slot(index)
+        t0, t1 = self.times[a], self.times[b]
+        f = (when - t0) / (t1 - t0) if t1 > t0 else 1.0
+        position = (
+            self.xs[a] + (self.xs[b] - self.xs[a]) * f,
+            self.ys[a] + (self.ys[b] - self.ys[a]) * f,
+            self.zs[a] + (self.zs[b] - self.zs[a]) * f,
+        )
+        # Health changes in steps, so report what it was at the earlier sample
+        return position, _lerp_angle(self.rotations[a], self.rotations[b], f), self.healths[a]
+
+    def between(self, start: float, end: float):
+        """
+        Iterate over the stored samples taken in a time range
+
+        Args:
+            start (float): earliest time, inclusive
+            end (float): latest time, inclusive
+
+        Yields:
+            tuple: time, position, rotation and health, oldest first
+        """
+
+        index = self._search(start - 1e-12) if self.count else 0
+        while index < self.count:
+            sample = self.sample(index)
+            if sample[0] > end:
+                break
+            if sample[0] >= start:
+                yield sample
+            index += 1
+
+
+class PositionHistory:
+    """
+    History of every connected player, keyed by player id.
+
+    Buffers of players that left are kept for reuse so joins do not allocate either once the server has warmed up.
+
+    Args:
+        duration (float): seconds of samples kept per player
+        capacity (int): slots per player
+    """
+
+    def __init__(self, duration: float = HISTORY_DURATION, capacity: int = HISTORY_CAPACITY):
+        self.duration = duration
+        self.capacity = capacity
+        self.players = {}
+        self.spare = []
+
+    def add(self, player_id: str) -> PlayerHistory:
+        history = self.players.get(player_id)
+        if history is None:
+            history = self.spare.pop() if self.spare else PlayerHistory(self.capacity, self.duration / self.capacity)
+            self.players[player_id] = history
+        return history
+
+    def remove(self, player_id: str):
+        history = self.players.pop(player_id, None)
+        if history is not None:
+            history.clear()
+            self.spare.append(history)
+
+    def record(self, player_id: str, now: float, position, rotation: float = 0.0, health: float = 100):
+        """
+        Add a sample for a player
+
+        Args:
+            player_id (str): player the sample belongs to
+            now (float): time of the sample, from time.monotonic()
+            position (tuple): the player's position
+            rotation (float): the player's yaw
+            health (float): the player's health
+        """
+
+        history = self.players.get(player_id)
+        if history is None:
+            history = self.add(player_id)
+        history.record(now, position, rotation, health)
+
+    def get(self, player_id: str) -> PlayerHistory:
+        return self.players.get(player_id)
+
+    def state_at(self, player_id: str, when: float):
+        """
+        A player's interpolated position, rotation and health at a given time
+
+        Args:
+            player_id (str): player to look up
+            when (float): time from time.monotonic()
+
+        Returns:
+            tuple: position, rotation and health, None if nothing was recorded for the player
+        """
+
+        history = self.players.get(player_id)
+        return history.state_at(when) if history is not None else None
+
+    def position_at(self, player_id: str, when: float):
+        """
+        Where a player was at a given time
+
+        Args:
+            player_id (str): player to look up
+            when (float): time from time.monotonic()
+
+        Returns:
+            tuple: the interpolated position, clamped to the oldest and newest sample, None without samples
+        """
+
+        state = self.state_at(player_id, when)
+        return state[0] if state is not None else None
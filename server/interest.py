@@ -0,0 +1,96 @@
+"""
+Uniform grid over player positions used to decide who needs to hear about what.
+"""
+
+import math
+
+# Outer walls of the map built from shared/map_layout.py sit at +-75; nothing gets past them.
+MAP_HALF_SIZE = 76.0
+
+
+class SpatialGrid:
+    """
+    Buckets players into square cells on the ground plane.
+
+    Args:
+        cell_size (float): edge length of a cell in world units
+        radius (int): how many cells around a player's own cell count as its area of interest
+    """
+
+    def __init__(self, cell_size: float = 20.0, radius: int = 1):
+        self.cell_size = cell_size
+        self.radius = radius
+        self.cells = {}
+
+    def cell_of(self, position) -> tuple:
+        return math.floor(position[0] / self.cell_size), math.floor(position[2] / self.cell_size)
+
+    def rebuild(self, positions: dict):
+        """
+        Re-bucket every player
+
+        Args:
+            positions (dict): player id to position
+        """
+
+        cells = {}
+        for player_id, position in positions.items():
+            cells.setdefault(self.cell_of(position), []).append(player_id)
+        self.cells = cells
+
+    def around(self, cells) -> set:
+        """
+        Players in or next to any of the given cells
+
+        Args:
+            cells (iterable): cell coordinates
+
+        Returns:
+            set: player ids
+        """
+
+        radius = self.radius
+        visited = set()
+        found = set()
+        for cx, cz in cells:
+            for x in range(cx - radius, cx + radius + 1):
+                for z in range(cz - radius, cz + radius + 1):
+                    if (x, z) in visited:
+                        continue
+                    visited.add((x, z))
+                    found.update(self.cells.get((x, z), ()))
+        return found
+
+    def near(self, position) -> set:
+        """Players inside the area of interest of someone standing at position."""
+        return self.around((self.cell_of(position),))
+
+    def along(self, origin, direction, length: float) -> set:
+        """
+        Players near any point of a straight path
+
+        Args:
+            origin (tuple): start of the path
+            direction (tuple): unit vector of the path
+            length (float): distance travelled
+
+        Returns:
+            set: player ids
+        """
+
+        # Stop where the path leaves the map
+        for axis in (0, 2):
+            if abs(direction[axis]) > 1e-9:
+                limit = math.copysign(MAP_HALF_SIZE, direction[axis])
+                length = min(length, max(0.0, (limit - origin[axis]) / direction[axis]))
+
+        # Samples half a cell apart, widened by the interest radius, cover every cell the path crosses
+        step = self.cell_size / 2
+        cells = set()
+        travelled = 0.0
+        while True:
+            cells.add(self.cell_of((origin[0] + direction[0] * travelled, 0, origin[2] + direction[2] * travelled)))
+            if travelled >= length:
+                break
+            travelled = min(length, travelled + step)
+        return self.around(cells)
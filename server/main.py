@@ -2,159 +2,1267 @@
 Server script for hosting games
 """
 
+import argparse
+import os
+import sys
 import socket
+import selectors
 import json
 import time
 import random
-import threading
+import struct
+from collections import deque
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from shared.ballistics import BULLET_LIFETIME, bullet_direction
+from shared.datagram import MAX_PAYLOAD_SIZE, decode_datagram, encode_datagram
+from shared.framing import HEADER_SIZE, MAX_FRAME_SIZE, FrameDecoder, FrameError, encode_frame
+from shared.map_layout import spawn_position
+from shared.movement import MovementModel, MovementState
+from shared.protocol import CODECS, JSON, SUPPORTED_CODECS, choose_codec, validate_message
+from shared.snapshot import HISTORY_SIZE, INTERPOLATION_DELAY, diff_states, make_state
+from metrics import Metrics, MetricsEndpoint
+from outbox import Outbox
+from projectiles import shot_speed, valid_shot
+from recording import Recorder
+from registry import MAX_ID, IdAllocator, PlayerRegistry
+from room import DEFAULT_ROOM, Room, room_name
 
 ADDR = "0.0.0.0"
 PORT = 8000
 MAX_PLAYERS = 10
-MSG_SIZE = 2048
+MAX_ROOMS = 64
+MAX_WAITING = 32
+HANDSHAKE_TIMEOUT = 5.0
+BACKLOG = 128
+TICK_RATE = 30
+KEYFRAME_INTERVAL = 2.0
+STATS_INTERVAL = 10.0
+QUEUE_LIMIT = 1024
+MAX_LAG = 5.0
+AOI_CELL_SIZE = 20.0
+AOI_RADIUS = 1
+FAR_RATE = 5.0
+METRICS_ADDR = "127.0.0.1"
+# Weight of a new sample in the smoothed round trip time, as in TCP
+RTT_GAIN = 0.125
+# Seconds of movement a client may send ahead of real time, covers inputs that arrive in bursts
+MAX_INPUT_AHEAD = 0.25
+SPAWN_POSITION = (0, 1, 0)
+# Largest join a connection may send; a real one is well under a hundred bytes. This also bounds everything read
+# during the handshake, which a supervisor hands to its worker in one message.
+MAX_JOIN_SIZE = 4096
+# Control messages between the supervisor and its workers stay well below this.
+MAX_CONTROL_SIZE = 65536
+# Length of the JSON part of a handoff, the raw stream bytes follow it.
+HANDOFF_HEADER = struct.Struct("!H")
+
 
-# Setup server socket
-s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-s.bind((ADDR, PORT))
-s.listen(MAX_PLAYERS)
+class Client:
+    """
+    Connection state for one player, owned by the event loop.
 
-players = {}
+    Args:
+        conn (socket.socket): non-blocking client socket
+        identifier (str): unique identifier of the player
+        username (str): username the player connected with
+        decoder (FrameDecoder): decoder already holding data read during the handshake
+        codec: message codec agreed on during the handshake
+        queue_limit (int): maximum number of frames waiting to be written
+    """
 
+    def __init__(self, conn: socket.socket, identifier: str, username: str, decoder: FrameDecoder = None, codec=JSON,
+                 queue_limit: int = QUEUE_LIMIT):
+        self.conn = conn
+        self.id = identifier
+        self.username = username
+        self.decoder = decoder or FrameDecoder()
+        self.codec = codec
+        self.room = None
+        # Set while the client waits for a seat in a full room
+        self.queued_room = None
+        # Where a restart respawns the player, until the client reports the respawn; None while none is due
+        self.respawn_at = None
+        self.addr = None
+        # Time by which the client has to send its join, while it is still in the handshake
+        self.handshake_deadline = None
+        self.outbox = Outbox(queue_limit)
+        self.closed = False
+        # Set while the client lags behind; snapshots are skipped until it catches up
+        self.degraded = False
+        # Last snapshot tick the client confirmed, deltas are computed against it
+        self.acked_tick = 0
+        # Smoothed seconds between sending a snapshot and the client acknowledging it, None until the first ack
+        self.rtt = None
+        # Snapshot tick to the state this client has after applying that snapshot
+        self.views = {}
+        # Optional UDP channel, registered once the client sends a datagram carrying this token
+        self.udp_token = random.getrandbits(32)
+        self.udp_addr = None
+        self.udp_sequence = 0
+        self.bytes_sent = 0
+        self.snapshot_bytes = 0
+        self.snapshot_full_bytes = 0
+        self.keyframes = 0
+        self.deltas = 0
+        # Server side movement: the player's state, the last input command applied and the last one reported back
+        self.movement = None
+        self.input_seq = 0
+        self.reported_seq = 0
+        self.input_budget = MAX_INPUT_AHEAD
+        self.input_time = 0.0
 
-def generate_id(player_list: dict, max_players: int):
+
+class Waiting:
     """
-    Generate a unique identifier
+    A connection held in the admission queue while the server is full.
 
     Args:
-        player_list (dict): dictionary of existing players
-        max_players (int): maximum number of players allowed
+        conn (socket.socket): non-blocking client socket
+        addr (tuple): the client's address
+    """
 
-    Returns:
-        str: the unique identifier
+    def __init__(self, conn: socket.socket, addr):
+        self.conn = conn
+        self.addr = addr
+
+
+class GameServer:
     """
+    Single threaded game server that multiplexes every client socket on one selector and hosts any number of
+    independent rooms.
+
+    Args:
+        addr (str): address to bind to
+        port (int): port to listen on
+        max_players (int): maximum number of players allowed in one room
+        tick_rate (float): world snapshots broadcast per second
+        keyframe_interval (float): seconds between full snapshots sent to every client
+        stats_interval (float): seconds between bandwidth reports, 0 disables them
+        udp (bool): offer clients a UDP channel on the same port for position updates and snapshots
+        queue_limit (int): frames a client may have waiting before it is disconnected
+        max_lag (float): seconds a client may stay behind before it is disconnected; it stops getting snapshots
+            after half of that
+        aoi_cell_size (float): edge length of the interest grid cells
+        aoi_radius (int): cells around a player that count as its area of interest
+        far_rate (float): snapshots per second that include players outside the area of interest
+        max_waiting (int): connections held in the admission queue while the server is full, and in the queue of
+            each full room
+        max_rooms (int): rooms hosted at the same time
+        handshake_timeout (float): seconds a new connection has to send its join before it is dropped
+        control (socket.socket): connection to the supervisor that hands this worker its clients; the server then
+            does not listen for connections itself and serves UDP on its own port
+        metrics_port (int): port of the HTTP endpoint serving Prometheus metrics, None disables it
+        metrics_addr (str): address the metrics endpoint binds to
+        record (str): file to record every accepted message to, None disables recording
+        server_movement (bool): move players by the input commands they send instead of taking the positions they
+            report; clients predict the movement and correct it by the state sent back every tick
+    """
+
+    def __init__(self, addr: str = ADDR, port: int = PORT, max_players: int = MAX_PLAYERS, tick_rate: float = TICK_RATE,
+                 keyframe_interval: float = KEYFRAME_INTERVAL, stats_interval: float = STATS_INTERVAL, udp: bool = True,
+                 queue_limit: int = QUEUE_LIMIT, max_lag: float = MAX_LAG, aoi_cell_size: float = AOI_CELL_SIZE,
+                 aoi_radius: int = AOI_RADIUS, far_rate: float = FAR_RATE, max_waiting: int = MAX_WAITING,
+                 max_rooms: int = MAX_ROOMS, handshake_timeout: float = HANDSHAKE_TIMEOUT, control: socket.socket = None, metrics_port: int = None,
+                 metrics_addr: str = METRICS_ADDR, record: str = None, server_movement: bool = False):
+        self.addr = addr
+        self.port = port
+        self.max_players = max_players
+        self.tick_interval = 1 / tick_rate
+        self.selector = selectors.DefaultSelector()
+        self.sock = None
+        self.control = control
+        self.udp_enabled = udp
+        self.udp = None
+        self.queue_limit = queue_limit
+        self.max_lag = max_lag
+        self.metrics = Metrics()
+        self.metrics_port = metrics_port
+        self.metrics_addr = metrics_addr
+        self.metrics_endpoint = None
+        self.record_path = record
+        self.recorder = None
+        self.movement = MovementModel() if server_movement else None
+        self.clients = PlayerRegistry()
+        self.ids = IdAllocator(min(MAX_ID, max_players * max_rooms))
+        self.waiting = deque()
+        # Connections greeted but not in a room yet, by id in the order they arrived
+        self.handshakes = {}
+        self.handshake_timeout = handshake_timeout
+        self.max_waiting = max_waiting
+        self.rooms = {}
+        self.max_rooms = max_rooms
+        self.aoi_cell_size = aoi_cell_size
+        self.aoi_radius = aoi_radius
+        self.running = False
+        self.far_ticks = max(1, round(tick_rate / far_rate))
+        self.keyframe_ticks = max(1, round(keyframe_interval * tick_rate))
+        self.stats_interval = stats_interval
+        self.next_stats_time = 0.0
+
+    def start(self):
+        if self.control is None:
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self.sock.bind((self.addr, self.port))
+            self.sock.listen(BACKLOG)
+            self.sock.setblocking(False)
+            self.selector.register(self.sock, selectors.EVENT_READ, None)
+            # Bind to the port actually chosen, so port 0 works for both sockets
+            self.port = self.sock.getsockname()[1]
+        else:
+            self.control.setblocking(False)
+            self.selector.register(self.control, selectors.EVENT_READ, None)
+
+        if self.udp_enabled:
+            self.udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.udp.bind((self.addr, self.port))
+            self.udp.setblocking(False)
+            self.selector.register(self.udp, selectors.EVENT_READ, None)
+            self.port = self.udp.getsockname()[1]
+
+        if self.record_path:
+            self.recorder = Recorder(self.record_path)
+            print(f"Recording the match to {self.record_path}")
+
+        if self.metrics_port is not None:
+            self.metrics_endpoint = MetricsEndpoint(self, self.metrics_addr, self.metrics_port)
+            self.metrics_endpoint.start()
+            print(f"Serving metrics on http://{self.metrics_addr}:{self.metrics_endpoint.port}/metrics")
+
+        self.running = True
+
+    def close(self):
+        self.running = False
+        for client in self.clients.values():
+            self._close_client(client)
+        for client in list(self.handshakes.values()):
+            self._close_client(client)
+        for room in self.rooms.values():
+            for client, _ in room.waiting:
+                self._close_client(client)
+        while self.waiting:
+            self._drop_waiting(self.waiting[0])
+        if self.sock:
+            try:
+                self.selector.unregister(self.sock)
+            except (KeyError, ValueError):
+                pass
+            self.sock.close()
+            self.sock = None
+        if self.udp:
+            try:
+                self.selector.unregister(self.udp)
+            except (KeyError, ValueError):
+                pass
+            self.udp.close()
+            self.udp = None
+        if self.control:
+            try:
+                self.selector.unregister(self.control)
+            except (KeyError, ValueError):
+                pass
+            self.control.close()
+            self.control = None
+        if self.metrics_endpoint:
+            self.metrics_endpoint.close()
+            self.metrics_endpoint = None
+        if self.recorder:
+            self.recorder.close()
+            self.recorder = None
+        self.selector.close()
+
+    def serve_forever(self):
+        print("Server started, listening for new connections...")
+
+        self.next_stats_time = time.monotonic() + self.stats_interval
+        while self.running:
+            now = time.monotonic()
+            next_tick_time = min((room.next_tick_time for room in self.rooms.values()), default=now + self.tick_interval)
+            self.poll(max(0.0, next_tick_time - now))
+
+            # Rooms keep the phase they were created with, which spreads their ticks over the interval
+            now = time.monotonic()
+            for room in list(self.rooms.values()):
+                if now >= room.next_tick_time:
+                    self.run_tick(room, now)
+                    room.next_tick_time += self.tick_interval
+                    # Skip missed ticks instead of bursting to catch up after a stall
+                    if room.next_tick_time < now:
+                        room.next_tick_time = now + self.tick_interval
+
+            self._expire_handshakes(now)
+            if self.recorder is not None and now >= self.recorder.next_keyframe:
+                self.recorder.keyframe(self.rooms.values(), now)
+
+            if self.stats_interval and now >= self.next_stats_time:
+                self.report_stats()
+                self.next_stats_time = now + self.stats_interval
+
+    def run_tick(self, room: Room, now: float):
+        """
+        Advance one room by a tick: move its bullets and send its snapshot
+
+        Args:
+            room (Room): the room to advance
+            now (float): current time from time.monotonic()
+        """
+
+        started = time.thread_time()
+        self.step_projectiles(room, now)
+        if self.movement is not None:
+            self.report_movement(room)
+        self.broadcast_snapshot(room)
+        duration = time.thread_time() - started
+        room.cpu_time += duration
+        room.ticks_run += 1
+        self.metrics.tick_duration.observe(duration)
+
+    def broadcast_snapshot(self, room: Room):
+        """
+        Fold the latest state of every player in a room into one snapshot and send every client the part it has not
+        acknowledged yet. Players outside a client's area of interest are only refreshed on far ticks.
+        Clients that end up with the same baseline and view share one encoded frame.
+
+        Args:
+            room (Room): the room to snapshot
+        """
+
+        room.tick += 1
+        room.tick_times[room.tick] = time.monotonic()
+        while len(room.tick_times) > HISTORY_SIZE:
+            del room.tick_times[next(iter(room.tick_times))]
+        changed = room.world_changed
+        if changed:
+            room.world_state = make_state(room.players)
+            room.grid.rebuild({player_id: values[0] for player_id, values in room.world_state.items()})
+            room.world_changed = False
+
+        keyframe_due = room.tick % self.keyframe_ticks == 0
+        far_due = room.tick % self.far_ticks == 0
+        # Keyed by the identity of the views, so the views are stored along with the payload: a view freed before
+        # the end of the tick could hand its address to another client's view and match the wrong payload
+        payloads = {}
+        now = time.monotonic()
+        for player_id in room.players.ids():
+            client: Client = room.players[player_id]["client"]
+            if not self._check_lag(client, now):
+                continue
+            baseline = 0 if keyframe_due or client.acked_tick not in client.views else client.acked_tick
+            baseline_view = client.views[baseline] if baseline else {}
+            view = room.world_state if not baseline or far_due else self._interest_view(room, client, baseline_view)
+            key = (baseline, id(baseline_view), id(view), client.codec.name)
+            if key not in payloads:
+                payload = self._encode_snapshot(room.tick, baseline, baseline_view, view, client.codec)
+                payloads[key] = (baseline_view, view, payload)
+            payload = payloads[key][2]
+
+            if payload is not None or changed:
+                # What the client would have received without delta compression and interest management
+                full_key = (0, 0, id(room.world_state), client.codec.name)
+                if full_key not in payloads:
+                    full = self._encode_snapshot(room.tick, 0, {}, room.world_state, client.codec)
+                    payloads[full_key] = ({}, room.world_state, full)
+                client.snapshot_full_bytes += len(payloads[full_key][2])
+            if payload is None:
+                continue
+            if client.degraded:
+                self.metrics.snapshots_skipped += 1
+                continue
+
+            client.views[room.tick] = view
+            while len(client.views) > HISTORY_SIZE:
+                del client.views[next(iter(client.views))]
+
+            if baseline:
+                client.deltas += 1
+            else:
+                client.keyframes += 1
+            client.snapshot_bytes += len(payload)
+            if client.udp_addr and len(payload) <= MAX_PAYLOAD_SIZE:
+                self.send_datagram(client, room.tick, payload)
+            else:
+                # A newer snapshot replaces one the client has not read yet
+                self.send(client, encode_frame(payload), key="snapshot")
+
+    def _interest_view(self, room: Room, client: Client, baseline_view: dict) -> dict:
+        # Players near the client get their latest state, everyone else keeps what the client already has
+        world = room.world_state
+        own = world.get(client.id)
+        if own is None:
+            return world
+        near = room.grid.near(own[0])
+        if len(near) >= len(world):
+            return world
+        view = {player_id: values for player_id, values in baseline_view.items() if player_id in world}
+        for player_id in near:
+            view[player_id] = world[player_id]
+        return view
+
+    def _check_lag(self, client: Client, now: float) -> bool:
+        lag = client.outbox.lag(now)
+        if lag > self.max_lag:
+            print(f"Dropping player {client.username} with ID {client.id}, {lag:.1f}s behind "
+                  f"with {client.outbox.depth} queued messages")
+            self.metrics.slow_clients_dropped += 1
+            self._disconnect(client)
+            return False
+        client.degraded = lag > self.max_lag / 2
+        return True
 
-    while True:
-        unique_id = str(random.randint(1, max_players))
-        if unique_id not in player_list:
-            return unique_id
+    def _encode_snapshot(self, tick: int, baseline: int, baseline_view: dict, view: dict, codec):
+        if baseline and baseline_view is view:
+            return None
+        players, removed = diff_states(baseline_view, view)
+        if baseline and not players and not removed:
+            return None
+        return codec.encode({
+            "object": "snapshot",
+            "tick": tick,
+            "baseline": baseline,
+            "players": players,
+            "removed": removed
+        })
 
+    def report_stats(self):
+        for room in self.rooms.values():
+            per_tick = room.cpu_time / room.ticks_run if room.ticks_run else 0
+            print(f"Room {room.name}: {len(room)} players, tick {room.tick}, "
+                  f"{room.cpu_time * 1000:.1f} ms CPU ({per_tick * 1000:.3f} ms per tick)")
+        for client in self.clients.values():
+            saved = 1 - client.snapshot_bytes / client.snapshot_full_bytes if client.snapshot_full_bytes else 0
+            print(f"Player {client.username} with ID {client.id}: {client.bytes_sent / 1000:.1f} kB sent, "
+                  f"snapshots {client.snapshot_bytes / 1000:.1f} kB vs {client.snapshot_full_bytes / 1000:.1f} kB full "
+                  f"({saved:.0%} saved, {client.keyframes} keyframes, {client.deltas} deltas), "
+                  f"queue {client.outbox.depth} messages / {client.outbox.queued_bytes / 1000:.1f} kB, "
+                  f"{client.outbox.coalesced} coalesced"
+                  f"{f', rtt {client.rtt * 1000:.0f} ms' if client.rtt is not None else ''}"
+                  f"{', lagging' if client.degraded else ''}")
+        if self.metrics.slow_clients_dropped:
+            print(f"{self.metrics.slow_clients_dropped} slow players dropped so far")
 
-def handle_messages(identifier: str):
-    client_info = players[identifier]
-    conn: socket.socket = client_info["socket"]
-    username = client_info["username"]
+    def poll(self, timeout):
+        """
+        Wait for socket activity once and dispatch every ready socket
 
-    while True:
+        Args:
+            timeout (float): seconds to wait, None blocks until something is ready
+        """
+
+        for key, mask in self.selector.select(timeout):
+            if key.fileobj is self.udp:
+                self._read_datagrams()
+                continue
+            if key.fileobj is self.control:
+                self._read_control()
+                continue
+            if key.data is None:
+                self._accept()
+                continue
+            if isinstance(key.data, Waiting):
+                self._read_waiting(key.data)
+                continue
+
+            client: Client = key.data
+            if mask & selectors.EVENT_READ:
+                self._read(client)
+            if mask & selectors.EVENT_WRITE and not client.closed:
+                self._flush(client)
+
+    def _accept(self):
+        # Accept new connection and assign unique ID, or queue it while the server is full
         try:
-            msg = conn.recv(MSG_SIZE)
-        except ConnectionResetError:
-            break
+            conn, addr = self.sock.accept()
+        except BlockingIOError:
+            return
 
-        if not msg:
-            break
+        new_id = self.ids.acquire()
+        if new_id is None:
+            self._enqueue(conn, addr)
+            return
+        self._admit(conn, addr, new_id)
 
-        msg_decoded = msg.decode("utf8")
+    def _enqueue(self, conn: socket.socket, addr):
+        if len(self.waiting) >= self.max_waiting:
+            conn.close()
+            self.metrics.rejected += 1
+            print(f"Server is full, turned away {addr}...")
+            return
 
+        waiting = Waiting(conn, addr)
+        self.waiting.append(waiting)
+        conn.setblocking(False)
+        self.selector.register(conn, selectors.EVENT_READ, waiting)
+        self._send_queue_position(waiting, len(self.waiting))
+        print(f"Server is full, {addr} is waiting at position {len(self.waiting)}...")
+
+    def _send_queue_position(self, waiting: Waiting, position: int):
         try:
-            left_bracket_index = msg_decoded.index("{")
-            right_bracket_index = msg_decoded.index("}") + 1
-            msg_decoded = msg_decoded[left_bracket_index:right_bracket_index]
-        except ValueError:
-            continue
+            waiting.conn.send(encode_frame(JSON.encode({"object": "queued", "position": position})))
+        except OSError:
+            pass
 
+    def _read_waiting(self, waiting: Waiting):
+        # Queued clients have nothing to say yet; this only notices when they give up
         try:
-            msg_json = json.loads(msg_decoded)
-        except Exception as e:
-            print(e)
-            continue
-
-        print(f"Received message from player {username} with ID {identifier}")
-
-        if msg_json["object"] == "player":
-            players[identifier]["position"] = msg_json["position"]
-            players[identifier]["rotation"] = msg_json["rotation"]
-            players[identifier]["health"] = msg_json["health"]
-
-        # Tell other players about player moving
-        for player_id in players:
-            if player_id != identifier:
-                player_info = players[player_id]
-                player_conn: socket.socket = player_info["socket"]
-                try:
-                    player_conn.sendall(msg_decoded.encode("utf8"))
-                except OSError:
-                    pass
-
-    # Tell other players about player leaving
-    for player_id in players:
-        if player_id != identifier:
-            player_info = players[player_id]
-            player_conn: socket.socket = player_info["socket"]
+            data = waiting.conn.recv(4096)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            data = b""
+        if not data:
+            self._drop_waiting(waiting)
+
+    def _drop_waiting(self, waiting: Waiting):
+        try:
+            self.waiting.remove(waiting)
+        except ValueError:
+            pass
+        try:
+            self.selector.unregister(waiting.conn)
+        except (KeyError, ValueError):
+            pass
+        waiting.conn.close()
+
+    def _admit_waiting(self):
+        # Hand free slots to queued connections in arrival order, then tell the rest where they stand
+        admitted = False
+        while self.waiting and self.ids.available():
+            waiting = self.waiting.popleft()
+            self.selector.unregister(waiting.conn)
+            self._admit(waiting.conn, waiting.addr, self.ids.acquire())
+            admitted = True
+        if admitted:
+            for position, waiting in enumerate(self.waiting, 1):
+                self._send_queue_position(waiting, position)
+
+    def _admit(self, conn: socket.socket, addr, new_id: str):
+        # Greet the connection; its join is read by the event loop like any other message
+        conn.setblocking(False)
+        # The outbox already coalesces what is queued, so Nagle would only delay it further
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        client = Client(conn, new_id, "", handshake_decoder(), queue_limit=self.queue_limit)
+        client.addr = addr
+        client.handshake_deadline = time.monotonic() + self.handshake_timeout
+        self.handshakes[new_id] = client
+        self.selector.register(conn, selectors.EVENT_READ, client)
+        hello = {
+            "object": "hello",
+            "id": new_id,
+            "codecs": SUPPORTED_CODECS,
+            "rooms": {room.name: len(room) for room in self.rooms.values()}
+        }
+        if self.udp:
+            hello["udp"] = self.port
+            hello["token"] = client.udp_token
+        if self.movement is not None:
+            hello["movement"] = "server"
+        self.send(client, encode_frame(JSON.encode(hello)))
+
+    def _expire_handshakes(self, now: float):
+        # Handshakes start in deadline order, so only the oldest ones can be due
+        while self.handshakes:
+            client = next(iter(self.handshakes.values()))
+            if client.handshake_deadline > now:
+                return
+            print(f"Connection from {client.addr} timed out during the handshake...")
+            self._disconnect(client)
+
+    def _read_control(self):
+        # The supervisor hands over connections that finished the hello, together with everything read from them
+        while True:
             try:
-                player_conn.send(json.dumps({"id": identifier, "object": "player", "joined": False, "left": True}).encode("utf8"))
+                msg, fds, flags, _ = socket.recv_fds(self.control, MAX_CONTROL_SIZE, 1)
+            except (BlockingIOError, InterruptedError):
+                return
             except OSError:
-                pass
+                msg, fds, flags = b"", [], 0
+            if not msg:
+                print("Supervisor went away, shutting down...")
+                self.running = False
+                return
+            if not fds:
+                continue
+
+            conn = socket.socket(fileno=fds[0])
+            for fd in fds[1:]:
+                os.close(fd)
+            # A broken handoff only costs its own connection
+            try:
+                player_id, addr, stream = decode_handoff(msg)
+            except Exception as e:
+                print(f"Dropped a connection with an unreadable handoff: {e!r}")
+                conn.close()
+                continue
+            decoder = handshake_decoder()
+            try:
+                if flags & (socket.MSG_TRUNC | socket.MSG_CTRUNC):
+                    raise FrameError("Handoff truncated")
+                frames = decoder.feed(stream)
+                if not frames:
+                    raise FrameError("Handoff without a join")
+            except FrameError as e:
+                print(f"Dropped connection from {addr}: {e}")
+                conn.close()
+                self._release_id(player_id)
+                continue
+            conn.setblocking(False)
+            client = Client(conn, player_id, "", decoder, queue_limit=self.queue_limit)
+            client.addr = addr
+            self.selector.register(conn, selectors.EVENT_READ, client)
+            self._join(client, frames[0], frames[1:])
+
+    def _join(self, client: Client, join: bytes, early_frames: list):
+        """
+        Put a client that answered the hello into the room it asked for
+
+        Args:
+            client (Client): the new client, its socket registered with the selector
+            join (bytes): the client's join frame
+            early_frames (list): frames the client sent right behind its join
+        """
+
+        # Past the join, frames may be as large as any message
+        client.decoder.max_frame_size = MAX_FRAME_SIZE
+        try:
+            username, codec, name = parse_join(join)
+        except ValueError:
+            self._reject(client, "malformed join")
+            return
+        client.username = username
+        client.codec = codec
+
+        room = self.rooms.get(name)
+        if room is None and len(self.rooms) < self.max_rooms:
+            room = self.rooms[name] = Room(name, self.max_players, self.aoi_cell_size, self.aoi_radius)
+            print(f"Room {name} opened...")
+        if room is None:
+            self._reject(client, "no free rooms")
+            return
+        if room.is_full():
+            self._queue_for_room(room, client, early_frames)
+            return
+        self._enter_room(room, client, early_frames)
+
+    def _queue_for_room(self, room: Room, client: Client, early_frames: list):
+        # The client keeps its id and connection and takes the next seat that frees up in the room
+        if len(room.waiting) >= self.max_waiting:
+            self._reject(client, "room is full")
+            return
+        client.queued_room = room
+        room.waiting.append((client, early_frames))
+        self._send_room_position(room, client, len(room.waiting))
+        print(f"Room {room.name} is full, {client.addr} is waiting at position {len(room.waiting)}...")
 
-    print(f"Player {username} with ID {identifier} has left the game...")
-    del players[identifier]
-    conn.close()
+    def _admit_to_room(self, room: Room):
+        # Give free seats to the room's queue in arrival order, then tell the rest where they stand
+        admitted = False
+        while room.waiting and not room.is_full():
+            client, early_frames = room.waiting.popleft()
+            client.queued_room = None
+            self._enter_room(room, client, early_frames)
+            admitted = True
+        if admitted:
+            for position, (client, _) in enumerate(room.waiting, 1):
+                self._send_room_position(room, client, position)
 
+    def _send_room_position(self, room: Room, client: Client, position: int):
+        self.send(client, encode_frame(JSON.encode({"object": "queued", "position": position, "room": room.name})))
 
-def main():
-    print("Server started, listening for new connections...")
+    def _enter_room(self, room: Room, client: Client, early_frames: list):
+        """
+        Seat a client in a room that has space for it
 
-    while True:
-        # Accept new connection and assign unique ID
-        conn, addr = s.accept()
-        new_id = generate_id(players, MAX_PLAYERS)
-        conn.send(new_id.encode("utf8"))
-        username = conn.recv(MSG_SIZE).decode("utf8")
-        new_player_info = {"socket": conn, "username": username, "position": (0, 1, 0), "rotation": 0, "health": 100}
+        Args:
+            room (Room): the room
+            client (Client): the client, its join already parsed
+            early_frames (list): frames the client sent right behind its join
+        """
+
+        new_id = client.id
+        username = client.username
+        codec = client.codec
+        reply = {"object": "room", "name": room.name}
+        if self.control and self.udp:
+            # Clients handed over by a supervisor learn this worker's UDP port only now
+            reply["udp"] = self.port
+            reply["token"] = client.udp_token
+        # Everyone already in the room arrives in one message, however many they are, and in the same write as the
+        # reply so the second small segment does not wait for the client's delayed ACK
+        self.send(client, encode_frame(JSON.encode(reply)) + encode_frame(codec.encode({
+            "object": "welcome",
+            "players": [{
+                "id": player_id,
+                "username": player_info["username"],
+                "position": player_info["position"],
+                "health": player_info["health"]
+            } for player_id, player_info in room.players.items()]
+        })))
+        if client.closed:
+            return
+        client.room = room
+
+        new_player_info = {"username": username, "position": SPAWN_POSITION, "rotation": 0, "health": 100}
+        if self.movement is not None:
+            client.movement = MovementState(SPAWN_POSITION)
+            client.input_time = time.monotonic()
+        room.position_history.add(new_id)
 
         # Tell existing players about new player
-        for player_id in players:
-            if player_id != new_id:
-                player_info = players[player_id]
-                player_conn: socket.socket = player_info["socket"]
-                try:
-                    player_conn.send(json.dumps({
-                        "id": new_id,
-                        "object": "player",
-                        "username": new_player_info["username"],
-                        "position": new_player_info["position"],
-                        "health": new_player_info["health"],
-                        "joined": True,
-                        "left": False
-                    }).encode("utf8"))
-                except OSError:
-                    pass
-
-        # Tell new player about existing players
-        for player_id in players:
-            if player_id != new_id:
-                player_info = players[player_id]
-                try:
-                    conn.send(json.dumps({
-                        "id": player_id,
-                        "object": "player",
-                        "username": player_info["username"],
-                        "position": player_info["position"],
-                        "health": player_info["health"],
-                        "joined": True,
-                        "left": False
-                    }).encode("utf8"))
-                    time.sleep(0.1)
-                except OSError:
-                    pass
+        self.broadcast(room, {
+            "id": new_id,
+            "object": "player",
+            "username": new_player_info["username"],
+            "position": new_player_info["position"],
+            "health": new_player_info["health"],
+            "joined": True,
+            "left": False
+        })
 
         # Add new player to players list, effectively allowing it to receive messages from other players
-        players[new_id] = new_player_info
+        new_player_info["client"] = client
+        room.players.add(new_id, new_player_info)
+        self.clients.add(new_id, client)
+        room.world_changed = True
+        self.metrics.connections += 1
+        if self.recorder is not None:
+            self.recorder.join(client)
+
+        print(f"New connection from {client.addr}, assigned ID: {new_id} in room {room.name}...")
+
+        # Anything the client sent right behind its join was read together with it
+        self._handle_frames(client, early_frames)
+
+    def _reject(self, client: Client, reason: str):
+        self.send(client, encode_frame(JSON.encode({"object": "rejected", "reason": reason})))
+        self.metrics.rejected += 1
+        self._disconnect(client)
+
+    def _release_id(self, player_id: str):
+        # Only free the identifier once nobody can still be sent anything about the old player
+        if self.control:
+            # Identifiers belong to the supervisor
+            try:
+                self.control.send(JSON.encode({"left": player_id}))
+            except OSError:
+                pass
+            return
+        self.ids.release(player_id)
+        self._admit_waiting()
+
+    def _close_room(self, room: Room):
+        if self.rooms.get(room.name) is room:
+            del self.rooms[room.name]
+            print(f"Room {room.name} closed after {room.ticks_run} ticks and {room.cpu_time * 1000:.1f} ms CPU...")
+
+    def _read(self, client: Client):
+        try:
+            frames = client.decoder.recv_from(client.conn)
+        except (BlockingIOError, InterruptedError):
+            return
+        except (OSError, FrameError):
+            frames = None
+
+        if frames is None:
+            self._disconnect(client)
+            return
+
+        self.metrics.messages_received["tcp"] += len(frames)
+        self.metrics.bytes_received["tcp"] += sum(map(len, frames)) + HEADER_SIZE * len(frames)
+        if client.queued_room is not None:
+            # Waiting for a seat, there is nothing to act on before the client is in the room
+            return
+        if client.room is None:
+            # Still in the handshake, the first frame is the join
+            if frames:
+                del self.handshakes[client.id]
+                self._join(client, frames[0], frames[1:])
+            return
+        self._handle_frames(client, frames)
 
-        # Start thread to receive messages from client
-        msg_thread = threading.Thread(target=handle_messages, args=(new_id,), daemon=True)
-        msg_thread.start()
+    def _handle_frames(self, client: Client, frames: list):
+        room = client.room
+        started = time.thread_time()
+        self._handle_payloads(client, frames)
+        room.cpu_time += time.thread_time() - started
 
-        print(f"New connection from {addr}, assigned ID: {new_id}...")
+    def _handle_payloads(self, client: Client, frames: list):
+        for payload in frames:
+            if client.closed:
+                return
+
+            msg_json = self._decode(client, payload)
+            if msg_json is None:
+                continue
+            if not self._handle_safely(client, msg_json, payload):
+                return
+            if self.recorder is not None:
+                self.recorder.message(client, payload)
+
+    def _decode(self, client: Client, payload: bytes):
+        # Everything past this point may rely on the message having the fields and types of its kind
+        try:
+            return validate_message(client.codec.decode(payload))
+        except Exception as e:
+            self.metrics.malformed_messages += 1
+            print(f"Dropped malformed message from player {client.username} with ID {client.id}: {e!r}")
+            return None
+
+    def _handle_safely(self, client: Client, msg_json: dict, payload: bytes) -> bool:
+        # One event loop serves every room, so a message that still breaks the handling only costs its sender
+        try:
+            self.handle_message(client, msg_json, payload)
+        except Exception as e:
+            self.metrics.malformed_messages += 1
+            print(f"Disconnecting player {client.username} with ID {client.id} over a bad message: {e!r}")
+            self._disconnect(client)
+            return False
+        return True
+
+    def _read_datagrams(self):
+        while True:
+            try:
+                data, addr = self.udp.recvfrom(65535)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                # ICMP errors from clients that went away surface here; they say nothing about other clients
+                continue
+
+            try:
+                player_id, token, sequence, payload = decode_datagram(data)
+            except ValueError:
+                continue
+            client: Client = self.clients.get(str(player_id))
+            if client is None or client.udp_token != token:
+                continue
+            self.metrics.messages_received["udp"] += 1
+            self.metrics.bytes_received["udp"] += len(data)
+
+            if client.udp_addr != addr:
+                client.udp_addr = addr
+                client.udp_sequence = 0
+                self.send(client, encode_frame(client.codec.encode({"object": "udp_ready"})))
+            if not payload:
+                continue
+            # Anything older than what we already applied is stale
+            if sequence <= client.udp_sequence:
+                self.metrics.stale_datagrams += 1
+                continue
+            client.udp_sequence = sequence
+
+            msg_json = self._decode(client, payload)
+            # Only unreliable traffic is accepted here, events keep going over TCP
+            if msg_json is None or msg_json["object"] not in ("player", "ack"):
+                continue
+            room = client.room
+            started = time.thread_time()
+            if self._handle_safely(client, msg_json, payload) and self.recorder is not None:
+                self.recorder.message(client, payload)
+            room.cpu_time += time.thread_time() - started
+
+    def send_datagram(self, client: Client, sequence: int, payload: bytes):
+        data = encode_datagram(0, client.udp_token, sequence, payload)
+        try:
+            self.udp.sendto(data, client.udp_addr)
+        except OSError:
+            # Full socket buffer or an unreachable client; this channel is allowed to lose data
+            return
+        client.bytes_sent += len(data)
+        self.metrics.messages_sent["udp"] += 1
+        self.metrics.bytes_sent["udp"] += len(data)
+
+    def handle_message(self, client: Client, msg_json: dict, raw: bytes):
+        """
+        Apply a decoded client message. Player state is folded into the next snapshot and bullets are simulated
+        here, since the server alone decides hits; clients' own health updates are ignored. Anything else is
+        relayed to every other player in the sender's room straight away
+
+        Args:
+            client (Client): the sender
+            msg_json (dict): decoded message
+            raw (bytes): the message as the client encoded it, relayed as is to clients using the same codec
+        """
+
+        room = client.room
+        if msg_json.get("object") == "ack":
+            tick = msg_json["tick"]
+            if tick > client.acked_tick and tick in client.views:
+                client.acked_tick = tick
+                sent_at = room.tick_times.get(tick)
+                if sent_at is not None:
+                    sample = time.monotonic() - sent_at
+                    client.rtt = sample if client.rtt is None else client.rtt + (sample - client.rtt) * RTT_GAIN
+            return
+
+        if msg_json.get("object") == "input":
+            if self.movement is not None:
+                self.apply_input(client, msg_json)
+            return
+
+        if msg_json.get("object") == "player":
+            # Health is decided by the server's bullet simulation, the client's own value is ignored
+            player_info = room.players[client.id]
+            position = msg_json["position"]
+            if self.movement is not None:
+                # Clients that do not own their movement only report that they respawned, which puts them where the
+                # restart decided; arriving in order with the inputs, it also marks where the old life's inputs end
+                if client.respawn_at is None:
+                    return
+                position = client.respawn_at
+                client.respawn_at = None
+                client.movement = MovementState(position)
+            player_info["position"] = position
+            player_info["rotation"] = msg_json["rotation"]
+            room.position_history.record(
+                client.id, time.monotonic(), position, msg_json["rotation"], player_info["health"]
+            )
+            room.world_changed = True
+            return
+
+        if msg_json.get("object") == "health_update":
+            return
+
+        if msg_json.get("object") == "restart":
+            for player_id, player_info in room.players.items():
+                player_info["health"] = 100
+                if self.movement is not None:
+                    player_info["client"].respawn_at = spawn_position(msg_json["seed"], player_id)
+            room.world_changed = True
+
+        recipients = None
+        if msg_json.get("object") == "bullet":
+            if not valid_shot(msg_json):
+                # Not a shot anyone could have fired, and routing it would walk the interest grid off the map
+                self.metrics.malformed_messages += 1
+                return
+            self._spawn_projectile(room, client, msg_json)
+            # Only players the shot can pass close to need to render it
+            direction = bullet_direction(msg_json["direction"], msg_json["x_direction"])
+            recipients = room.grid.along(msg_json["position"], direction, shot_speed(msg_json) * BULLET_LIFETIME)
+
+        self.broadcast(room, msg_json, exclude=client.id, frames={client.codec.name: encode_frame(raw)}, recipients=recipients)
+
+    def apply_input(self, client: Client, command: dict):
+        """
+        Move a player by one of its input commands. A client can not move faster than real time by sending longer
+        or more commands: their durations are paid from a budget that only refills as time passes
+
+        Args:
+            client (Client): the sender
+            command (dict): the input command, see shared/movement.py
+        """
+
+        seq = command["seq"]
+        if seq <= client.input_seq:
+            return
+        now = time.monotonic()
+        client.input_budget = min(MAX_INPUT_AHEAD, client.input_budget + now - client.input_time)
+        client.input_time = now
+        dt = max(0.0, min(float(command["dt"]), client.input_budget))
+        client.input_budget -= dt
+        if dt != command["dt"]:
+            command = dict(command, dt=dt)
+        self.movement.step(client.movement, command)
+        client.input_seq = seq
+
+        room = client.room
+        player_info = room.players[client.id]
+        player_info["position"] = client.movement.position
+        player_info["rotation"] = command["yaw"]
+        room.position_history.record(client.id, now, player_info["position"], command["yaw"], player_info["health"])
+        room.world_changed = True
+
+    def report_movement(self, room: Room):
+        """
+        Send every player that moved since the last tick where its inputs took it
+
+        Args:
+            room (Room): the room to report on
+        """
+
+        for player_id in room.players.ids():
+            client: Client = room.players[player_id]["client"]
+            if client.input_seq == client.reported_seq or client.movement is None:
+                continue
+            client.reported_seq = client.input_seq
+            payload = client.codec.encode(client.movement.to_message(client.input_seq))
+            if client.udp_addr and len(payload) <= MAX_PAYLOAD_SIZE:
+                self.send_datagram(client, room.tick, payload)
+            else:
+                self.send(client, encode_frame(payload), key="moved")
+
+    def _spawn_projectile(self, room: Room, client: Client, msg: dict):
+        # The shooter saw other players as they were in the last snapshot it received, drawn the interpolation
+        # delay further in the past; the projectiles cap the total at their longest rewind
+        now = time.monotonic()
+        seen_at = room.tick_times.get(msg.get("tick", 0))
+        rewind = now - seen_at + INTERPOLATION_DELAY if seen_at is not None else 0.0
+        room.projectiles.spawn(client.id, msg, rewind)
+
+    def step_projectiles(self, room: Room, now: float):
+        """
+        Move every bullet a room is simulating and apply the damage of the ones that hit a player
+
+        Args:
+            room (Room): the room to simulate
+            now (float): current time from time.monotonic()
+        """
+
+        dt = now - room.last_step_time
+        room.last_step_time = now
+        hits = room.projectiles.step(now, dt, room.players, room.position_history)
+        for projectile, target, damage in hits:
+            player_info = room.players.get(target)
+            if player_info is None or player_info["health"] <= 0:
+                continue
+            player_info["health"] -= damage
+            room.world_changed = True
+            self.broadcast(room, {"object": "health_update", "id": target, "health": player_info["health"]})
+
+    def broadcast(self, room: Room, msg: dict, exclude: str = None, frames: dict = None, recipients=None):
+        """
+        Send a message to every player in a room, encoding it at most once per codec in use
+
+        Args:
+            room (Room): the room whose players get the message
+            msg (dict): message to send
+            exclude (str): identifier of a player to skip
+            frames (dict): frames that are already encoded, keyed by codec name
+            recipients (iterable): identifiers to send to instead of every player
+        """
+
+        frames = {} if frames is None else frames
+        for player_id in room.players.ids() if recipients is None else recipients:
+            player_info = room.players.get(player_id)
+            if player_id == exclude or player_info is None:
+                continue
+            client: Client = player_info["client"]
+            frame = frames.get(client.codec.name)
+            if frame is None:
+                frame = frames[client.codec.name] = encode_frame(client.codec.encode(msg))
+            self.send(client, frame)
+
+    def send(self, client: Client, data: bytes, key=None):
+        """
+        Queue data for a client and write as much as the socket accepts without blocking
+
+        Args:
+            client (Client): recipient
+            data (bytes): encoded frame
+            key: set for state that supersedes earlier unsent frames with the same key, None for reliable events
+        """
+
+        if client.closed:
+            return
+        pending = bool(client.outbox)
+        if not client.outbox.push(data, key):
+            print(f"Dropping player {client.username} with ID {client.id}, {client.outbox.depth} messages queued")
+            self.metrics.slow_clients_dropped += 1
+            self._disconnect(client)
+            return
+        self.metrics.messages_sent["tcp"] += 1
+        if not pending:
+            self._flush(client)
+
+    def _flush(self, client: Client):
+        try:
+            with client.outbox.fill() as data:
+                sent = client.conn.send(data)
+        except (BlockingIOError, InterruptedError):
+            sent = 0
+        except OSError:
+            self._disconnect(client)
+            return
+
+        client.bytes_sent += sent
+        self.metrics.bytes_sent["tcp"] += sent
+        client.outbox.consume(sent)
+        events = selectors.EVENT_READ
+        if client.outbox:
+            events |= selectors.EVENT_WRITE
+        try:
+            self.selector.modify(client.conn, events, client)
+        except (KeyError, ValueError):
+            pass
+
+    def _disconnect(self, client: Client):
+        if client.closed:
+            return
+        self._close_client(client)
+        if client.room is None:
+            # Never made it into a room
+            self.handshakes.pop(client.id, None)
+            room = client.queued_room
+            if room is not None:
+                client.queued_room = None
+                room.waiting = deque(entry for entry in room.waiting if entry[0] is not client)
+                if not len(room) and not room.waiting:
+                    self._close_room(room)
+            self._release_id(client.id)
+            return
+        self.metrics.coalesced_closed += client.outbox.coalesced
+        if self.recorder is not None:
+            self.recorder.leave(client)
+        room = client.room
+        self.clients.remove(client.id)
+        room.players.remove(client.id)
+        room.position_history.remove(client.id)
+        room.world_changed = True
+
+        # Tell other players about player leaving
+        self.broadcast(room, {"id": client.id, "object": "player", "joined": False, "left": True})
+
+        print(f"Player {client.username} with ID {client.id} has left the game...")
+        self._admit_to_room(room)
+        if not len(room):
+            self._close_room(room)
+
+        self._release_id(client.id)
+
+    def _close_client(self, client: Client):
+        client.closed = True
+        try:
+            self.selector.unregister(client.conn)
+        except (KeyError, ValueError):
+            pass
+        client.conn.close()
+
+
+def handshake_decoder() -> FrameDecoder:
+    # Reads at most one join's worth per call, so whatever the handshake collects stays small
+    return FrameDecoder(HEADER_SIZE + MAX_JOIN_SIZE, MAX_JOIN_SIZE)
+
+
+def encode_handoff(player_id: str, addr, join: bytes, early_frames: list, pending: bytes) -> bytes:
+    """
+    Describe a connection that finished its handshake for the worker taking it over
+
+    Args:
+        player_id (str): the identifier given in the hello
+        addr (tuple): the client's address
+        join (bytes): the join frame
+        early_frames (list): complete frames read behind the join
+        pending (bytes): bytes of an incomplete frame read behind those
+
+    Returns:
+        bytes: the message to send along with the socket
+    """
+
+    header = JSON.encode({"id": player_id, "addr": addr})
+    stream = b"".join(map(encode_frame, [join, *early_frames])) + pending
+    return HANDOFF_HEADER.pack(len(header)) + header + stream
+
+
+def decode_handoff(msg: bytes) -> tuple:
+    """
+    Read a handoff message
+
+    Args:
+        msg (bytes): the message sent along with the socket
+
+    Returns:
+        tuple: the player's identifier, its address and the stream bytes read during the handshake, starting with
+        the join frame
+    """
+
+    (length,) = HANDOFF_HEADER.unpack_from(msg)
+    start = HANDOFF_HEADER.size + length
+    handoff = JSON.decode(msg[HANDOFF_HEADER.size:start])
+    return str(handoff["id"]), tuple(handoff["addr"]), msg[start:]
+
+
+def parse_join(payload: bytes):
+    """
+    Read the client's answer to the hello message
+
+    Args:
+        payload (bytes): the join frame, either a JSON join message or a bare username from older clients
+
+    Returns:
+        tuple: the username, the codec to use with this client and the name of the room to join
+
+    Raises:
+        ValueError: if the join message has a username, codec or room that is not a string
+    """
+
+    try:
+        join = json.loads(payload)
+    except ValueError:
+        join = None
+    if not isinstance(join, dict):
+        return payload.decode("utf8", errors="replace"), JSON, DEFAULT_ROOM
+    username = join.get("username", "player")
+    codec = join.get("codec")
+    room = join.get("room")
+    if not isinstance(username, str) or not all(value is None or isinstance(value, str) for value in (codec, room)):
+        raise ValueError("Malformed join message")
+    return username, CODECS[choose_codec([codec])], room_name(room)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Ursina FPS game server")
+    parser.add_argument("--host", default=ADDR, help="address to bind to")
+    parser.add_argument("--port", type=int, default=PORT, help="port to listen on")
+    parser.add_argument("--max-players", type=int, default=MAX_PLAYERS, help="maximum number of players per room")
+    parser.add_argument("--max-rooms", type=int, default=MAX_ROOMS, help="rooms hosted at the same time")
+    parser.add_argument("--max-waiting", type=int, default=MAX_WAITING, help="connections queued while the server is full, and per full room")
+    parser.add_argument("--handshake-timeout", type=float, default=HANDSHAKE_TIMEOUT, help="seconds a new connection has to send its join")
+    parser.add_argument("--tick-rate", type=float, default=TICK_RATE, help="world snapshots sent per second, e.g. 20, 30 or 60")
+    parser.add_argument("--keyframe-interval", type=float, default=KEYFRAME_INTERVAL, help="seconds between full snapshots")
+    parser.add_argument("--stats-interval", type=float, default=STATS_INTERVAL, help="seconds between bandwidth reports, 0 to disable")
+    parser.add_argument("--no-udp", dest="udp", action="store_false", help="keep all traffic on TCP")
+    parser.add_argument("--queue-limit", type=int, default=QUEUE_LIMIT, help="queued messages per client before it is dropped")
+    parser.add_argument("--max-lag", type=float, default=MAX_LAG, help="seconds a client may fall behind before it is dropped")
+    parser.add_argument("--aoi-cell-size", type=float, default=AOI_CELL_SIZE, help="edge length of the interest grid cells")
+    parser.add_argument("--aoi-radius", type=int, default=AOI_RADIUS, help="cells around a player that get full rate updates")
+    parser.add_argument("--far-rate", type=float, default=FAR_RATE, help="update rate for players outside the area of interest")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="worker processes to spread rooms over, 0 hosts every room in this process")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="serve Prometheus metrics over HTTP on this port, one port per worker from there on")
+    parser.add_argument("--record", help="record every accepted message to this file, see server/replay.py")
+    parser.add_argument("--server-movement", action="store_true",
+                        help="move players by their input commands, clients predict and reconcile")
+    parser.add_argument("--metrics-host", default=METRICS_ADDR, help="address the metrics endpoint binds to")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    options = {
+        "tick_rate": args.tick_rate,
+        "keyframe_interval": args.keyframe_interval,
+        "stats_interval": args.stats_interval,
+        "udp": args.udp,
+        "queue_limit": args.queue_limit,
+        "max_lag": args.max_lag,
+        "aoi_cell_size": args.aoi_cell_size,
+        "aoi_radius": args.aoi_radius,
+        "far_rate": args.far_rate,
+        "max_rooms": args.max_rooms,
+        "max_waiting": args.max_waiting,
+        "metrics_port": args.metrics_port,
+        "metrics_addr": args.metrics_host,
+        "record": args.record,
+        "server_movement": args.server_movement
+    }
+    if args.workers > 0:
+        # Passing sockets between processes needs socket.send_fds, Unix only
+        from supervisor import Supervisor
+        server = Supervisor(args.host, args.port, args.workers, args.max_players, args.max_rooms,
+                            stats_interval=args.stats_interval, server_options=options,
+                            handshake_timeout=args.handshake_timeout)
+    else:
+        server = GameServer(args.host, args.port, max_players=args.max_players,
+                            handshake_timeout=args.handshake_timeout, **options)
+    server.start()
+    try:
+        server.serve_forever()
+    finally:
+        print("Exiting")
+        server.close()
 
 
 if __name__ == "__main__":
@@ -164,6 +1272,3 @@ if __name__ == "__main__":
         pass
     except SystemExit:
         pass
-    finally:
-        print("Exiting")
-        s.close()
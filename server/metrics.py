@@ -0,0 +1,190 @@
+"""
+Live server metrics in the Prometheus text exposition format.
+
+The event loop only bumps plain attributes on a Metrics object, which costs about as much as the statement it sits
+next to. The text is rendered when something scrapes the HTTP endpoint, on the endpoint's own thread, from counters
+and from state the server keeps anyway (rooms, clients, outboxes).
+"""
+
+import threading
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Upper bounds in seconds, spread around the 33 ms budget of a 30 Hz tick
+TICK_BUCKETS = (0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.033, 0.05, 0.1, 0.25)
+
+
+class Histogram:
+    """
+    Fixed bucket histogram.
+
+    Args:
+        buckets (tuple): sorted upper bounds of the buckets, an implicit +Inf bucket follows them
+    """
+
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name: str, labels: str = "") -> list:
+        """
+        Render the histogram's samples
+
+        Args:
+            name (str): metric name
+            labels (str): extra labels, already formatted as key="value" pairs
+
+        Returns:
+            list: lines of the exposition format
+        """
+
+        prefix = labels + "," if labels else ""
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + ("+Inf",), self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+        suffix = f"{{{labels}}}" if labels else ""
+        lines.append(f"{name}_sum{suffix} {self.sum}")
+        lines.append(f"{name}_count{suffix} {self.count}")
+        return lines
+
+
+class Metrics:
+    """
+    Counters the game server updates as it runs. Everything only ever grows, rates come from the scraper.
+    """
+
+    def __init__(self):
+        self.messages_received = {"tcp": 0, "udp": 0}
+        self.bytes_received = {"tcp": 0, "udp": 0}
+        self.messages_sent = {"tcp": 0, "udp": 0}
+        self.bytes_sent = {"tcp": 0, "udp": 0}
+        self.malformed_messages = 0
+        self.stale_datagrams = 0
+        self.snapshots_skipped = 0
+        self.slow_clients_dropped = 0
+        # Outboxes of clients that are gone, live ones are summed when rendering
+        self.coalesced_closed = 0
+        self.connections = 0
+        self.rejected = 0
+        self.tick_duration = Histogram(TICK_BUCKETS)
+
+
+def escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def render(server) -> str:
+    """
+    Format the server's metrics
+
+    Args:
+        server (GameServer): the server to describe
+
+    Returns:
+        str: the metrics in the Prometheus text format
+    """
+
+    metrics: Metrics = server.metrics
+    rooms = list(server.rooms.values())
+    # Walked more than once below
+    clients = list(server.clients.values())
+    lines = []
+
+    def family(name, kind, help_text, samples):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            lines.append(f"{name}{{{labels}}} {value}" if labels else f"{name} {value}")
+
+    family("ursina_messages_received_total", "counter", "Messages received from clients.",
+           [(f'transport="{transport}"', count) for transport, count in metrics.messages_received.items()])
+    family("ursina_received_bytes_total", "counter", "Bytes received from clients, including framing.",
+           [(f'transport="{transport}"', count) for transport, count in metrics.bytes_received.items()])
+    family("ursina_messages_sent_total", "counter", "Messages queued or sent to clients.",
+           [(f'transport="{transport}"', count) for transport, count in metrics.messages_sent.items()])
+    family("ursina_sent_bytes_total", "counter", "Bytes written to client sockets.",
+           [(f'transport="{transport}"', count) for transport, count in metrics.bytes_sent.items()])
+    family("ursina_malformed_messages_total", "counter", "Messages dropped because they could not be decoded or applied.",
+           [("", metrics.malformed_messages)])
+    family("ursina_stale_datagrams_total", "counter", "Datagrams dropped because a newer one was already applied.",
+           [("", metrics.stale_datagrams)])
+    family("ursina_snapshots_skipped_total", "counter", "Snapshots not sent to lagging clients.",
+           [("", metrics.snapshots_skipped)])
+    family("ursina_coalesced_messages_total", "counter", "Queued snapshots replaced by a newer one before being sent.",
+           [("", metrics.coalesced_closed + sum(client.outbox.coalesced for client in clients))])
+    family("ursina_slow_clients_dropped_total", "counter", "Clients disconnected for falling behind.",
+           [("", metrics.slow_clients_dropped)])
+    family("ursina_connections_total", "counter", "Players that joined a room.", [("", metrics.connections)])
+    family("ursina_rejected_total", "counter", "Connections turned away.", [("", metrics.rejected)])
+
+    lines.append("# HELP ursina_tick_duration_seconds CPU time spent on one room tick.")
+    lines.append("# TYPE ursina_tick_duration_seconds histogram")
+    lines.extend(metrics.tick_duration.lines("ursina_tick_duration_seconds"))
+
+    family("ursina_rooms", "gauge", "Rooms currently open.", [("", len(rooms))])
+    family("ursina_room_players", "gauge", "Players in each room.",
+           [(f'room="{escape(room.name)}"', len(room)) for room in rooms])
+    family("ursina_room_cpu_seconds_total", "counter", "CPU time spent on each room.",
+           [(f'room="{escape(room.name)}"', room.cpu_time) for room in rooms])
+    family("ursina_waiting_connections", "gauge", "Connections in the admission queue.", [("", len(server.waiting))])
+
+    client_labels = [(client, f'id="{client.id}",room="{escape(client.room.name)}"') for client in clients]
+    family("ursina_client_rtt_seconds", "gauge", "Smoothed time from sending a snapshot to its acknowledgement.",
+           [(labels, client.rtt) for client, labels in client_labels if client.rtt is not None])
+    family("ursina_client_queue_depth", "gauge", "Messages waiting in a client's outbound queue.",
+           [(labels, client.outbox.depth) for client, labels in client_labels])
+    family("ursina_client_queued_bytes", "gauge", "Bytes waiting in a client's outbound queue.",
+           [(labels, client.outbox.queued_bytes) for client, labels in client_labels])
+    return "\n".join(lines) + "\n"
+
+
+class MetricsEndpoint:
+    """
+    HTTP endpoint serving the metrics on a background thread, so scrapes never stall the game loop.
+
+    Args:
+        server (GameServer): the server to describe
+        addr (str): address to bind to, keep it local unless a scraper runs elsewhere
+        port (int): port to listen on
+    """
+
+    def __init__(self, server, addr: str, port: int):
+        self.server = server
+        endpoint = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = render(endpoint.server).encode("utf8")
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((addr, port), Handler)
+        self.httpd.daemon_threads = True
+        self.port = self.httpd.server_address[1]
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="metrics", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
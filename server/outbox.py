@@ -0,0 +1,102 @@
+"""
+Per-connection outbound queue used by the server's event loop.
+"""
+
+import time
+from collections import deque
+
+# Bytes moved from the queue into the socket write buffer per flush.
+WRITE_CHUNK = 64 * 1024
+
+
+class Outbox:
+    """
+    Bounded queue of encoded frames waiting to be written to one client.
+
+    Frames pushed with a key supersede any unsent frame with the same key, so a client that falls behind
+    only ever gets the latest snapshot. Frames without a key are reliable events and are always delivered in order.
+
+    Args:
+        limit (int): maximum number of queued frames
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.queue = deque()
+        self.keyed = {}
+        self.buffer = bytearray()
+        self.depth = 0
+        self.queued_bytes = 0
+        self.coalesced = 0
+        self.stalled_since = None
+
+    def __bool__(self):
+        return bool(self.buffer) or self.depth > 0
+
+    def push(self, data: bytes, key=None) -> bool:
+        """
+        Queue a frame
+
+        Args:
+            data (bytes): encoded frame
+            key: identifies frames that replace each other, None for frames that must all be delivered
+
+        Returns:
+            bool: False if the queue is over its limit
+        """
+
+        if key is not None:
+            previous = self.keyed.get(key)
+            if previous is not None:
+                # Leave a hole instead of removing from the middle of the deque
+                self.queued_bytes -= len(previous[1])
+                previous[1] = None
+                self.depth -= 1
+                self.coalesced += 1
+
+        entry = [key, data]
+        self.queue.append(entry)
+        if key is not None:
+            self.keyed[key] = entry
+        self.depth += 1
+        self.queued_bytes += len(data)
+        return self.depth <= self.limit
+
+    def fill(self) -> memoryview:
+        """
+        Move queued frames into the write buffer
+
+        Returns:
+            memoryview: bytes ready to be written to the socket
+        """
+
+        buffer = self.buffer
+        while self.queue and len(buffer) < WRITE_CHUNK:
+            key, data = entry = self.queue.popleft()
+            if data is None:
+                continue
+            if key is not None and self.keyed.get(key) is entry:
+                del self.keyed[key]
+            buffer += data
+            self.depth -= 1
+            self.queued_bytes -= len(data)
+        return memoryview(buffer)
+
+    def consume(self, sent: int):
+        """
+        Drop bytes the socket accepted and note whether the client is keeping up
+
+        Args:
+            sent (int): number of bytes written
+        """
+
+        del self.buffer[:sent]
+        if self:
+            if self.stalled_since is None:
+                self.stalled_since = time.monotonic()
+        else:
+            self.stalled_since = None
+
+    def lag(self, now: float) -> float:
+        """Seconds the client has had data waiting that it did not read."""
+        return 0.0 if self.stalled_since is None else now - self.stalled_since
@@ -0,0 +1,208 @@
+"""
+Server side bullet simulation. The server is the only place where hits are decided.
+"""
+
+import math
+
+from shared.ballistics import (
+    BULLET_LIFETIME, DEFAULT_SPEED, HEADSHOT_MULTIPLIER, assign_team, bullet_direction, in_play_area,
+    segment_hits_box, segment_hits_player
+)
+from shared.map_layout import FLOOR_BOX, wall_boxes
+from shared.weapons import WEAPON_CLASSES
+
+# Shots may rewind the world at most this far, so a very laggy shooter can not hit players long out of sight.
+MAX_REWIND = 0.5
+# Edge length of the cells used to find walls near a bullet.
+WALL_CELL_SIZE = 10.0
+# Players further than this from a bullet step can not be touched by it.
+PLAYER_REACH = 3.0
+# Damage is chosen by the shooter's weapon; anything above this is not a real shot.
+MAX_DAMAGE = 100
+# No weapon fires faster rounds than this, so anything above it is not a real shot either.
+MAX_SPEED = max(weapon["speed"] for weapon in WEAPON_CLASSES.values())
+
+
+def valid_shot(msg: dict) -> bool:
+    """
+    Check that a bullet message describes a shot the server can simulate
+
+    Args:
+        msg (dict): the bullet message the shooter sent
+
+    Returns:
+        bool: True if it starts from three finite coordinates inside the play area and aims in a finite direction
+    """
+
+    position = msg.get("position")
+    if not isinstance(position, (list, tuple)) or len(position) != 3:
+        return False
+    numbers = (*position, msg.get("direction"), msg.get("x_direction"))
+    if not all(isinstance(value, (int, float)) and math.isfinite(value) for value in numbers):
+        return False
+    return in_play_area(position)
+
+
+def shot_speed(msg: dict) -> float:
+    """
+    Speed of a shot, clamped to what a weapon can fire
+
+    Args:
+        msg (dict): the bullet message the shooter sent
+
+    Returns:
+        float: the speed in units per second
+    """
+
+    speed = float(msg.get("speed", DEFAULT_SPEED))
+    return max(0.0, min(MAX_SPEED, speed)) if math.isfinite(speed) else DEFAULT_SPEED
+
+
+class Projectile:
+    __slots__ = ("shooter", "team", "position", "velocity", "damage", "age", "rewind")
+
+    def __init__(self, shooter: str, team, position, velocity, damage: int, rewind: float):
+        self.shooter = shooter
+        self.team = team
+        self.position = position
+        self.velocity = velocity
+        self.damage = damage
+        self.age = 0.0
+        self.rewind = rewind
+
+
+class ProjectileSimulator:
+    """
+    Moves every live bullet along its path and reports hits against walls and players.
+
+    Players are tested where they were rewind seconds before the bullet's current time, which is where the
+    shooter saw them when pulling the trigger.
+
+    Args:
+        boxes (list): static (center, size) boxes, the map and floor by default
+    """
+
+    def __init__(self, boxes: list = None):
+        self.boxes = wall_boxes() if boxes is None else list(boxes)
+        self.floor = FLOOR_BOX if boxes is None else None
+        self.projectiles = []
+        self.cells = {}
+        for index, (center, size) in enumerate(self.boxes):
+            for cell in self._cells_between(
+                (center[0] - size[0] / 2, center[2] - size[2] / 2),
+                (center[0] + size[0] / 2, center[2] + size[2] / 2)
+            ):
+                self.cells.setdefault(cell, []).append(index)
+
+    @staticmethod
+    def _cells_between(low, high):
+        for x in range(math.floor(low[0] / WALL_CELL_SIZE), math.floor(high[0] / WALL_CELL_SIZE) + 1):
+            for z in range(math.floor(low[1] / WALL_CELL_SIZE), math.floor(high[1] / WALL_CELL_SIZE) + 1):
+                yield x, z
+
+    def spawn(self, shooter: str, msg: dict, rewind: float = 0.0) -> Projectile:
+        """
+        Start simulating a shot
+
+        Args:
+            shooter (str): identifier of the player who fired
+            msg (dict): the bullet message the shooter sent
+            rewind (float): seconds the shooter's view of other players lagged behind the server
+
+        Returns:
+            Projectile: the new bullet
+
+        Raises:
+            ValueError: if the message is not a shot the server can simulate, see valid_shot
+        """
+
+        if not valid_shot(msg):
+            raise ValueError("Bullet outside the play area or without a finite position and direction")
+        speed = shot_speed(msg)
+        direction = bullet_direction(msg["direction"], msg["x_direction"])
+        projectile = Projectile(
+            shooter,
+            msg.get("team"),
+            tuple(map(float, msg["position"])),
+            tuple(axis * speed for axis in direction),
+            max(0, min(MAX_DAMAGE, int(msg["damage"]))),
+            max(0.0, min(MAX_REWIND, rewind))
+        )
+        self.projectiles.append(projectile)
+        return projectile
+
+    def step(self, now: float, dt: float, players: dict, history) -> list:
+        """
+        Advance every bullet by dt seconds
+
+        Args:
+            now (float): server time at the end of the step
+            dt (float): length of the step in seconds
+            players (dict): the server's player dictionary
+            history (PositionHistory): past player positions
+
+        Returns:
+            list: (projectile, target id, damage) for every player hit
+        """
+
+        hits = []
+        alive = []
+        for projectile in self.projectiles:
+            p0 = projectile.position
+            p1 = tuple(p + v * dt for p, v in zip(p0, projectile.velocity))
+            nearest = self._hit_wall(p0, p1)
+
+            target = None
+            headshot = False
+            when = now - projectile.rewind
+            for player_id, player_info in players.items():
+                if player_id == projectile.shooter or player_info["health"] <= 0:
+                    continue
+                if projectile.team and assign_team(player_id) == projectile.team:
+                    continue
+                position = history.position_at(player_id, when)
+                if position is None:
+                    position = tuple(player_info["position"])
+                if _distance_to_segment(position, p0, p1) > PLAYER_REACH:
+                    continue
+                hit = segment_hits_player(p0, p1, position)
+                if hit is not None and (nearest is None or hit[0] < nearest):
+                    nearest, headshot = hit
+                    target = player_id
+
+            if target is not None:
+                damage = projectile.damage * (HEADSHOT_MULTIPLIER if headshot else 1)
+                hits.append((projectile, target, damage))
+                continue
+            if nearest is not None:
+                continue
+
+            projectile.position = p1
+            projectile.age += dt
+            if projectile.age < BULLET_LIFETIME and in_play_area(p1):
+                alive.append(projectile)
+
+        self.projectiles = alive
+        return hits
+
+    def _hit_wall(self, p0, p1):
+        nearest = None
+        if self.floor is not None:
+            nearest = segment_hits_box(p0, p1, *self.floor)
+        indices = set()
+        for cell in self._cells_between((min(p0[0], p1[0]), min(p0[2], p1[2])), (max(p0[0], p1[0]), max(p0[2], p1[2]))):
+            indices.update(self.cells.get(cell, ()))
+        for index in indices:
+            t = segment_hits_box(p0, p1, *self.boxes[index])
+            if t is not None and (nearest is None or t < nearest):
+                nearest = t
+        return nearest
+
+
+def _distance_to_segment(point, p0, p1) -> float:
+    d = [b - a for a, b in zip(p0, p1)]
+    length = d[0] * d[0] + d[1] * d[1] + d[2] * d[2]
+    t = 0.0
+    if length > 0:
+        t = max(0.0, min(1.0, sum((point[axis] - p0[axis]) * d[axis] for axis in range(3)) / length))
+    return math.dist(point, [p0[axis] + d[axis] * t for axis in range(3)])
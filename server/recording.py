@@ -0,0 +1,235 @@
+"""
+Match recording: an append-only log of every message the server accepted, and a sparse index of keyframes into it.
+
+The log starts with a header holding the wall clock time the recording started, followed by records of a kind, the
+seconds since that start, the sender's player id (0 for the server itself) and a payload:
+
+- JOIN: a player entered a room, the payload is JSON with its username, room and codec
+- MESSAGE: a message as the player encoded it, so replaying it needs the codec from the JOIN
+- LEAVE: the player left, no payload
+- KEYFRAME: JSON with every room and the state and codec of every player in it
+
+Every keyframe's time and offset is also appended to the index file next to the log. Readers memory-map both, so
+finding the keyframe before any moment is a binary search over fixed size index entries.
+"""
+
+import json
+import mmap
+import struct
+import time
+
+MAGIC = b"UFPSREC1"
+INDEX_MAGIC = b"UFPSIDX1"
+HEADER = struct.Struct("!8sd")
+INDEX_HEADER = struct.Struct("!8s")
+RECORD = struct.Struct("!BdHI")
+INDEX_ENTRY = struct.Struct("!dQ")
+
+JOIN = 1
+MESSAGE = 2
+LEAVE = 3
+KEYFRAME = 4
+
+KEYFRAME_INTERVAL = 5.0
+# Records are collected in memory and hit the disk in writes of this size.
+BUFFER_SIZE = 1 << 20
+
+
+def index_path(path: str) -> str:
+    return path + ".idx"
+
+
+class Recorder:
+    """
+    Writes the match log and its index.
+
+    Args:
+        path (str): file to create, the index goes to the same path with .idx appended
+        keyframe_interval (float): seconds between keyframes
+        buffer_size (int): bytes buffered before a write to the file
+    """
+
+    def __init__(self, path: str, keyframe_interval: float = KEYFRAME_INTERVAL, buffer_size: int = BUFFER_SIZE):
+        self.path = path
+        self.keyframe_interval = keyframe_interval
+        self.started = time.monotonic()
+        self.next_keyframe = self.started
+        self.log = open(path, "wb", buffering=buffer_size)
+        self.index = open(index_path(path), "wb")
+        self.log.write(HEADER.pack(MAGIC, time.time()))
+        self.index.write(INDEX_HEADER.pack(INDEX_MAGIC))
+        self.offset = HEADER.size
+        self.records = 0
+
+    def _write(self, kind: int, sender: str, payload: bytes, now: float = None):
+        now = time.monotonic() if now is None else now
+        self.log.write(RECORD.pack(kind, now - self.started, int(sender), len(payload)))
+        self.log.write(payload)
+        self.offset += RECORD.size + len(payload)
+        self.records += 1
+
+    def join(self, client):
+        """
+        Record a player entering a room
+
+        Args:
+            client (Client): the player's connection
+        """
+
+        info = {"username": client.username, "room": client.room.name, "codec": client.codec.name}
+        self._write(JOIN, client.id, json.dumps(info).encode("utf8"))
+
+    def message(self, client, payload: bytes):
+        """
+        Record a message the server accepted
+
+        Args:
+            client (Client): the sender
+            payload (bytes): the message as the sender encoded it
+        """
+
+        self._write(MESSAGE, client.id, payload)
+
+    def leave(self, client):
+        self._write(LEAVE, client.id, b"")
+
+    def keyframe(self, rooms, now: float):
+        """
+        Record the state of every room and index it
+
+        Args:
+            rooms (iterable): the server's rooms
+            now (float): current time from time.monotonic()
+        """
+
+        state = {}
+        for room in rooms:
+            players = {}
+            for player_id, player_info in room.players.items():
+                players[player_id] = {
+                    "username": player_info["username"],
+                    "position": player_info["position"],
+                    "rotation": player_info["rotation"],
+                    "health": player_info["health"],
+                    "codec": player_info["client"].codec.name
+                }
+            state[room.name] = players
+        offset = self.offset
+        self._write(KEYFRAME, "0", json.dumps(state).encode("utf8"), now)
+        self.index.write(INDEX_ENTRY.pack(now - self.started, offset))
+        # The index must never point past what the log holds on disk
+        self.log.flush()
+        self.index.flush()
+        self.next_keyframe = now + self.keyframe_interval
+
+    def close(self):
+        self.log.close()
+        self.index.close()
+
+
+class Record:
+    """
+    One entry of a match log.
+
+    Args:
+        kind (int): JOIN, MESSAGE, LEAVE or KEYFRAME
+        time (float): seconds since the recording started
+        sender (str): player id, "0" for the server
+        payload (bytes): the record's data
+        offset (int): position of the record in the log
+    """
+
+    __slots__ = ("kind", "time", "sender", "payload", "offset")
+
+    def __init__(self, kind: int, time: float, sender: str, payload: bytes, offset: int):
+        self.kind = kind
+        self.time = time
+        self.sender = sender
+        self.payload = payload
+        self.offset = offset
+
+
+class LogReader:
+    """
+    Memory-mapped view of a match log and its index.
+
+    Args:
+        path (str): the log file
+    """
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self.log = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.started_at = HEADER.unpack_from(self.log, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a match recording")
+        try:
+            with open(index_path(path), "rb") as f:
+                self.index = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            # Missing or empty index, seeking falls back to the start of the log
+            self.index = None
+        self.keyframes = 0
+        if self.index is not None and self.index[:INDEX_HEADER.size] == INDEX_MAGIC:
+            self.keyframes = (len(self.index) - INDEX_HEADER.size) // INDEX_ENTRY.size
+
+    def close(self):
+        self.log.close()
+        if self.index is not None:
+            self.index.close()
+
+    def keyframe_entry(self, number: int) -> tuple:
+        return INDEX_ENTRY.unpack_from(self.index, INDEX_HEADER.size + number * INDEX_ENTRY.size)
+
+    def seek(self, when: float) -> int:
+        """
+        Find where to start reading to reconstruct the match at a moment
+
+        Args:
+            when (float): seconds since the recording started
+
+        Returns:
+            int: offset of the last keyframe at or before that moment, the first record if there is none
+        """
+
+        low, high = 0, self.keyframes
+        while low < high:
+            middle = (low + high) // 2
+            if self.keyframe_entry(middle)[0] <= when:
+                low = middle + 1
+            else:
+                high = middle
+        if low == 0:
+            return HEADER.size
+        offset = self.keyframe_entry(low - 1)[1]
+        # Ignore index entries written after the log was cut short
+        return offset if offset + RECORD.size <= len(self.log) else HEADER.size
+
+    def records(self, offset: int = HEADER.size):
+        """
+        Iterate over records
+
+        Args:
+            offset (int): where to start, a value returned by seek or a Record's offset
+
+        Yields:
+            Record: every complete record from there to the end of the log
+        """
+
+        log = self.log
+        end = len(log)
+        while offset + RECORD.size <= end:
+            kind, when, sender, length = RECORD.unpack_from(log, offset)
+            start = offset + RECORD.size
+            if start + length > end:
+                return
+            yield Record(kind, when, str(sender), log[start:start + length], offset)
+            offset = start + length
+
+    def duration(self) -> float:
+        last = 0.0
+        if self.keyframes:
+            last = self.keyframe_entry(self.keyframes - 1)[0]
+        for record in self.records(self.seek(last)):
+            last = record.time
+        return last
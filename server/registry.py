@@ -0,0 +1,129 @@
+"""
+Player identifiers and the table of connected players.
+"""
+
+import threading
+from collections import deque
+
+# Identifiers travel as uint16 in the binary codec.
+MAX_ID = 65535
+
+
+class IdAllocator:
+    """
+    Hands out player identifiers from a free list in constant time.
+
+    Released identifiers go to the back of the list, so an id is reused as late as possible and messages still in
+    flight for a player that just left are not mistaken for the next one.
+
+    Args:
+        capacity (int): number of identifiers, 1 to capacity
+    """
+
+    def __init__(self, capacity: int):
+        if not 0 < capacity <= MAX_ID:
+            raise ValueError(f"Player capacity must be between 1 and {MAX_ID}")
+        self.capacity = capacity
+        self.free = deque(range(1, capacity + 1))
+        self.used = set()
+
+    def __len__(self):
+        return len(self.used)
+
+    def available(self) -> int:
+        return len(self.free)
+
+    def acquire(self):
+        """
+        Take an unused identifier
+
+        Returns:
+            str: the identifier, None if every slot is taken
+        """
+
+        if not self.free:
+            return None
+        identifier = self.free.popleft()
+        self.used.add(identifier)
+        return str(identifier)
+
+    def release(self, identifier: str):
+        """
+        Give an identifier back
+
+        Args:
+            identifier (str): identifier returned by acquire
+        """
+
+        value = int(identifier)
+        if value in self.used:
+            self.used.remove(value)
+            self.free.append(value)
+
+
+class PlayerRegistry:
+    """
+    Connected players by identifier.
+
+    Lookups behave like the plain dict the server used before. Iteration goes over an immutable snapshot that is
+    rebuilt only when a player joins or leaves, so relaying to everyone never copies the table and a join or leave
+    in the middle of a broadcast can not break it. Mutations take a lock, so threads other than the event loop
+    (stats, supervisors) can read the table safely.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.players = {}
+        self.snapshot = ()
+
+    def __len__(self):
+        return len(self.snapshot)
+
+    def __contains__(self, player_id):
+        return player_id in self.players
+
+    def __getitem__(self, player_id: str) -> dict:
+        return self.players[player_id]
+
+    def __iter__(self):
+        return iter(self.snapshot)
+
+    def get(self, player_id: str, default=None):
+        return self.players.get(player_id, default)
+
+    def add(self, player_id: str, player_info: dict):
+        with self.lock:
+            self.players[player_id] = player_info
+            self.snapshot = tuple(self.players)
+
+    def remove(self, player_id: str):
+        """
+        Forget a player
+
+        Args:
+            player_id (str): player to remove
+
+        Returns:
+            dict: the player's info, None if it was not registered
+        """
+
+        with self.lock:
+            player_info = self.players.pop(player_id, None)
+            if player_info is not None:
+                self.snapshot = tuple(self.players)
+            return player_info
+
+    def ids(self) -> tuple:
+        return self.snapshot
+
+    def items(self):
+        # Generators over the snapshot: nothing is copied, and players that leave meanwhile are skipped
+        players = self.players
+        for player_id in self.snapshot:
+            player_info = players.get(player_id)
+            if player_info is not None:
+                yield player_id, player_info
+
+    def values(self):
+        for _, player_info in self.items():
+            yield player_info
@@ -0,0 +1,298 @@
+"""
+Play a recorded match back through a running server.
+
+Every recorded player becomes a client that joins the same room with the same username and codec and sends the
+same messages at the same pace, or faster. Ticks in the recorded messages count the recorded server's ticks, so acks
+and bullet ticks are rewritten to the snapshots each replay client actually received. Starting in the middle of a match jumps to the last keyframe before
+that moment through the recording's index, brings in the players that were connected then at their recorded
+state, and goes on from there.
+
+Run with: python server/replay.py match.rec --port 8000 [--start 120] [--speed 4]
+"""
+
+import argparse
+import json
+import os
+import selectors
+import socket
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from shared.framing import FrameDecoder, FrameError, encode_frame, recv_frame
+from shared.protocol import CODECS, JSON
+from recording import JOIN, KEYFRAME, LEAVE, MESSAGE, LogReader
+
+
+class ReplayClient:
+    """
+    Connection standing in for one recorded player.
+
+    Args:
+        username (str): the player's username
+        room (str): room the player was in
+        codec (str): name of the codec the player used, its recorded messages are encoded with it
+    """
+
+    def __init__(self, username: str, room: str, codec: str):
+        self.username = username
+        self.room = room
+        self.codec = CODECS[codec]
+        self.conn = None
+        self.decoder = FrameDecoder()
+        self.pending = []
+        # Latest snapshot tick received from the replay server
+        self.tick = 0
+
+    def connect(self, host: str, port: int, timeout: float) -> bool:
+        """
+        Do the handshake
+
+        Returns:
+            bool: True once the server put the client in its room
+        """
+
+        self.conn = socket.create_connection((host, port), timeout=timeout)
+        pending = self.pending
+        try:
+            while True:
+                hello = JSON.decode(recv_frame(self.conn, self.decoder, pending))
+                if hello.get("object") != "queued":
+                    break
+            join = {"object": "join", "username": self.username, "codec": self.codec.name, "room": self.room}
+            self.conn.sendall(encode_frame(JSON.encode(join)))
+            reply = {"object": "queued"} if "rooms" in hello else {}
+            # A full room answers with its queue position until a seat frees up
+            while reply.get("object") == "queued":
+                reply = JSON.decode(recv_frame(self.conn, self.decoder, pending))
+        except (OSError, FrameError, TypeError, ValueError) as e:
+            print(f"{self.username} could not join: {e}")
+            self.close()
+            return False
+        if reply.get("object") == "rejected":
+            print(f"{self.username} was rejected: {reply.get('reason')}")
+            self.close()
+            return False
+        self.conn.setblocking(False)
+        return True
+
+    def send(self, payload: bytes):
+        self.conn.setblocking(True)
+        try:
+            self.conn.sendall(encode_frame(payload))
+        finally:
+            self.conn.setblocking(False)
+
+    def rewrite(self, payload: bytes):
+        """
+        Move a recorded message onto the replay server's clock
+
+        Acks are replaced by one for the latest snapshot this client received and bullets are stamped with that
+        snapshot, as the game does. Every other message is sent as recorded.
+
+        Args:
+            payload (bytes): the message as the player encoded it
+
+        Returns:
+            bytes: the message to send, None for an ack while no snapshot arrived yet
+        """
+
+        try:
+            msg = self.codec.decode(payload)
+        except Exception:
+            return payload
+        kind = msg.get("object") if isinstance(msg, dict) else None
+        if kind == "ack":
+            if not self.tick:
+                return None
+            return self.codec.encode(dict(msg, tick=self.tick))
+        if kind == "bullet" and "tick" in msg:
+            return self.codec.encode(dict(msg, tick=self.tick))
+        return payload
+
+    def drain(self) -> bool:
+        # Whatever the server sends is read, so it never considers the client too slow, and dropped once the
+        # snapshot ticks are noted
+        try:
+            while True:
+                self._note_ticks()
+                frames = self.decoder.recv_from(self.conn)
+                if frames is None:
+                    return False
+                self.pending.extend(frames)
+        except (BlockingIOError, InterruptedError):
+            return True
+        except (OSError, FrameError):
+            return False
+
+    def _note_ticks(self):
+        for payload in self.pending:
+            try:
+                msg = self.codec.decode(payload)
+            except Exception:
+                continue
+            if isinstance(msg, dict) and msg.get("object") == "snapshot":
+                self.tick = max(self.tick, msg["tick"])
+        self.pending.clear()
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+class Replayer:
+    """
+    Drives the replay clients from a recording.
+
+    Args:
+        reader (LogReader): the recording
+        host (str): server address
+        port (int): server port
+        speed (float): playback speed, 0 sends everything as fast as possible
+        timeout (float): seconds to wait for each handshake
+    """
+
+    def __init__(self, reader: LogReader, host: str, port: int, speed: float = 1.0, timeout: float = 10.0):
+        self.reader = reader
+        self.host = host
+        self.port = port
+        self.speed = speed
+        self.timeout = timeout
+        self.selector = selectors.DefaultSelector()
+        self.clients = {}
+        self.sent = 0
+        self.joined = 0
+
+    def join(self, player_id: str, username: str, room: str, codec: str):
+        self.leave(player_id)
+        client = ReplayClient(username, room, codec)
+        if not client.connect(self.host, self.port, self.timeout):
+            return None
+        self.clients[player_id] = client
+        self.selector.register(client.conn, selectors.EVENT_READ, player_id)
+        self.joined += 1
+        return client
+
+    def leave(self, player_id: str):
+        client = self.clients.pop(player_id, None)
+        if client is not None:
+            self.selector.unregister(client.conn)
+            client.close()
+
+    def send(self, player_id: str, payload: bytes):
+        client = self.clients.get(player_id)
+        if client is None:
+            return
+        payload = client.rewrite(payload)
+        if payload is None:
+            return
+        try:
+            client.send(payload)
+        except OSError:
+            self.leave(player_id)
+            return
+        self.sent += 1
+
+    def restore(self, state: dict):
+        """
+        Bring in every player of a keyframe, at the position it had then
+
+        Args:
+            state (dict): the keyframe's rooms
+        """
+
+        for room, players in state.items():
+            for player_id, info in players.items():
+                client = self.join(player_id, info["username"], room, info["codec"])
+                if client is not None:
+                    self.send(player_id, client.codec.encode({
+                        "object": "player", "id": player_id, "position": info["position"],
+                        "rotation": info["rotation"], "health": info["health"], "joined": False, "left": False
+                    }))
+
+    def wait(self, until: float):
+        # Keep reading from the server while waiting for the next record's time
+        while True:
+            timeout = until - time.perf_counter()
+            for key, _ in self.selector.select(max(0.0, timeout)):
+                client = self.clients.get(key.data)
+                if client is not None and not client.drain():
+                    self.leave(key.data)
+            if timeout <= 0:
+                return
+
+    def run(self, start: float = 0.0, end: float = None):
+        """
+        Play the recording from start to end
+
+        Args:
+            start (float): seconds into the match to start at
+            end (float): seconds into the match to stop at, None plays to the end
+
+        Returns:
+            float: seconds the playback took
+        """
+
+        offset = self.reader.seek(start)
+        began = time.perf_counter()
+        for record in self.reader.records(offset):
+            if end is not None and record.time > end:
+                break
+            if record.time < start or record.kind == KEYFRAME and record.offset == offset:
+                # Catching up from the keyframe: only who is connected matters, the keyframe has the rest
+                if record.kind == KEYFRAME:
+                    for player_id in list(self.clients):
+                        self.leave(player_id)
+                    self.restore(json.loads(record.payload))
+                elif record.kind == JOIN:
+                    info = json.loads(record.payload)
+                    self.join(record.sender, info["username"], info["room"], info["codec"])
+                elif record.kind == LEAVE:
+                    self.leave(record.sender)
+                continue
+
+            # At full speed this still reads whatever the server sent in the meantime
+            self.wait(began + (record.time - start) / self.speed if self.speed > 0 else 0.0)
+            if record.kind == JOIN:
+                info = json.loads(record.payload)
+                self.join(record.sender, info["username"], info["room"], info["codec"])
+            elif record.kind == LEAVE:
+                self.leave(record.sender)
+            elif record.kind == MESSAGE:
+                self.send(record.sender, bytes(record.payload))
+        elapsed = time.perf_counter() - began
+
+        for player_id in list(self.clients):
+            self.leave(player_id)
+        return elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("recording", help="log written by the server's --record option")
+    parser.add_argument("--host", default="127.0.0.1", help="server address")
+    parser.add_argument("--port", type=int, default=8000, help="server port")
+    parser.add_argument("--start", type=float, default=0.0, help="seconds into the match to start at")
+    parser.add_argument("--end", type=float, default=None, help="seconds into the match to stop at")
+    parser.add_argument("--speed", type=float, default=1.0, help="playback speed, 0 for as fast as possible")
+    args = parser.parse_args(argv)
+
+    reader = LogReader(args.recording)
+    duration = reader.duration()
+    print(f"Recording started {time.ctime(reader.started_at)}, {duration:.1f}s long with {reader.keyframes} keyframes")
+    replayer = Replayer(reader, args.host, args.port, args.speed)
+    try:
+        elapsed = replayer.run(args.start, args.end)
+    finally:
+        reader.close()
+    played = min(duration, args.end if args.end is not None else duration) - args.start
+    print(f"Replayed {played:.1f}s of match in {elapsed:.1f}s: {replayer.joined} players, {replayer.sent} messages")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,70 @@
+"""
+A match hosted by the server. Every room has its own players, world state, tick and bullet simulation; the server
+only shares sockets and player identifiers between rooms.
+"""
+
+import time
+from collections import deque
+
+from history import PositionHistory
+from interest import SpatialGrid
+from projectiles import ProjectileSimulator
+from registry import PlayerRegistry
+
+DEFAULT_ROOM = "default"
+MAX_ROOM_NAME = 32
+
+
+def room_name(name) -> str:
+    """
+    Clean up a room name sent by a client
+
+    Args:
+        name: whatever the client put in its join message
+
+    Returns:
+        str: the room name to use, the default room if none was given
+    """
+
+    if not isinstance(name, str):
+        return DEFAULT_ROOM
+    name = "".join(char for char in name.strip() if char.isprintable())[:MAX_ROOM_NAME]
+    return name or DEFAULT_ROOM
+
+
+class Room:
+    """
+    State of one match.
+
+    Args:
+        name (str): name clients use to join the room
+        max_players (int): players allowed in the room
+        aoi_cell_size (float): edge length of the interest grid cells
+        aoi_radius (int): cells around a player that count as its area of interest
+    """
+
+    def __init__(self, name: str, max_players: int, aoi_cell_size: float, aoi_radius: int):
+        now = time.monotonic()
+        self.name = name
+        self.max_players = max_players
+        self.players = PlayerRegistry()
+        # Clients that asked for this room while it was full, with the frames they sent behind their join
+        self.waiting = deque()
+        self.tick = 0
+        self.next_tick_time = now
+        self.last_step_time = now
+        self.tick_times = {}
+        self.world_changed = False
+        self.world_state = {}
+        self.grid = SpatialGrid(aoi_cell_size, aoi_radius)
+        self.position_history = PositionHistory()
+        self.projectiles = ProjectileSimulator()
+        # CPU seconds spent on this room's ticks and messages, and how many ticks it ran
+        self.cpu_time = 0.0
+        self.ticks_run = 0
+
+    def __len__(self):
+        return len(self.players)
+
+    def is_full(self) -> bool:
+        return len(self.players) >= self.max_players
@@ -0,0 +1,372 @@
+"""
+Multi-process server: a supervisor accepts every connection and hands it to the worker process that hosts the room
+the client asked for, so rooms spread over all CPU cores instead of sharing one interpreter.
+
+The supervisor owns the listening socket, the player identifiers and the room directory. After the hello it reads the
+client's join, picks the worker (the one already hosting the room, otherwise the least loaded one) and passes the
+socket to it with SCM_RIGHTS. Workers are plain GameServers that serve UDP on their own port, one above the other
+starting right after the TCP port, and report back when a player leaves so its identifier can be reused.
+"""
+
+import errno
+import multiprocessing
+import selectors
+import socket
+import time
+
+from shared.framing import FrameError, encode_frame
+from shared.protocol import JSON, SUPPORTED_CODECS
+from directory import RoomDirectory
+from main import BACKLOG, HANDSHAKE_TIMEOUT, GameServer, encode_handoff, handshake_decoder, parse_join
+from registry import MAX_ID, IdAllocator
+
+
+class Worker:
+    """
+    The supervisor's handle on one worker process.
+
+    Args:
+        index (int): position of the worker, also its index in the room directory
+        process (multiprocessing.Process): the worker process
+        control (socket.socket): the supervisor's end of the control connection
+        udp_port (int): port the worker serves UDP on
+    """
+
+    def __init__(self, index: int, process, control: socket.socket, udp_port: int):
+        self.index = index
+        self.process = process
+        self.control = control
+        self.udp_port = udp_port
+        self.alive = True
+
+
+class Handshake:
+    """
+    A connection that got its hello and has not sent its join yet.
+
+    Args:
+        conn (socket.socket): non-blocking client socket
+        addr (tuple): the client's address
+        identifier (str): player id given in the hello
+        deadline (float): time.monotonic() by which the join has to arrive
+    """
+
+    def __init__(self, conn: socket.socket, addr, identifier: str, deadline: float):
+        self.conn = conn
+        self.addr = addr
+        self.id = identifier
+        self.deadline = deadline
+        self.decoder = handshake_decoder()
+
+
+class Supervisor:
+    """
+    Accepts connections and spreads rooms over worker processes.
+
+    Args:
+        addr (str): address to bind to
+        port (int): TCP port to listen on, workers use UDP ports port + 1 to port + workers
+        workers (int): number of worker processes
+        max_players (int): maximum number of players allowed in one room
+        max_rooms (int): rooms hosted at the same time over all workers
+        stats_interval (float): seconds between load reports, 0 disables them
+        server_options (dict): keyword arguments for every worker's GameServer
+        handshake_timeout (float): seconds a new connection has to send its join before it is dropped
+    """
+
+    def __init__(self, addr: str, port: int, workers: int, max_players: int, max_rooms: int,
+                 stats_interval: float = 0, server_options: dict = None, handshake_timeout: float = HANDSHAKE_TIMEOUT):
+        self.addr = addr
+        self.port = port
+        self.worker_count = workers
+        self.max_players = max_players
+        self.max_rooms = max_rooms
+        self.stats_interval = stats_interval
+        self.server_options = server_options or {}
+        self.selector = selectors.DefaultSelector()
+        self.sock = None
+        self.directory = None
+        self.workers = []
+        self.ids = IdAllocator(min(MAX_ID, max_players * max_rooms))
+        # Directory slot of every player handed to a worker, counted from the hand-over so a room that is about to
+        # get a player is never given away
+        self.members = {}
+        self.room_players = {}
+        self.handshakes = {}
+        self.handshake_timeout = handshake_timeout
+        self.running = False
+
+    def start(self):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((self.addr, self.port))
+        self.sock.listen(BACKLOG)
+        self.sock.setblocking(False)
+        self.selector.register(self.sock, selectors.EVENT_READ, None)
+        self.port = self.sock.getsockname()[1]
+
+        self.directory = RoomDirectory(self.max_rooms)
+        for index in range(self.worker_count):
+            control, worker_control = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+            udp_port = self.port + 1 + index
+            # A forked worker would otherwise keep the listener and the other workers' control sockets open
+            inherited = [self.sock, control] + [worker.control for worker in self.workers]
+            options = dict(self.server_options)
+            if options.get("metrics_port") is not None:
+                options["metrics_port"] += index
+            if options.get("record"):
+                options["record"] = f"{options['record']}.{index}"
+            process = multiprocessing.Process(
+                target=run_worker,
+                args=(worker_control, inherited, self.addr, udp_port, self.max_players, options),
+                name=f"room-worker-{index}",
+                daemon=True
+            )
+            process.start()
+            worker_control.close()
+            worker = Worker(index, process, control, udp_port)
+            self.workers.append(worker)
+            self.selector.register(control, selectors.EVENT_READ, worker)
+
+        self.running = True
+
+    def close(self):
+        self.running = False
+        for handshake in list(self.handshakes.values()):
+            self._end_handshake(handshake)
+            handshake.conn.close()
+        for worker in self.workers:
+            worker.control.close()
+        for worker in self.workers:
+            worker.process.join(2.0)
+            if worker.process.is_alive():
+                worker.process.terminate()
+        if self.sock:
+            self.sock.close()
+            self.sock = None
+        if self.directory:
+            self.directory.close()
+            self.directory = None
+        self.selector.close()
+
+    def serve_forever(self):
+        print(f"Supervisor started with {self.worker_count} workers, listening for new connections...")
+
+        next_stats_time = time.monotonic() + self.stats_interval
+        while self.running:
+            timeout = self.stats_interval or None
+            if self.handshakes:
+                # Wake up in time to drop the oldest connection that is still quiet
+                remaining = max(0.0, next(iter(self.handshakes.values())).deadline - time.monotonic())
+                timeout = remaining if timeout is None else min(timeout, remaining)
+            for key, _ in self.selector.select(timeout):
+                if key.data is None:
+                    self._accept()
+                elif isinstance(key.data, Handshake):
+                    self._read_handshake(key.data)
+                else:
+                    self._read_control(key.data)
+
+            now = time.monotonic()
+            self._expire_handshakes(now)
+            if self.stats_interval and now >= next_stats_time:
+                self.report_stats()
+                next_stats_time = now + self.stats_interval
+
+    def report_stats(self):
+        for worker, (players, rooms) in zip(self.workers, self.directory.loads(len(self.workers))):
+            state = "" if worker.alive else ", stopped"
+            print(f"Worker {worker.index} (pid {worker.process.pid}): {rooms} rooms, {players} players{state}")
+
+    def _accept(self):
+        try:
+            conn, addr = self.sock.accept()
+        except BlockingIOError:
+            return
+
+        new_id = self.ids.acquire()
+        if new_id is None:
+            self._reject(conn, None, "server is full")
+            return
+
+        # Same handshake as a single process server, except that the UDP port is only known once the room is picked
+        conn.setblocking(False)
+        # Socket options travel with the descriptor to the worker
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        handshake = Handshake(conn, addr, new_id, time.monotonic() + self.handshake_timeout)
+        hello = {"object": "hello", "id": new_id, "codecs": SUPPORTED_CODECS, "rooms": self.directory.rooms()}
+        if self.server_options.get("server_movement"):
+            hello["movement"] = "server"
+        try:
+            # The first write on a fresh connection always fits in the socket buffer
+            conn.send(encode_frame(JSON.encode(hello)))
+        except OSError:
+            conn.close()
+            self.ids.release(new_id)
+            return
+        self.handshakes[new_id] = handshake
+        self.selector.register(conn, selectors.EVENT_READ, handshake)
+
+    def _read_handshake(self, handshake: "Handshake"):
+        try:
+            frames = handshake.decoder.recv_from(handshake.conn)
+        except (BlockingIOError, InterruptedError):
+            return
+        except (OSError, FrameError):
+            frames = None
+        if frames == []:
+            return
+        self._end_handshake(handshake)
+        if frames is None:
+            handshake.conn.close()
+            self.ids.release(handshake.id)
+            return
+        self._hand_over(handshake, frames[0], frames[1:])
+
+    def _end_handshake(self, handshake: "Handshake"):
+        del self.handshakes[handshake.id]
+        self.selector.unregister(handshake.conn)
+
+    def _expire_handshakes(self, now: float):
+        # Handshakes start in deadline order, so only the oldest ones can be due
+        while self.handshakes:
+            handshake = next(iter(self.handshakes.values()))
+            if handshake.deadline > now:
+                return
+            print(f"Connection from {handshake.addr} timed out during the handshake...")
+            self._end_handshake(handshake)
+            handshake.conn.close()
+            self.ids.release(handshake.id)
+
+    def _hand_over(self, handshake: "Handshake", join: bytes, early_frames: list):
+        conn = handshake.conn
+        addr = handshake.addr
+        new_id = handshake.id
+        try:
+            name = parse_join(join)[2]
+        except ValueError:
+            self._reject(conn, new_id, "malformed join")
+            return
+        placement = self._place(name)
+        if placement is None:
+            self._reject(conn, new_id, "no free rooms")
+            return
+        slot, worker = placement
+        # The handshake decoder never holds more than one join's worth, so this always fits one control message
+        handoff = encode_handoff(new_id, addr, join, early_frames, handshake.decoder.take_pending())
+        try:
+            socket.send_fds(worker.control, [handoff], [conn.fileno()])
+        except OSError as e:
+            print(f"Could not hand {addr} to worker {worker.index}: {e}")
+            self._reject(conn, new_id, "server error")
+            if e.errno != errno.EMSGSIZE:
+                self._worker_stopped(worker)
+            return
+        # The worker holds its own copy of the socket now
+        conn.close()
+        self.members[new_id] = slot
+        self.room_players[slot] = self.room_players.get(slot, 0) + 1
+        self.directory.set_players(slot, self.room_players[slot])
+        print(f"New connection from {addr}, assigned ID: {new_id}, handed to worker {worker.index}...")
+
+    def _place(self, name: str):
+        """
+        Find the worker hosting a room, or give the room to the least loaded worker
+
+        Args:
+            name (str): room name
+
+        Returns:
+            tuple: directory slot and Worker, None if no room can be opened
+        """
+
+        found = self.directory.find(name)
+        if found is not None and self.workers[found[1]].alive:
+            return found[0], self.workers[found[1]]
+
+        loads = self.directory.loads(len(self.workers))
+        alive = [worker for worker in self.workers if worker.alive]
+        if not alive:
+            return None
+        worker = min(alive, key=lambda candidate: loads[candidate.index])
+        slot = self.directory.assign(name, worker.index)
+        if slot is None:
+            return None
+        return slot, worker
+
+    def _reject(self, conn: socket.socket, new_id: str, reason: str):
+        try:
+            # Never block the loop on a client that does not read; a frame this small fits in any socket buffer
+            conn.setblocking(False)
+            conn.send(encode_frame(JSON.encode({"object": "rejected", "reason": reason})))
+        except OSError:
+            pass
+        conn.close()
+        if new_id is not None:
+            self.ids.release(new_id)
+
+    def _read_control(self, worker: Worker):
+        while True:
+            try:
+                msg = worker.control.recv(65536, socket.MSG_DONTWAIT)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                msg = b""
+            if not msg:
+                self._worker_stopped(worker)
+                return
+            self._player_left(JSON.decode(msg)["left"])
+
+    def _player_left(self, player_id: str):
+        slot = self.members.pop(player_id, None)
+        self.ids.release(player_id)
+        if slot is None:
+            return
+        self.room_players[slot] -= 1
+        if self.room_players[slot]:
+            self.directory.set_players(slot, self.room_players[slot])
+        else:
+            del self.room_players[slot]
+            self.directory.free(slot)
+
+    def _worker_stopped(self, worker: Worker):
+        if not worker.alive:
+            return
+        worker.alive = False
+        print(f"Worker {worker.index} stopped, its rooms are gone...")
+        try:
+            self.selector.unregister(worker.control)
+        except (KeyError, ValueError):
+            pass
+        for slot in range(self.directory.slots):
+            if self.directory.entry(slot)[1] == worker.index:
+                for player_id in [player_id for player_id, member_slot in self.members.items() if member_slot == slot]:
+                    self._player_left(player_id)
+                self.directory.free(slot)
+
+
+def run_worker(control: socket.socket, inherited: list, addr: str, udp_port: int, max_players: int,
+               server_options: dict):
+    """
+    Entry point of a worker process
+
+    Args:
+        control (socket.socket): the worker's end of the control connection
+        inherited (list): supervisor sockets the worker must not keep open
+        addr (str): address to bind the UDP socket to
+        udp_port (int): port to serve UDP on
+        max_players (int): maximum number of players allowed in one room
+        server_options (dict): keyword arguments for the GameServer
+    """
+
+    for sock in inherited:
+        sock.close()
+    server = GameServer(addr, udp_port, max_players=max_players, control=control, **server_options)
+    server.start()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
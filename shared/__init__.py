@@ -0,0 +1,3 @@
+"""
+Code shared by the game client and the server. Nothing in here may import ursina.
+"""
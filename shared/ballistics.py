@@ -0,0 +1,153 @@
+"""
+Bullet flight and hit tests without a scene graph.
+
+Mirrors what Bullet.update does with ursina raycasts: the same velocity, lifetime and play area bounds, the wall
+boxes from shared/map_layout.py and the colliders Enemy builds in Enemy.__init__ / Enemy._build_humanoid.
+"""
+
+import math
+
+DEFAULT_SPEED = 80.0
+# Bullets despawn after this many seconds, so a shot can never travel further than speed * lifetime.
+BULLET_LIFETIME = 2.0
+# Bullets leaving this box are dropped.
+PLAY_AREA_HALF_SIZE = 140.0
+PLAY_AREA_BOTTOM = -5.0
+PLAY_AREA_TOP = 100.0
+
+# Enemy root entity scale; children and colliders are placed in this scaled space.
+ENEMY_SCALE = (1.0, 2.2, 1.0)
+# BoxCollider(center=(0, -0.1, 0), size=(1.1, 1.95, 1.1)) covering torso and legs, in world units.
+BODY_OFFSET = (0.0, -0.1 * ENEMY_SCALE[1], 0.0)
+BODY_SIZE = (1.1 * ENEMY_SCALE[0], 1.95 * ENEMY_SCALE[1], 1.1 * ENEMY_SCALE[2])
+# The head is a sphere collider of radius 0.5 on a (0.45, 0.5, 0.45) entity at y = 0.82, which makes it an ellipsoid.
+HEAD_OFFSET = (0.0, 0.82 * ENEMY_SCALE[1], 0.0)
+HEAD_RADII = (0.5 * 0.45 * ENEMY_SCALE[0], 0.5 * 0.5 * ENEMY_SCALE[1], 0.5 * 0.45 * ENEMY_SCALE[2])
+# Body hits this close below the head center still count as headshots, like the fallback in Bullet.update.
+HEADSHOT_MARGIN = 0.15
+HEADSHOT_MULTIPLIER = 2
+
+
+def bullet_direction(direction: float, x_direction: float) -> tuple:
+    """
+    Unit vector of a shot, computed the same way as in Bullet.__init__
+
+    Args:
+        direction (float): yaw in degrees
+        x_direction (float): pitch in degrees
+
+    Returns:
+        tuple: x, y, z components
+    """
+
+    yaw = math.radians(direction)
+    pitch = math.radians(x_direction)
+    return math.sin(yaw) * math.cos(pitch), math.sin(pitch), math.cos(yaw) * math.cos(pitch)
+
+
+def in_play_area(position) -> bool:
+    x, y, z = position
+    return abs(x) <= PLAY_AREA_HALF_SIZE and abs(z) <= PLAY_AREA_HALF_SIZE and PLAY_AREA_BOTTOM <= y <= PLAY_AREA_TOP
+
+
+def segment_hits_box(p0, p1, center, size, padding: float = 0.0):
+    """
+    Slab test of a segment against an axis aligned box
+
+    Args:
+        p0 (tuple): segment start
+        p1 (tuple): segment end
+        center (tuple): box center
+        size (tuple): box edge lengths
+        padding (float): extra margin added on every side
+
+    Returns:
+        float: fraction of the segment at the first contact, None if it misses
+    """
+
+    tmin, tmax = 0.0, 1.0
+    for axis in range(3):
+        half = size[axis] * 0.5 + padding
+        low = center[axis] - half
+        high = center[axis] + half
+        origin = p0[axis]
+        d = p1[axis] - origin
+        if abs(d) < 1e-8:
+            if origin < low or origin > high:
+                return None
+            continue
+        t1 = (low - origin) / d
+        t2 = (high - origin) / d
+        if t1 > t2:
+            t1, t2 = t2, t1
+        tmin = max(tmin, t1)
+        tmax = min(tmax, t2)
+        if tmin > tmax:
+            return None
+    return tmin
+
+
+def segment_hits_ellipsoid(p0, p1, center, radii):
+    """
+    Intersect a segment with an axis aligned ellipsoid
+
+    Args:
+        p0 (tuple): segment start
+        p1 (tuple): segment end
+        center (tuple): ellipsoid center
+        radii (tuple): radius along each axis
+
+    Returns:
+        float: fraction of the segment at the first contact, None if it misses
+    """
+
+    # Scale space so the ellipsoid becomes the unit sphere
+    o = [(p0[axis] - center[axis]) / radii[axis] for axis in range(3)]
+    d = [(p1[axis] - p0[axis]) / radii[axis] for axis in range(3)]
+    a = d[0] * d[0] + d[1] * d[1] + d[2] * d[2]
+    b = 2 * (o[0] * d[0] + o[1] * d[1] + o[2] * d[2])
+    c = o[0] * o[0] + o[1] * o[1] + o[2] * o[2] - 1
+    if c <= 0:
+        return 0.0
+    if a < 1e-12:
+        return None
+    discriminant = b * b - 4 * a * c
+    if discriminant < 0:
+        return None
+    t = (-b - math.sqrt(discriminant)) / (2 * a)
+    return t if 0.0 <= t <= 1.0 else None
+
+
+def segment_hits_player(p0, p1, position):
+    """
+    Test a segment against the body box and head of a player standing at position
+
+    Args:
+        p0 (tuple): segment start
+        p1 (tuple): segment end
+        position (tuple): the player's root position
+
+    Returns:
+        tuple: fraction of the segment at the first contact and whether it is a headshot, None if it misses
+    """
+
+    head_center = tuple(position[axis] + HEAD_OFFSET[axis] for axis in range(3))
+    head = segment_hits_ellipsoid(p0, p1, head_center, HEAD_RADII)
+    body_center = tuple(position[axis] + BODY_OFFSET[axis] for axis in range(3))
+    body = segment_hits_box(p0, p1, body_center, BODY_SIZE)
+
+    if head is not None and (body is None or head <= body):
+        return head, True
+    if body is None:
+        return None
+    impact_y = p0[1] + (p1[1] - p0[1]) * body
+    return body, impact_y >= head_center[1] - HEADSHOT_MARGIN
+
+
+def assign_team(player_id) -> str:
+    """Deterministic team assignment based on player id for TDM, the same rule game/main.py applies to enemies."""
+    try:
+        pid = int(player_id)
+    except Exception:
+        pid = 0
+    return "blue" if pid % 2 == 0 else "red"
@@ -0,0 +1,50 @@
+"""
+Datagram format for the optional UDP channel that carries position updates and snapshots.
+
+Each datagram holds exactly one codec encoded message behind a small header: the sender's player id (0 for the
+server), the token handed out in the TCP hello so nobody can inject updates for another player, and a sequence
+number. Receivers drop anything that is not newer than what they already have, so late or reordered datagrams never
+move a player backwards.
+"""
+
+import struct
+
+HEADER = struct.Struct("!HII")
+HEADER_SIZE = HEADER.size
+# Stay below common path MTUs so datagrams are never fragmented; larger messages go over TCP.
+MAX_DATAGRAM_SIZE = 1200
+MAX_PAYLOAD_SIZE = MAX_DATAGRAM_SIZE - HEADER_SIZE
+
+
+def encode_datagram(player_id: int, token: int, sequence: int, payload: bytes = b"") -> bytes:
+    """
+    Build one datagram
+
+    Args:
+        player_id (int): sender id, 0 when the server sends
+        token (int): the connection's UDP token
+        sequence (int): increasing sequence number, the snapshot tick for server datagrams
+        payload (bytes): codec encoded message, empty to only register the client's address
+
+    Returns:
+        bytes: the datagram
+    """
+
+    return HEADER.pack(player_id, token, sequence & 0xFFFFFFFF) + payload
+
+
+def decode_datagram(data: bytes) -> tuple:
+    """
+    Split a datagram into its header fields and payload
+
+    Args:
+        data (bytes): received datagram
+
+    Returns:
+        tuple: player id, token, sequence and payload
+    """
+
+    if len(data) < HEADER_SIZE:
+        raise ValueError("Datagram is shorter than its header")
+    player_id, token, sequence = HEADER.unpack_from(data)
+    return player_id, token, sequence, data[HEADER_SIZE:]
@@ -0,0 +1,165 @@
+"""
+Length-prefixed framing for the TCP stream between the game client and the server.
+
+Every message is sent as a 4 byte big-endian length followed by that many bytes of payload.
+"""
+
+import struct
+
+HEADER = struct.Struct("!I")
+HEADER_SIZE = HEADER.size
+MAX_FRAME_SIZE = 1 << 20
+
+
+class FrameError(ValueError):
+    """Raised when the stream contains a frame that can not be valid."""
+
+
+def encode_frame(payload: bytes) -> bytes:
+    """
+    Prefix a payload with its length
+
+    Args:
+        payload (bytes): message payload
+
+    Returns:
+        bytes: the framed message
+    """
+
+    if len(payload) > MAX_FRAME_SIZE:
+        raise FrameError(f"Frame of {len(payload)} bytes exceeds the {MAX_FRAME_SIZE} byte limit")
+    return HEADER.pack(len(payload)) + payload
+
+
+class FrameDecoder:
+    """
+    Incremental decoder that reads into one reusable buffer and yields every complete frame per read.
+
+    Args:
+        buffer_size (int): initial size of the receive buffer
+        max_frame_size (int): largest payload accepted before the stream is considered corrupt
+    """
+
+    def __init__(self, buffer_size: int = 65536, max_frame_size: int = MAX_FRAME_SIZE):
+        self.max_frame_size = max_frame_size
+        self.buffer = bytearray(max(buffer_size, HEADER_SIZE))
+        self.view = memoryview(self.buffer)
+        self.start = 0
+        self.end = 0
+
+    def pending(self) -> int:
+        """Number of buffered bytes that do not form a complete frame yet."""
+        return self.end - self.start
+
+    def take_pending(self) -> bytes:
+        """
+        Remove the bytes of an incomplete frame, so another decoder can carry on with the stream
+
+        Returns:
+            bytes: the buffered bytes, to be passed to the other decoder's feed
+        """
+
+        data = bytes(self.buffer[self.start:self.end])
+        self.start = self.end = 0
+        return data
+
+    def recv_from(self, sock):
+        """
+        Read once from a socket and decode every frame completed by the read
+
+        Args:
+            sock (socket.socket): socket to read from
+
+        Returns:
+            list: payloads of the completed frames, or None if the peer closed the connection
+        """
+
+        self._make_room()
+        received = sock.recv_into(self.view[self.end:])
+        if not received:
+            return None
+        self.end += received
+        return self._drain()
+
+    def feed(self, data: bytes) -> list:
+        """
+        Decode frames from bytes that were received by other means
+
+        Args:
+            data (bytes): raw stream bytes
+
+        Returns:
+            list: payloads of the completed frames
+        """
+
+        data = memoryview(data)
+        frames = []
+        while data:
+            self._make_room()
+            chunk = min(len(data), len(self.buffer) - self.end)
+            self.view[self.end:self.end + chunk] = data[:chunk]
+            self.end += chunk
+            data = data[chunk:]
+            frames.extend(self._drain())
+        return frames
+
+    def _drain(self) -> list:
+        frames = []
+        buffer = self.buffer
+        start = self.start
+        end = self.end
+
+        while end - start >= HEADER_SIZE:
+            length = HEADER.unpack_from(buffer, start)[0]
+            if length > self.max_frame_size:
+                raise FrameError(f"Frame of {length} bytes exceeds the {self.max_frame_size} byte limit")
+            frame_end = start + HEADER_SIZE + length
+            if frame_end > end:
+                break
+            frames.append(bytes(buffer[start + HEADER_SIZE:frame_end]))
+            start = frame_end
+
+        if start == end:
+            start = end = 0
+        self.start = start
+        self.end = end
+        return frames
+
+    def _make_room(self):
+        # Move a trailing partial frame to the front, and grow only when a single frame does not fit.
+        if self.end < len(self.buffer):
+            return
+        remaining = self.end - self.start
+        needed = remaining + 1
+        if remaining >= HEADER_SIZE:
+            needed = max(needed, HEADER_SIZE + HEADER.unpack_from(self.buffer, self.start)[0])
+        if needed > len(self.buffer):
+            new_buffer = bytearray(max(needed, len(self.buffer) * 2))
+            new_buffer[:remaining] = self.buffer[self.start:self.end]
+            self.buffer = new_buffer
+            self.view = memoryview(self.buffer)
+        elif self.start:
+            self.buffer[:remaining] = self.buffer[self.start:self.end]
+        self.start = 0
+        self.end = remaining
+
+
+def recv_frame(sock, decoder: FrameDecoder, pending: list) -> bytes:
+    """
+    Block until one frame is available, keeping any extra frames in pending
+
+    Args:
+        sock (socket.socket): blocking socket to read from
+        decoder (FrameDecoder): decoder holding partial data for this socket
+        pending (list): frames that were decoded but not consumed yet
+
+    Returns:
+        bytes: the next payload, or None if the peer closed the connection
+    """
+
+    while not pending:
+        frames = decoder.recv_from(sock)
+        if frames is None:
+            return None
+        pending.extend(frames)
+    return pending.pop(0)
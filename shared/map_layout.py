@@ -0,0 +1,159 @@
+"""
+Geometry of the map as plain (center, size) boxes.
+
+game/map.py turns every box into a Wall entity; the server uses the same list for its own bullet simulation, so
+both sides always collide against identical walls.
+"""
+
+import random
+
+# The floor plane in game/floor.py has a 1 unit thick box collider just below y = 0.
+FLOOR_BOX = ((0.0, -0.5, 0.0), (160.0, 1.0, 160.0))
+FLOOR_THICKNESS = 0.25
+# Players respawn within this distance of the center along x and z.
+SPAWN_HALF_SIZE = 60
+
+
+def spawn_position(seed, player_id: str) -> tuple:
+    """
+    Where a player respawns when a round restarts
+
+    Every client and the server derive the same point from the round's seed, so players do not overlap and a server
+    that owns movement knows where each of them has to reappear.
+
+    Args:
+        seed (int): the restart's seed
+        player_id (str): the player's identifier
+
+    Returns:
+        tuple: x, y, z
+    """
+
+    rng = random.Random(f"{seed}-{player_id}")
+    return float(rng.randint(-SPAWN_HALF_SIZE, SPAWN_HALF_SIZE)), 1.0, float(rng.randint(-SPAWN_HALF_SIZE, SPAWN_HALF_SIZE))
+
+
+def wall_boxes() -> list:
+    """
+    Lay out every wall, pillar and floor slab of the map
+
+    Returns:
+        list: (center, size) tuples of (x, y, z) floats
+    """
+
+    boxes = []
+
+    def wall_segment(center: tuple, size: tuple):
+        # Centered segment; y is at half height so it rests on the floor.
+        boxes.append((tuple(map(float, center)), tuple(map(float, size))))
+
+    def building(center: tuple, size: tuple, height: float, door_side="south", door_width=4.0):
+        """Create a hollow building with a doorway opening."""
+        cx, cz = center[0], center[2]
+        size_x, size_z = size[0], size[2]
+        half_w = size_x / 2
+        half_d = size_z / 2
+        h = height
+        t = 1.0
+
+        def doorway_segments(side: str):
+            dw = min(door_width, max(2.0, min(size_x, size_z) - 1.0))
+            if side in ("south", "north"):
+                z = cz + half_d if side == "south" else cz - half_d
+                side_w = (size_x - dw) / 2
+                wall_segment((cx - (dw / 2 + side_w / 2), h / 2, z), (side_w, h, t))
+                wall_segment((cx + (dw / 2 + side_w / 2), h / 2, z), (side_w, h, t))
+            else:
+                x = cx + half_w if side == "east" else cx - half_w
+                side_w = (size_z - dw) / 2
+                wall_segment((x, h / 2, cz - (dw / 2 + side_w / 2)), (t, h, side_w))
+                wall_segment((x, h / 2, cz + (dw / 2 + side_w / 2)), (t, h, side_w))
+
+        # The three solid sides, listed in the same order the doorway side is skipped from
+        solid = {
+            "north": (cx, h / 2, cz - half_d, size_x, h, t),
+            "south": (cx, h / 2, cz + half_d, size_x, h, t),
+            "west": (cx - half_w, h / 2, cz, t, h, size_z),
+            "east": (cx + half_w, h / 2, cz, t, h, size_z),
+        }
+        order = {
+            "south": ("north", "west", "east"),
+            "north": ("south", "west", "east"),
+            "east": ("west", "north", "south"),
+            "west": ("east", "north", "south"),
+        }
+        door_side = door_side if door_side in order else "west"
+        doorway_segments(door_side)
+        for side in order[door_side]:
+            x, y, z, sx, sy, sz = solid[side]
+            wall_segment((x, y, z), (sx, sy, sz))
+
+    def floor_plate(center: tuple, size: tuple):
+        """Simple walkable floor inside multi-story buildings."""
+        wall_segment(center, (size[0], FLOOR_THICKNESS, size[2]))
+
+    # Perimeter walls using large segments (fewer entities).
+    half = 75
+    height = 7
+    thickness = 1.0
+    wall_segment((0, height / 2, -half), (2 * half + thickness, height, thickness))  # North
+    wall_segment((0, height / 2, half), (2 * half + thickness, height, thickness))   # South
+    wall_segment((-half, height / 2, 0), (thickness, height, 2 * half + thickness))  # West
+    wall_segment((half, height / 2, 0), (thickness, height, 2 * half + thickness))   # East
+
+    # District 1: warehouse with interior pillars and doorway.
+    building((-25, 0, -20), (24, 18, 14), height=6, door_side="south", door_width=4)
+    wall_segment((-25, 3, -20), (2, 6, 2))  # center pillar
+    wall_segment((-31, 3, -24), (2, 6, 2))
+    wall_segment((-19, 3, -24), (2, 6, 2))
+    wall_segment((-31, 3, -16), (2, 6, 2))
+    wall_segment((-19, 3, -16), (2, 6, 2))
+
+    # District 2: L-shaped offices with two entrances.
+    building((22, 0, -28), (22, 16, 12), height=6, door_side="east", door_width=5)
+    building((22, 0, -12), (22, 10, 10), height=6, door_side="south", door_width=4)
+    wall_segment((22, 3, -20), (1, 6, 14))  # interior divider
+    wall_segment((16, 3, -12), (10, 6, 1))  # interior divider horizontal
+    # Add a second floor in offices.
+    floor_plate((22, 3.1, -20), (22, 16, 12))
+    floor_plate((22, 3.1, -12), (22, 10, 10))
+
+    # District 3: central plaza with cover and two small huts.
+    wall_segment((0, 2, 0), (8, 4, 1))
+    wall_segment((0, 2, 6), (6, 4, 1))
+    wall_segment((-6, 2, 3), (1, 4, 6))
+    wall_segment((6, 2, 3), (1, 4, 6))
+    building((-10, 0, 16), (10, 8, 8), height=5, door_side="east", door_width=3)
+    building((10, 0, 16), (10, 8, 8), height=5, door_side="west", door_width=3)
+
+    # District 4: long apartment block with two doorways and interior halls.
+    building((-35, 0, 28), (28, 12, 12), height=6, door_side="south", door_width=6)
+    building((-35, 0, 44), (28, 12, 12), height=6, door_side="north", door_width=6)
+    wall_segment((-35, 3, 36), (1, 6, 24))   # central divider connecting both halves
+    wall_segment((-43, 3, 36), (4, 6, 1))    # cross halls
+    wall_segment((-27, 3, 36), (4, 6, 1))
+    # Add second floor slabs in apartment block.
+    floor_plate((-35, 3.1, 28), (28, 12, 12))
+    floor_plate((-35, 3.1, 44), (28, 12, 12))
+
+    # District 5: tall tower with accessible base and upper floors.
+    building((40, 0, 26), (12, 12, 12), height=10, door_side="west", door_width=4)
+    floor_plate((40, 3.3, 26), (12, 12, 12))  # 2nd floor
+    floor_plate((40, 6.6, 26), (12, 12, 12))  # 3rd floor
+    wall_segment((40, 6, 26), (6, 4, 6))  # interior core for extra cover
+
+    # Outskirts cover blocks and alleys.
+    wall_segment((55, 3, -40), (10, 6, 1))
+    wall_segment((55, 3, -32), (10, 6, 1))
+    wall_segment((50, 3, -36), (1, 6, 8))
+
+    wall_segment((-55, 3, -40), (12, 6, 1))
+    wall_segment((-50, 3, -32), (1, 6, 12))
+    wall_segment((-60, 3, -32), (1, 6, 12))
+
+    wall_segment((50, 2.5, 50), (10, 5, 1))
+    wall_segment((50, 2.5, 58), (10, 5, 1))
+    wall_segment((45, 2.5, 54), (1, 5, 8))
+    wall_segment((55, 2.5, 54), (1, 5, 8))
+
+    return boxes
@@ -0,0 +1,212 @@
+"""
+Player movement as a pure function of the player's state and one input command.
+
+This is the movement of game/player.py (a FirstPersonController with the game's speeds and jump) written against
+the map boxes of shared/map_layout.py instead of the engine's colliders. A server that owns movement runs it on
+every input it receives and the client runs the very same steps to predict where those inputs take its player, so
+both arrive at the same position without waiting for each other.
+
+An input command is a dict:
+
+- "seq": number of the command, counting up from 1
+- "dt": seconds the command lasts, the frame time it was sampled in
+- "forward", "right": -1, 0 or 1 from the movement keys
+- "yaw": where the player faces in degrees
+- "sprint", "jump": whether those keys were down
+"""
+
+import math
+
+from shared.ballistics import segment_hits_box
+from shared.map_layout import FLOOR_BOX, wall_boxes
+
+BASE_SPEED = 7.0
+SPRINT_SPEED = 12.0
+# FirstPersonController's height and the jump player.py sets up.
+PLAYER_HEIGHT = 2.0
+JUMP_HEIGHT = 2.5
+JUMP_UP_DURATION = 0.5
+FALL_AFTER = 0.35
+# How far ahead walls stop the player, and the highest step it walks up without jumping.
+PROBE_DISTANCE = 0.5
+STEP_HEIGHT = 0.5
+# Players are kept this far from the middle of the map on both axes.
+MOVE_BOUNDS = 75.0
+# Longest command the server accepts; longer frames are cut down to it.
+MAX_COMMAND_DT = 0.1
+CELL_SIZE = 10.0
+
+
+def out_expo(t: float) -> float:
+    # The curve the engine animates the jump with
+    return 1.0 if t >= 1 else 1 - 2 ** (-10 * t)
+
+
+class MovementState:
+    """
+    Everything a movement step reads and writes.
+
+    Args:
+        position (tuple): x, y, z of the player's feet
+        air_time (float): seconds spent falling, speeds up the fall like the engine's gravity
+        jump_time (float): seconds into the current jump, negative when not jumping
+        grounded (bool): whether the player stands on something
+    """
+
+    __slots__ = ("x", "y", "z", "air_time", "jump_time", "grounded")
+
+    def __init__(self, position, air_time: float = 0.0, jump_time: float = -1.0, grounded: bool = True):
+        self.x, self.y, self.z = (float(axis) for axis in position)
+        self.air_time = air_time
+        self.jump_time = jump_time
+        self.grounded = grounded
+
+    @property
+    def position(self) -> tuple:
+        return self.x, self.y, self.z
+
+    def copy(self) -> "MovementState":
+        return MovementState(self.position, self.air_time, self.jump_time, self.grounded)
+
+    def to_message(self, seq: int) -> dict:
+        """
+        The state as the server reports it back to the player
+
+        Args:
+            seq (int): the last input command applied
+
+        Returns:
+            dict: a "moved" message
+        """
+
+        return {
+            "object": "moved",
+            "seq": seq,
+            "position": self.position,
+            "air_time": self.air_time,
+            "jump_time": self.jump_time,
+            "grounded": self.grounded
+        }
+
+    @classmethod
+    def from_message(cls, msg: dict) -> "MovementState":
+        return cls(msg["position"], msg["air_time"], msg["jump_time"], msg["grounded"])
+
+
+class MovementModel:
+    """
+    Moves players through the map.
+
+    Args:
+        boxes (list): static (center, size) boxes to collide with, the map by default
+        floor (tuple): (center, size) of the floor, None for no floor
+    """
+
+    def __init__(self, boxes: list = None, floor: tuple = FLOOR_BOX):
+        self.boxes = wall_boxes() if boxes is None else list(boxes)
+        if floor is not None:
+            self.boxes.append(floor)
+        self.cells = {}
+        for index, (center, size) in enumerate(self.boxes):
+            low_x, high_x = self._cell(center[0] - size[0] / 2), self._cell(center[0] + size[0] / 2)
+            low_z, high_z = self._cell(center[2] - size[2] / 2), self._cell(center[2] + size[2] / 2)
+            for x in range(low_x, high_x + 1):
+                for z in range(low_z, high_z + 1):
+                    self.cells.setdefault((x, z), []).append(index)
+
+    @staticmethod
+    def _cell(value: float) -> int:
+        return math.floor(value / CELL_SIZE)
+
+    def _boxes_near(self, x: float, z: float, reach: float):
+        indices = set()
+        for cell_x in range(self._cell(x - reach), self._cell(x + reach) + 1):
+            for cell_z in range(self._cell(z - reach), self._cell(z + reach) + 1):
+                indices.update(self.cells.get((cell_x, cell_z), ()))
+        return [self.boxes[index] for index in indices]
+
+    @staticmethod
+    def _ray_hits(boxes, origin, direction, distance: float) -> bool:
+        end = tuple(o + d * distance for o, d in zip(origin, direction))
+        return any(segment_hits_box(origin, end, center, size) is not None for center, size in boxes)
+
+    def _ground(self, boxes, state: MovementState):
+        # Top of the highest surface right below the player's head, like the engine's ray cast down
+        top = None
+        ceiling = state.y + PLAYER_HEIGHT
+        for center, size in boxes:
+            if abs(state.x - center[0]) > size[0] / 2 or abs(state.z - center[2]) > size[2] / 2:
+                continue
+            surface = center[1] + size[1] / 2
+            if surface <= ceiling and (top is None or surface > top):
+                top = surface
+        return top
+
+    def step(self, state: MovementState, command: dict) -> MovementState:
+        """
+        Apply one input command
+
+        Args:
+            state (MovementState): the player's state, updated in place
+            command (dict): the input command
+
+        Returns:
+            MovementState: the same state, for chaining
+        """
+
+        dt = max(0.0, min(MAX_COMMAND_DT, float(command["dt"])))
+        forward = max(-1.0, min(1.0, float(command["forward"])))
+        right = max(-1.0, min(1.0, float(command["right"])))
+        yaw = math.radians(float(command["yaw"]))
+        boxes = self._boxes_near(state.x, state.z, PROBE_DISTANCE + SPRINT_SPEED * MAX_COMMAND_DT)
+
+        # Forward is +z at yaw 0 and turns clockwise seen from above
+        dx = math.sin(yaw) * forward + math.cos(yaw) * right
+        dz = math.cos(yaw) * forward - math.sin(yaw) * right
+        length = math.hypot(dx, dz)
+        if length > 0:
+            dx, dz = dx / length, dz / length
+            direction = (dx, 0.0, dz)
+            feet = (state.x, state.y + 0.5, state.z)
+            head = (state.x, state.y + PLAYER_HEIGHT - 0.1, state.z)
+            if not self._ray_hits(boxes, feet, direction, PROBE_DISTANCE) and not self._ray_hits(boxes, head, direction, PROBE_DISTANCE):
+                speed = SPRINT_SPEED if command.get("sprint") else BASE_SPEED
+                move_x, move_z = dx * speed * dt, dz * speed * dt
+                # Walls right next to the player stop movement along their axis only, so it slides along them
+                waist = (state.x, state.y + 1.0, state.z)
+                if move_x > 0 and self._ray_hits(boxes, waist, (1.0, 0.0, 0.0), PROBE_DISTANCE):
+                    move_x = 0.0
+                elif move_x < 0 and self._ray_hits(boxes, waist, (-1.0, 0.0, 0.0), PROBE_DISTANCE):
+                    move_x = 0.0
+                if move_z > 0 and self._ray_hits(boxes, waist, (0.0, 0.0, 1.0), PROBE_DISTANCE):
+                    move_z = 0.0
+                elif move_z < 0 and self._ray_hits(boxes, waist, (0.0, 0.0, -1.0), PROBE_DISTANCE):
+                    move_z = 0.0
+                state.x = max(-MOVE_BOUNDS, min(MOVE_BOUNDS, state.x + move_x))
+                state.z = max(-MOVE_BOUNDS, min(MOVE_BOUNDS, state.z + move_z))
+
+        if command.get("jump") and state.grounded and state.jump_time < 0:
+            state.jump_time = 0.0
+            state.grounded = False
+        if state.jump_time >= 0:
+            # On the way up the jump curve decides the height, the fall starts a bit before its top
+            start = state.jump_time
+            state.jump_time = start + dt
+            state.y += JUMP_HEIGHT * (out_expo(state.jump_time / JUMP_UP_DURATION) - out_expo(start / JUMP_UP_DURATION))
+            if state.jump_time >= FALL_AFTER:
+                state.jump_time = -1.0
+            return state
+
+        ground = self._ground(boxes, state)
+        if ground is not None and state.y - ground <= 0.1:
+            if not state.grounded:
+                state.air_time = 0.0
+            state.grounded = True
+            if ground - state.y < STEP_HEIGHT:
+                state.y = ground
+            return state
+        state.grounded = False
+        distance = state.y + PLAYER_HEIGHT - ground if ground is not None else math.inf
+        state.y -= min(state.air_time, distance - 0.05) * dt * 100
+        state.air_time += dt * 0.25
+        return state
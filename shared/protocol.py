@@ -0,0 +1,403 @@
+"""
+Message codecs for the game protocol.
+
+Messages are plain dicts with an "object" key everywhere in the game and the server. A codec turns them into the
+payload of one frame and back. JSON is the original format and is always available; the binary codec packs every
+message type into a fixed struct layout with quantized positions and angles. Which one a connection uses is agreed
+on during the handshake.
+"""
+
+import json
+import math
+import struct
+
+CODEC_BINARY = "binary"
+CODEC_JSON = "json"
+
+# Position resolution is 1 cm, which covers +-327 m around the origin in an int16.
+POSITION_SCALE = 100
+# Yaw wraps around, so the full uint16 range maps onto one turn.
+YAW_SCALE = 65536 / 360
+# Pitch only spans -90..90 degrees.
+PITCH_SCALE = 100
+SPEED_SCALE = 10
+# Team of the shooter in bullet messages, by index; 0 means no team.
+TEAMS = (None, "red", "blue")
+
+TYPE_PLAYER = 1
+TYPE_JOIN = 2
+TYPE_LEAVE = 3
+TYPE_BULLET = 4
+TYPE_HEALTH = 5
+TYPE_RESTART = 6
+TYPE_SNAPSHOT = 7
+TYPE_ACK = 8
+TYPE_UDP_READY = 9
+TYPE_WELCOME = 10
+TYPE_INPUT = 11
+TYPE_MOVED = 12
+
+# Bits in the per-player field mask of a snapshot entry.
+FIELD_POSITION = 1
+FIELD_ROTATION = 2
+FIELD_HEALTH = 4
+
+# Bits in the key field of an input command.
+INPUT_SPRINT = 1
+INPUT_JUMP = 2
+
+_TYPE = struct.Struct("!B")
+_PLAYER = struct.Struct("!BHhhhHh")
+_JOIN = struct.Struct("!BHhhhhB")
+_LEAVE = struct.Struct("!BH")
+_BULLET = struct.Struct("!BhhhHhHHIB")
+_HEALTH = struct.Struct("!BHh")
+_RESTART = struct.Struct("!BI")
+_SNAPSHOT = struct.Struct("!BIIHH")
+_SNAPSHOT_ENTRY = struct.Struct("!HB")
+_POSITION = struct.Struct("!hhh")
+_ROTATION = struct.Struct("!H")
+_HEALTH_VALUE = struct.Struct("!h")
+_PLAYER_ID = struct.Struct("!H")
+_ACK = struct.Struct("!BI")
+_WELCOME = struct.Struct("!BH")
+_INPUT = struct.Struct("!BIfbbHB")
+# Prediction replays inputs from this state, so it is not quantized like other positions
+_MOVED = struct.Struct("!BIfffffB")
+
+
+def _clamp16(value: float) -> int:
+    return max(-32768, min(32767, int(round(value))))
+
+
+def quantize_position(position) -> tuple:
+    return tuple(_clamp16(axis * POSITION_SCALE) for axis in position)
+
+
+def dequantize_position(x: int, y: int, z: int) -> tuple:
+    return x / POSITION_SCALE, y / POSITION_SCALE, z / POSITION_SCALE
+
+
+def quantize_yaw(yaw: float) -> int:
+    return int(round(yaw % 360 * YAW_SCALE)) & 0xFFFF
+
+
+def dequantize_yaw(value: int) -> float:
+    return value / YAW_SCALE
+
+
+class JsonCodec:
+    """The original text protocol, kept for clients that do not negotiate anything else."""
+
+    name = CODEC_JSON
+
+    def encode(self, msg: dict) -> bytes:
+        return json.dumps(msg).encode("utf8")
+
+    def decode(self, payload: bytes) -> dict:
+        return json.loads(payload)
+
+
+class BinaryCodec:
+    """Struct packed encoding of every message type."""
+
+    name = CODEC_BINARY
+
+    def encode(self, msg: dict) -> bytes:
+        kind = msg["object"]
+
+        if kind == "player":
+            if msg.get("left"):
+                return _LEAVE.pack(TYPE_LEAVE, int(msg["id"]))
+            x, y, z = quantize_position(msg["position"])
+            if msg.get("joined"):
+                username = msg["username"].encode("utf8")[:255]
+                return _JOIN.pack(TYPE_JOIN, int(msg["id"]), x, y, z, _clamp16(msg["health"]), len(username)) + username
+            return _PLAYER.pack(TYPE_PLAYER, int(msg["id"]), x, y, z, quantize_yaw(msg["rotation"]), _clamp16(msg["health"]))
+
+        if kind == "snapshot":
+            players = msg["players"]
+            removed = msg.get("removed", ())
+            parts = [_SNAPSHOT.pack(TYPE_SNAPSHOT, msg["tick"], msg.get("baseline", 0), len(players), len(removed))]
+            for entry in players:
+                mask = 0
+                fields = []
+                if "position" in entry:
+                    mask |= FIELD_POSITION
+                    fields.append(_POSITION.pack(*quantize_position(entry["position"])))
+                if "rotation" in entry:
+                    mask |= FIELD_ROTATION
+                    fields.append(_ROTATION.pack(quantize_yaw(entry["rotation"])))
+                if "health" in entry:
+                    mask |= FIELD_HEALTH
+                    fields.append(_HEALTH_VALUE.pack(_clamp16(entry["health"])))
+                parts.append(_SNAPSHOT_ENTRY.pack(int(entry["id"]), mask))
+                parts.extend(fields)
+            for player_id in removed:
+                parts.append(_PLAYER_ID.pack(int(player_id)))
+            return b"".join(parts)
+
+        if kind == "ack":
+            return _ACK.pack(TYPE_ACK, msg["tick"])
+
+        if kind == "welcome":
+            # Every player already in the room, each laid out like a join message
+            parts = [_WELCOME.pack(TYPE_WELCOME, len(msg["players"]))]
+            for entry in msg["players"]:
+                x, y, z = quantize_position(entry["position"])
+                username = entry["username"].encode("utf8")[:255]
+                parts.append(_JOIN.pack(TYPE_JOIN, int(entry["id"]), x, y, z, _clamp16(entry["health"]), len(username)))
+                parts.append(username)
+            return b"".join(parts)
+
+        if kind == "udp_ready":
+            return _TYPE.pack(TYPE_UDP_READY)
+
+        if kind == "input":
+            keys = (INPUT_SPRINT if msg.get("sprint") else 0) | (INPUT_JUMP if msg.get("jump") else 0)
+            return _INPUT.pack(
+                TYPE_INPUT, msg["seq"] & 0xFFFFFFFF, msg["dt"], int(msg["forward"]), int(msg["right"]),
+                quantize_yaw(msg["yaw"]), keys
+            )
+
+        if kind == "moved":
+            x, y, z = msg["position"]
+            return _MOVED.pack(
+                TYPE_MOVED, msg["seq"] & 0xFFFFFFFF, x, y, z, msg["air_time"], msg["jump_time"], bool(msg["grounded"])
+            )
+
+        if kind == "bullet":
+            x, y, z = quantize_position(msg["position"])
+            return _BULLET.pack(
+                TYPE_BULLET, x, y, z,
+                quantize_yaw(msg["direction"]),
+                _clamp16(msg["x_direction"] * PITCH_SCALE),
+                max(0, min(65535, int(msg["damage"]))),
+                max(0, min(65535, int(round(msg.get("speed", 80.0) * SPEED_SCALE)))),
+                msg.get("tick", 0) & 0xFFFFFFFF,
+                TEAMS.index(msg.get("team")) if msg.get("team") in TEAMS else 0
+            )
+
+        if kind == "health_update":
+            return _HEALTH.pack(TYPE_HEALTH, int(msg["id"]), _clamp16(msg["health"]))
+
+        if kind == "restart":
+            return _RESTART.pack(TYPE_RESTART, int(msg["seed"]) & 0xFFFFFFFF)
+
+        raise ValueError(f"Binary codec can not encode {kind!r} messages")
+
+    def decode(self, payload: bytes) -> dict:
+        kind = _TYPE.unpack_from(payload)[0]
+
+        if kind == TYPE_PLAYER:
+            _, identifier, x, y, z, yaw, health = _PLAYER.unpack(payload)
+            return {
+                "object": "player",
+                "id": str(identifier),
+                "position": dequantize_position(x, y, z),
+                "rotation": dequantize_yaw(yaw),
+                "health": health,
+                "joined": False,
+                "left": False
+            }
+
+        if kind == TYPE_SNAPSHOT:
+            _, tick, baseline, count, removed_count = _SNAPSHOT.unpack_from(payload)
+            offset = _SNAPSHOT.size
+            players = []
+            for _ in range(count):
+                identifier, mask = _SNAPSHOT_ENTRY.unpack_from(payload, offset)
+                offset += _SNAPSHOT_ENTRY.size
+                entry = {"id": str(identifier)}
+                if mask & FIELD_POSITION:
+                    entry["position"] = dequantize_position(*_POSITION.unpack_from(payload, offset))
+                    offset += _POSITION.size
+                if mask & FIELD_ROTATION:
+                    entry["rotation"] = dequantize_yaw(_ROTATION.unpack_from(payload, offset)[0])
+                    offset += _ROTATION.size
+                if mask & FIELD_HEALTH:
+                    entry["health"] = _HEALTH_VALUE.unpack_from(payload, offset)[0]
+                    offset += _HEALTH_VALUE.size
+                players.append(entry)
+            removed = [str(identifier) for (identifier,) in _PLAYER_ID.iter_unpack(payload[offset:offset + removed_count * _PLAYER_ID.size])]
+            return {"object": "snapshot", "tick": tick, "baseline": baseline, "players": players, "removed": removed}
+
+        if kind == TYPE_ACK:
+            _, tick = _ACK.unpack(payload)
+            return {"object": "ack", "tick": tick}
+
+        if kind == TYPE_UDP_READY:
+            return {"object": "udp_ready"}
+
+        if kind == TYPE_INPUT:
+            _, seq, dt, forward, right, yaw, keys = _INPUT.unpack(payload)
+            return {
+                "object": "input",
+                "seq": seq,
+                "dt": dt,
+                "forward": forward,
+                "right": right,
+                "yaw": dequantize_yaw(yaw),
+                "sprint": bool(keys & INPUT_SPRINT),
+                "jump": bool(keys & INPUT_JUMP)
+            }
+
+        if kind == TYPE_MOVED:
+            _, seq, x, y, z, air_time, jump_time, grounded = _MOVED.unpack(payload)
+            return {
+                "object": "moved",
+                "seq": seq,
+                "position": (x, y, z),
+                "air_time": air_time,
+                "jump_time": jump_time,
+                "grounded": bool(grounded)
+            }
+
+        if kind == TYPE_WELCOME:
+            _, count = _WELCOME.unpack_from(payload)
+            offset = _WELCOME.size
+            players = []
+            for _ in range(count):
+                _, identifier, x, y, z, health, name_length = _JOIN.unpack_from(payload, offset)
+                offset += _JOIN.size
+                players.append({
+                    "id": str(identifier),
+                    "username": payload[offset:offset + name_length].decode("utf8", errors="replace"),
+                    "position": dequantize_position(x, y, z),
+                    "health": health
+                })
+                offset += name_length
+            return {"object": "welcome", "players": players}
+
+        if kind == TYPE_BULLET:
+            _, x, y, z, direction, x_direction, damage, speed, tick, team = _BULLET.unpack(payload)
+            return {
+                "object": "bullet",
+                "position": dequantize_position(x, y, z),
+                "damage": damage,
+                "direction": dequantize_yaw(direction),
+                "x_direction": x_direction / PITCH_SCALE,
+                "speed": speed / SPEED_SCALE,
+                "tick": tick,
+                "team": TEAMS[team] if team < len(TEAMS) else None
+            }
+
+        if kind == TYPE_HEALTH:
+            _, identifier, health = _HEALTH.unpack(payload)
+            return {"object": "health_update", "id": str(identifier), "health": health}
+
+        if kind == TYPE_RESTART:
+            _, seed = _RESTART.unpack(payload)
+            return {"object": "restart", "seed": seed}
+
+        if kind == TYPE_JOIN:
+            _, identifier, x, y, z, health, name_length = _JOIN.unpack_from(payload)
+            username = payload[_JOIN.size:_JOIN.size + name_length].decode("utf8", errors="replace")
+            return {
+                "id": str(identifier),
+                "object": "player",
+                "username": username,
+                "position": dequantize_position(x, y, z),
+                "health": health,
+                "joined": True,
+                "left": False
+            }
+
+        if kind == TYPE_LEAVE:
+            _, identifier = _LEAVE.unpack(payload)
+            return {"id": str(identifier), "object": "player", "joined": False, "left": True}
+
+        raise ValueError(f"Unknown binary message type {kind}")
+
+
+JSON = JsonCodec()
+BINARY = BinaryCodec()
+CODECS = {JSON.name: JSON, BINARY.name: BINARY}
+# Preferred first; JSON stays last as the fallback every peer understands.
+SUPPORTED_CODECS = (CODEC_BINARY, CODEC_JSON)
+
+
+def choose_codec(offered) -> str:
+    """
+    Pick the codec to use with a peer
+
+    Args:
+        offered (list): codec names the peer supports, in its order of preference
+
+    Returns:
+        str: the first offered codec this side supports, JSON if there is none
+    """
+
+    for name in offered or ():
+        # Peers may offer anything, only names are looked up
+        if isinstance(name, str) and name in CODECS:
+            return name
+    return CODEC_JSON
+
+
+def _is_number(value) -> bool:
+    # JSON decodes 1e999 to inf, which no position, angle or duration can be
+    return isinstance(value, (int, float)) and math.isfinite(value)
+
+
+def _is_integer(value) -> bool:
+    return isinstance(value, int)
+
+
+def _is_vector(value) -> bool:
+    return isinstance(value, (list, tuple)) and len(value) == 3 and all(map(_is_number, value))
+
+
+def _is_team(value) -> bool:
+    return value is None or isinstance(value, str)
+
+
+def _is_any(value) -> bool:
+    return True
+
+
+# What a client may send, by kind: the fields every such message carries and the ones it may leave out, each with
+# the check its value has to pass
+CLIENT_MESSAGES = {
+    "player": ({"position": _is_vector, "rotation": _is_number, "health": _is_number}, {}),
+    "bullet": (
+        {"position": _is_vector, "direction": _is_number, "x_direction": _is_number, "damage": _is_number},
+        {"speed": _is_number, "tick": _is_integer, "team": _is_team}
+    ),
+    "health_update": ({"health": _is_number}, {}),
+    "restart": ({"seed": _is_integer}, {}),
+    "ack": ({"tick": _is_integer}, {}),
+    "input": (
+        {"seq": _is_integer, "dt": _is_number, "forward": _is_number, "right": _is_number, "yaw": _is_number},
+        {"sprint": _is_any, "jump": _is_any}
+    ),
+}
+
+
+def validate_message(msg) -> dict:
+    """
+    Check a decoded client message before anything acts on it
+
+    Args:
+        msg: whatever the codec decoded
+
+    Returns:
+        dict: the message, unchanged
+
+    Raises:
+        ValueError: if it is not a message a client sends or a field is missing or of the wrong type
+    """
+
+    if not isinstance(msg, dict):
+        raise ValueError(f"Message is a {type(msg).__name__}, not an object")
+    fields = CLIENT_MESSAGES.get(msg.get("object"))
+    if fields is None:
+        raise ValueError(f"Unknown message kind {msg.get('object')!r}")
+    required, optional = fields
+    for name, check in required.items():
+        if name not in msg or not check(msg[name]):
+            raise ValueError(f"Bad {name!r} in {msg['object']!r} message")
+    for name, check in optional.items():
+        if name in msg and not check(msg[name]):
+            raise ValueError(f"Bad {name!r} in {msg['object']!r} message")
+    return msg
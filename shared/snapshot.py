@@ -0,0 +1,135 @@
+"""
+Delta compression of world snapshots.
+
+A world state maps player ids to (position, rotation, health) tuples. The server sends each client the difference
+between the current state and the last state that client acknowledged; entries only carry the fields that changed.
+A snapshot with baseline 0 is a keyframe that carries every field of every player.
+"""
+
+FIELDS = ("position", "rotation", "health")
+HISTORY_SIZE = 64
+# Seconds clients draw remote players behind the latest snapshot, about two ticks at 20 Hz.
+INTERPOLATION_DELAY = 0.1
+
+
+def make_state(players: dict) -> dict:
+    """
+    Capture the replicated fields of every player
+
+    Args:
+        players (dict): the server's player dictionary
+
+    Returns:
+        dict: player id to (position, rotation, health)
+    """
+
+    return {
+        player_id: (tuple(info["position"]), info["rotation"], info["health"])
+        for player_id, info in players.items()
+    }
+
+
+def diff_states(baseline: dict, current: dict) -> tuple:
+    """
+    Compute the entries needed to turn baseline into current
+
+    Args:
+        baseline (dict): state the receiver already has, empty for a keyframe
+        current (dict): state to replicate
+
+    Returns:
+        tuple: list of partial player entries and list of removed player ids
+    """
+
+    players = []
+    for player_id, values in current.items():
+        base = baseline.get(player_id)
+        if base is None:
+            players.append({"id": player_id, "position": values[0], "rotation": values[1], "health": values[2]})
+            continue
+        if base == values:
+            continue
+        entry = {"id": player_id}
+        for field, old, new in zip(FIELDS, base, values):
+            if old != new:
+                entry[field] = new
+        players.append(entry)
+
+    removed = [player_id for player_id in baseline if player_id not in current]
+    return players, removed
+
+
+def apply_snapshot(baseline: dict, msg: dict) -> dict:
+    """
+    Rebuild the full state described by a snapshot message
+
+    Args:
+        baseline (dict): state the snapshot was computed against
+        msg (dict): snapshot message
+
+    Returns:
+        dict: the new state
+    """
+
+    state = dict(baseline) if msg.get("baseline") else {}
+    for entry in msg["players"]:
+        player_id = entry["id"]
+        base = state.get(player_id, ((0, 1, 0), 0, 100))
+        state[player_id] = (
+            tuple(entry["position"]) if "position" in entry else base[0],
+            entry.get("rotation", base[1]),
+            entry.get("health", base[2]),
+        )
+    for player_id in msg.get("removed", ()):
+        state.pop(player_id, None)
+    return state
+
+
+class SnapshotReceiver:
+    """
+    Client side bookkeeping that turns delta snapshots back into full ones.
+
+    Args:
+        history_size (int): number of received states kept as possible baselines
+    """
+
+    def __init__(self, history_size: int = HISTORY_SIZE):
+        self.history_size = history_size
+        self.states = {}
+        self.latest_tick = 0
+
+    def receive(self, msg: dict):
+        """
+        Apply a snapshot message
+
+        Args:
+            msg (dict): snapshot message, possibly a delta
+
+        Returns:
+            dict: a keyframe style message listing every player, or None if the snapshot is stale or its
+            baseline is no longer known
+        """
+
+        tick = msg["tick"]
+        if tick <= self.latest_tick:
+            return None
+        baseline_tick = msg.get("baseline", 0)
+        baseline = self.states.get(baseline_tick) if baseline_tick else {}
+        if baseline is None:
+            return None
+
+        state = apply_snapshot(baseline, msg)
+        self.states[tick] = state
+        self.latest_tick = tick
+        # Ticks arrive in increasing order, so the oldest state is always first in the dict.
+        while len(self.states) > self.history_size:
+            del self.states[next(iter(self.states))]
+
+        return {
+            "object": "snapshot",
+            "tick": tick,
+            "players": [
+                {"id": player_id, "position": values[0], "rotation": values[1], "health": values[2]}
+                for player_id, values in state.items()
+            ]
+        }
@@ -0,0 +1,35 @@
+"""
+Weapon stats shared by the game client and the headless tools.
+
+Player.weapon_classes adds the sounds on top of these; keeping the numbers here lets load generators fire at the
+same rates as real players without importing ursina.
+"""
+
+WEAPON_CLASSES = {
+    "pistol": {
+        "mag_size": 12,
+        "reload_time": 2.3,
+        "fire_rate": 0.35,
+        "damage": (12, 22),
+        "auto": False,
+        "speed": 80.0,
+    },
+    # Rifle hits for roughly half the pistol damage but fires faster and has a bigger mag.
+    "rifle": {
+        "mag_size": 30,
+        "reload_time": 2.0,
+        "fire_rate": 0.12,
+        "damage": (6, 11),
+        "auto": True,
+        "speed": 95.0,
+    },
+    # Sniper packs the highest punch by a wide margin, with faster rounds.
+    "sniper": {
+        "mag_size": 5,
+        "reload_time": 3.0,
+        "fire_rate": 2.4,
+        "damage": (55, 75),
+        "auto": False,
+        "speed": 180.0,
+    },
+}
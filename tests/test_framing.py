@@ -0,0 +1,79 @@
+"""
+The length-prefixed framing: frames split over reads, merged into one read, larger than the buffer.
+
+Run with: python -m pytest tests
+"""
+
+import os
+import socket
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from shared.framing import HEADER_SIZE, MAX_FRAME_SIZE, FrameDecoder, FrameError, encode_frame, recv_frame
+
+PAYLOADS = [b"", b"x", b'{"object": "ack", "tick": 1}', bytes(range(256)) * 3, b"y" * 100]
+STREAM = b"".join(encode_frame(payload) for payload in PAYLOADS)
+
+
+@pytest.mark.parametrize("chunk", [1, 2, 3, HEADER_SIZE, 7, 100, len(STREAM)])
+def test_frames_split_over_feeds(chunk):
+    decoder = FrameDecoder(buffer_size=64)
+    frames = []
+    for start in range(0, len(STREAM), chunk):
+        frames.extend(decoder.feed(STREAM[start:start + chunk]))
+    assert frames == PAYLOADS
+    assert decoder.pending() == 0
+
+
+def test_every_frame_of_a_read_is_returned():
+    decoder = FrameDecoder()
+    last = encode_frame(b"z" * 10)
+    assert decoder.feed(STREAM + last[:HEADER_SIZE + 1]) == PAYLOADS
+    assert decoder.pending() == HEADER_SIZE + 1
+    assert decoder.feed(last[HEADER_SIZE + 1:]) == [b"z" * 10]
+
+
+def test_buffer_grows_only_for_a_frame_that_does_not_fit():
+    decoder = FrameDecoder(buffer_size=16)
+    small = [b"abcdefgh"] * 20
+    assert decoder.feed(b"".join(encode_frame(payload) for payload in small)) == small
+    assert len(decoder.buffer) == 16
+
+    large = bytes(range(256)) * 40
+    assert decoder.feed(encode_frame(large) + encode_frame(b"after")) == [large, b"after"]
+    assert len(decoder.buffer) >= HEADER_SIZE + len(large)
+
+
+def test_oversized_frames_are_refused():
+    decoder = FrameDecoder(max_frame_size=10)
+    assert decoder.feed(encode_frame(bytes(10))) == [bytes(10)]
+    with pytest.raises(FrameError):
+        decoder.feed(encode_frame(bytes(11)))
+    with pytest.raises(FrameError):
+        encode_frame(bytes(MAX_FRAME_SIZE + 1))
+
+
+def test_take_pending_hands_the_stream_over():
+    first = FrameDecoder()
+    split = len(encode_frame(PAYLOADS[0])) + len(encode_frame(PAYLOADS[1])) + 5
+    assert first.feed(STREAM[:split]) == PAYLOADS[:2]
+    carried = first.take_pending()
+    assert first.pending() == 0
+
+    second = FrameDecoder()
+    assert second.feed(carried + STREAM[split:]) == PAYLOADS[2:]
+
+
+def test_recv_from_a_socket():
+    left, right = socket.socketpair()
+    with left, right:
+        right.settimeout(2)
+        decoder = FrameDecoder(buffer_size=32)
+        pending = []
+        left.sendall(STREAM)
+        assert [recv_frame(right, decoder, pending) for _ in PAYLOADS] == PAYLOADS
+        left.close()
+        assert recv_frame(right, decoder, pending) is None
@@ -0,0 +1,101 @@
+"""
+Lookups in the per-player ring buffers once they have wrapped around.
+
+Run with: python -m pytest tests
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "server")))
+
+from history import PlayerHistory, PositionHistory
+
+
+def filled(count: int, capacity: int = 4) -> PlayerHistory:
+    # One sample per second at x = 2 t, turning 40 degrees and losing 5 health each time
+    history = PlayerHistory(capacity, resolution=0.5)
+    for t in range(count):
+        history.record(float(t), (2.0 * t, 1.0, -t), (40.0 * t) % 360, 100 - 5 * t)
+    return history
+
+
+def test_wrap_keeps_newest_samples():
+    history = filled(10)
+    assert history.count == 4
+    assert history.start != 0
+    assert history.oldest() == 6.0
+    assert history.newest() == 9.0
+    assert [history.sample(i)[0] for i in range(4)] == [6.0, 7.0, 8.0, 9.0]
+
+
+@pytest.mark.parametrize("count", range(4, 13))
+def test_state_at_across_the_wrap(count):
+    # Every gap between neighbours is checked, wherever the ring currently starts
+    history = filled(count)
+    for t in range(count - 4, count - 1):
+        position, rotation, health = history.state_at(t + 0.25)
+        assert position == pytest.approx((2.0 * t + 0.5, 1.0, -t - 0.25))
+        assert rotation == pytest.approx((40.0 * t + 10.0) % 360)
+        # Health steps, it is reported as of the earlier sample
+        assert health == 100 - 5 * t
+
+
+def test_state_at_exact_samples():
+    history = filled(7)
+    for t in range(3, 7):
+        assert history.state_at(float(t))[0] == pytest.approx((2.0 * t, 1.0, -t))
+
+
+def test_state_at_clamps_outside_the_ring():
+    history = filled(10)
+    # Samples before 6 were overwritten, anything earlier reads as the oldest kept one
+    assert history.state_at(0.0)[0] == pytest.approx((12.0, 1.0, -6.0))
+    assert history.state_at(5.5)[0] == pytest.approx((12.0, 1.0, -6.0))
+    assert history.state_at(100.0)[0] == pytest.approx((18.0, 1.0, -9.0))
+
+
+def test_rotation_turns_the_short_way():
+    history = PlayerHistory(4, resolution=0.5)
+    history.record(0.0, (0.0, 0.0, 0.0), 350.0, 100)
+    history.record(1.0, (0.0, 0.0, 0.0), 10.0, 100)
+    assert history.state_at(0.5)[1] % 360 == pytest.approx(0.0, abs=1e-9)
+
+
+def test_samples_closer_than_resolution_share_a_slot():
+    history = PlayerHistory(4, resolution=0.5)
+    history.record(0.0, (0.0, 0.0, 0.0), 0.0, 100)
+    history.record(0.2, (1.0, 0.0, 0.0), 0.0, 100)
+    history.record(0.4, (2.0, 0.0, 0.0), 0.0, 100)
+    assert history.count == 1
+    assert history.sample(-1) == (0.4, (2.0, 0.0, 0.0), 0.0, 100.0)
+
+
+def test_out_of_order_samples_are_ignored():
+    history = filled(3)
+    history.record(1.5, (99.0, 99.0, 99.0), 0.0, 0)
+    assert history.state_at(1.5)[0] == pytest.approx((3.0, 1.0, -1.5))
+
+
+def test_between_across_the_wrap():
+    history = filled(10)
+    assert [sample[0] for sample in history.between(6.5, 9.0)] == [7.0, 8.0, 9.0]
+
+
+def test_empty_history():
+    assert PlayerHistory().state_at(1.0) is None
+    assert PositionHistory().position_at("1", 1.0) is None
+
+
+def test_released_buffers_are_reused_empty():
+    histories = PositionHistory(duration=4.0, capacity=4)
+    for t in range(10):
+        histories.record("1", float(t), (float(t), 0.0, 0.0))
+    buffer = histories.get("1")
+    histories.remove("1")
+    histories.record("2", 20.0, (5.0, 0.0, 0.0))
+    assert histories.get("2") is buffer
+    assert histories.position_at("2", 0.0) == (5.0, 0.0, 0.0)
+    assert histories.position_at("1", 20.0) is None
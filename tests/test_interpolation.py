@@ -0,0 +1,102 @@
+"""
+Where remote players are drawn before, between and after the buffered updates.
+
+Run with: python -m pytest tests
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "game")))
+
+from interpolation import INTERPOLATION_DELAY, InterpolationBuffer, lerp_angle
+
+
+def moving(delay: float = 0.1) -> InterpolationBuffer:
+    # Three updates 50 ms apart, one unit and ten degrees each
+    buffer = InterpolationBuffer(delay=delay, max_extrapolation=0.1)
+    for i in range(3):
+        buffer.push(1.0 + 0.05 * i, (float(i), 1.0, 0.0), 10.0 * i)
+    return buffer
+
+
+def assert_drawn(drawn, position, rotation):
+    assert drawn[0] == pytest.approx(position)
+    assert drawn[1] == pytest.approx(rotation)
+
+
+def test_empty_buffer():
+    assert InterpolationBuffer().sample(1.0) is None
+
+
+def test_single_update():
+    buffer = InterpolationBuffer()
+    buffer.push(1.0, (3.0, 1.0, 4.0), 90.0)
+    assert_drawn(buffer.sample(1.0), (3.0, 1.0, 4.0), 90.0)
+    assert_drawn(buffer.sample(5.0), (3.0, 1.0, 4.0), 90.0)
+
+
+def test_before_the_first_update():
+    buffer = moving()
+    assert_drawn(buffer.sample(1.02), (0.0, 1.0, 0.0), 0.0)
+    assert_drawn(buffer.sample(1.1), (0.0, 1.0, 0.0), 0.0)
+
+
+def test_between_updates():
+    buffer = moving()
+    assert_drawn(buffer.sample(1.125), (0.5, 1.0, 0.0), 5.0)
+    assert_drawn(buffer.sample(1.16), (1.2, 1.0, 0.0), 12.0)
+    assert_drawn(buffer.sample(1.2), (2.0, 1.0, 0.0), 20.0)
+
+
+def test_after_the_newest_update():
+    buffer = moving()
+    # The last movement goes on for max_extrapolation
+    assert_drawn(buffer.sample(1.25), (3.0, 1.0, 0.0), 30.0)
+    # then is taken back over the same time
+    assert_drawn(buffer.sample(1.35), (3.0, 1.0, 0.0), 30.0)
+    assert_drawn(buffer.sample(1.5), (2.0, 1.0, 0.0), 20.0)
+    assert_drawn(buffer.sample(10.0), (2.0, 1.0, 0.0), 20.0)
+
+
+def test_drawn_the_delay_behind():
+    # The same moment of the player's movement shows up exactly the delay later
+    for delay in (0.05, INTERPOLATION_DELAY, 0.2):
+        assert_drawn(moving(delay).sample(1.025 + delay), (0.5, 1.0, 0.0), 5.0)
+
+
+def test_sampling_drops_only_updates_no_longer_needed():
+    buffer = moving()
+    buffer.sample(1.175)
+    assert len(buffer) == 2
+    assert_drawn(buffer.sample(1.175), (1.5, 1.0, 0.0), 15.0)
+
+
+def test_teleport_is_drawn_as_a_jump():
+    buffer = moving()
+    buffer.push(1.15, (50.0, 1.0, 0.0), 30.0)
+    assert len(buffer) == 1
+    assert_drawn(buffer.sample(1.2), (50.0, 1.0, 0.0), 30.0)
+
+
+def test_long_pause_counts_as_standing_still():
+    buffer = moving()
+    buffer.push(2.0, (3.0, 1.0, 0.0), 30.0)
+    # Until about one update before the new one the player stood where it was last seen
+    assert_drawn(buffer.sample(1.8), (2.0, 1.0, 0.0), 20.0)
+    assert_drawn(buffer.sample(2.1), (3.0, 1.0, 0.0), 30.0)
+
+
+def test_updates_in_the_same_read_keep_the_newest():
+    buffer = InterpolationBuffer()
+    buffer.push(1.0, (0.0, 1.0, 0.0), 0.0)
+    buffer.push(1.0, (1.0, 1.0, 0.0), 10.0)
+    assert len(buffer) == 1
+    assert_drawn(buffer.sample(1.0), (1.0, 1.0, 0.0), 10.0)
+
+
+def test_lerp_angle_turns_the_short_way():
+    assert lerp_angle(350.0, 10.0, 0.5) % 360 == pytest.approx(0.0)
+    assert lerp_angle(10.0, 350.0, 0.25) == pytest.approx(5.0)
@@ -0,0 +1,80 @@
+"""
+The per-client send queue: keyed frames coalesce, reliable ones keep their order, the limit bounds the depth.
+
+Run with: python -m pytest tests
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "server")))
+
+from outbox import WRITE_CHUNK, Outbox
+
+
+def flush(outbox: Outbox) -> bytes:
+    written = b""
+    while outbox:
+        data = bytes(outbox.fill())
+        outbox.consume(len(data))
+        written += data
+    return written
+
+
+def test_newer_snapshot_replaces_the_unsent_one():
+    outbox = Outbox(limit=10)
+    outbox.push(b"join;")
+    outbox.push(b"snap1;", key="snapshot")
+    outbox.push(b"bullet;")
+    outbox.push(b"snap2;", key="snapshot")
+    outbox.push(b"moved;", key="moved")
+    outbox.push(b"snap3;", key="snapshot")
+
+    assert outbox.depth == 4
+    assert outbox.coalesced == 2
+    assert outbox.queued_bytes == len(b"join;bullet;moved;snap3;")
+    # Reliable frames keep their order, the latest snapshot goes where it was queued last
+    assert flush(outbox) == b"join;bullet;moved;snap3;"
+    assert outbox.depth == 0 and outbox.queued_bytes == 0
+
+
+def test_snapshot_already_in_the_write_buffer_is_not_replaced():
+    outbox = Outbox(limit=10)
+    outbox.push(b"snap1;", key="snapshot")
+    assert bytes(outbox.fill()) == b"snap1;"
+    outbox.push(b"snap2;", key="snapshot")
+    assert outbox.coalesced == 0
+    assert flush(outbox) == b"snap1;snap2;"
+
+
+def test_limit_counts_only_queued_frames():
+    outbox = Outbox(limit=3)
+    for _ in range(50):
+        assert outbox.push(b"snap;", key="snapshot")
+    assert outbox.depth == 1
+    assert outbox.push(b"a")
+    assert outbox.push(b"b")
+    assert not outbox.push(b"c")
+
+
+def test_fill_moves_a_chunk_at_a_time():
+    outbox = Outbox(limit=1000)
+    frame = bytes(1000)
+    for _ in range(200):
+        outbox.push(frame)
+    first = len(outbox.fill())
+    assert WRITE_CHUNK <= first < WRITE_CHUNK + len(frame)
+    assert len(flush(outbox)) == 200 * len(frame)
+
+
+def test_lag_runs_while_data_waits():
+    outbox = Outbox(limit=10)
+    assert outbox.lag(100.0) == 0.0
+    outbox.push(b"snapshot")
+    filled = len(outbox.fill())
+    outbox.consume(2)
+    assert outbox.stalled_since is not None
+    assert outbox.lag(outbox.stalled_since + 1.5) == 1.5
+    outbox.consume(filled - 2)
+    assert outbox.lag(100.0) == 0.0
@@ -0,0 +1,132 @@
+"""
+Client side prediction against a server running the same movement.
+
+Run with: python -m pytest tests
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "game")))
+
+from shared.movement import MovementModel, MovementState
+from shared.protocol import BINARY
+from prediction import MovementPredictor
+
+START = (0.0, 1.0, 0.0)
+DT = 1 / 60
+
+
+class Server:
+    """The server's side of one player: it applies the commands it has received so far."""
+
+    def __init__(self, model: MovementModel, codec=None, position=START):
+        self.model = model
+        self.codec = codec
+        self.state = MovementState(position)
+        self.seq = 0
+
+    def apply(self, command: dict):
+        if self.codec is not None:
+            command = self.codec.decode(self.codec.encode(command))
+        self.model.step(self.state, command)
+        self.seq = command["seq"]
+
+    def report(self) -> dict:
+        msg = self.state.to_message(self.seq)
+        return self.codec.decode(self.codec.encode(msg)) if self.codec is not None else msg
+
+
+@pytest.fixture(scope="module")
+def model():
+    return MovementModel()
+
+
+def walk(predictor: MovementPredictor, frames: int, yaw: float = 30.0, jump_at: int = None) -> list:
+    return [
+        predictor.apply(1, 0, yaw + frame, frame % 20 < 10, frame == jump_at, DT) for frame in range(frames)
+    ]
+
+
+@pytest.mark.parametrize("codec", [None, BINARY], ids=["plain", "binary"])
+def test_reconcile_with_commands_in_flight_changes_nothing(model, codec):
+    predictor = MovementPredictor(model, START, codec)
+    server = Server(model, codec)
+    commands = walk(predictor, 60, jump_at=5)
+    predicted = predictor.position
+
+    for acked in (10, 25, 59, 60):
+        for command in commands[server.seq:acked]:
+            server.apply(command)
+        assert not predictor.reconcile(server.report())
+        assert predictor.position == pytest.approx(predicted)
+        assert len(predictor.pending) == 60 - acked
+    assert predictor.corrections == 0
+
+
+def test_reconcile_corrects_a_wrong_prediction(model):
+    predictor = MovementPredictor(model, START)
+    # The server had the player somewhere else, e.g. pushed by something the client did not know about
+    server = Server(model, position=(5.0, 1.0, 0.0))
+    commands = walk(predictor, 30)
+    for command in commands[:20]:
+        server.apply(command)
+
+    assert predictor.reconcile(server.report())
+    assert predictor.corrections == 1
+    # The server's state with the ten commands it has not seen applied on top
+    for command in commands[20:]:
+        server.apply(command)
+    assert predictor.position == pytest.approx(server.state.position)
+
+
+def test_old_and_repeated_reports_are_ignored(model):
+    predictor = MovementPredictor(model, START)
+    server = Server(model)
+    commands = walk(predictor, 20)
+    for command in commands[:5]:
+        server.apply(command)
+    old = server.report()
+    for command in commands[5:15]:
+        server.apply(command)
+    assert not predictor.reconcile(server.report())
+    position = predictor.position
+
+    # UDP may deliver reports late or twice
+    old["position"] = (50.0, 1.0, 50.0)
+    assert not predictor.reconcile(old)
+    assert not predictor.reconcile(server.report())
+    assert predictor.position == position
+    assert predictor.acked_seq == 15
+
+
+def test_reports_from_before_a_teleport_are_ignored(model):
+    predictor = MovementPredictor(model, START)
+    server = Server(model)
+    for command in walk(predictor, 10):
+        server.apply(command)
+    predictor.teleport((40.0, 1.0, -40.0))
+    assert not predictor.pending
+
+    # The server still reports the old life's last command
+    assert not predictor.reconcile(server.report())
+    assert predictor.position == (40.0, 1.0, -40.0)
+
+    # Once it took the respawn, reports of the new life's commands apply again
+    server.state = MovementState((40.0, 1.0, -40.0))
+    commands = walk(predictor, 10)
+    for command in commands[:4]:
+        server.apply(command)
+    predicted = predictor.position
+    assert not predictor.reconcile(server.report())
+    assert predictor.position == pytest.approx(predicted)
+
+
+def test_pending_commands_are_bounded(model):
+    predictor = MovementPredictor(model, START)
+    walk(predictor, predictor.pending.maxlen + 50)
+    assert len(predictor.pending) == predictor.pending.maxlen
+    assert predictor.pending[-1]["seq"] == predictor.seq
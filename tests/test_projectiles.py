@@ -0,0 +1,126 @@
+"""
+Server side bullets: lag compensated hits and the shots the server refuses to simulate.
+
+Run with: python -m pytest tests
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "server")))
+
+from shared.ballistics import DEFAULT_SPEED, HEADSHOT_MULTIPLIER, HEAD_OFFSET
+from history import PositionHistory
+from projectiles import MAX_DAMAGE, MAX_REWIND, MAX_SPEED, ProjectileSimulator, shot_speed, valid_shot
+
+STEP = 0.05
+
+
+def shot(**fields) -> dict:
+    # Fired from the origin along +z, level with a standing player's body
+    msg = {"object": "bullet", "position": (0.0, 1.0, 0.0), "damage": 20, "direction": 0.0, "x_direction": 0.0}
+    msg.update(fields)
+    return msg
+
+
+def target_that_stepped_aside() -> tuple:
+    # Player "2" stood in the line of fire 10 units ahead until 0.8 s, then stepped 5 units aside
+    players = {"2": {"position": (5.0, 1.0, 10.0), "health": 100}}
+    history = PositionHistory()
+    for when, x in ((0.0, 0.0), (0.4, 0.0), (0.8, 0.0), (0.9, 5.0), (1.0, 5.0)):
+        history.record("2", when, (x, 1.0, 10.0))
+    return players, history
+
+
+def fly(simulator: ProjectileSimulator, players: dict, history, start: float = 1.0) -> list:
+    hits = []
+    now = start
+    while simulator.projectiles:
+        now += STEP
+        hits.extend(simulator.step(now, STEP, players, history))
+    return hits
+
+
+def test_rewound_shot_hits_where_the_shooter_saw_the_target():
+    simulator = ProjectileSimulator(boxes=[])
+    players, history = target_that_stepped_aside()
+    simulator.spawn("1", shot(), rewind=0.5)
+    hits = fly(simulator, players, history)
+    assert [(target, damage) for _, target, damage in hits] == [("2", 20)]
+
+
+def test_shot_without_rewind_misses_a_target_that_moved():
+    simulator = ProjectileSimulator(boxes=[])
+    players, history = target_that_stepped_aside()
+    simulator.spawn("1", shot(), rewind=0.0)
+    assert fly(simulator, players, history) == []
+
+
+def test_rewind_is_capped():
+    simulator = ProjectileSimulator(boxes=[])
+    assert simulator.spawn("1", shot(), rewind=10.0).rewind == MAX_REWIND
+    assert simulator.spawn("1", shot(), rewind=-1.0).rewind == 0.0
+
+
+def test_headshot_multiplies_damage():
+    simulator = ProjectileSimulator(boxes=[])
+    players = {"2": {"position": (0.0, 1.0, 10.0), "health": 100}}
+    simulator.spawn("1", shot(position=(0.0, 1.0 + HEAD_OFFSET[1], 0.0)))
+    hits = fly(simulator, players, PositionHistory())
+    assert [(target, damage) for _, target, damage in hits] == [("2", 20 * HEADSHOT_MULTIPLIER)]
+
+
+def test_walls_stop_bullets():
+    players = {"2": {"position": (0.0, 1.0, 10.0), "health": 100}}
+    simulator = ProjectileSimulator(boxes=[((0.0, 1.0, 5.0), (4.0, 4.0, 1.0))])
+    simulator.spawn("1", shot())
+    assert fly(simulator, players, PositionHistory()) == []
+    assert not simulator.projectiles
+
+
+def test_shooter_teammates_and_dead_players_are_not_hit():
+    simulator = ProjectileSimulator(boxes=[])
+    # Odd ids are on the red team
+    players = {
+        "1": {"position": (0.0, 1.0, 5.0), "health": 100},
+        "3": {"position": (0.0, 1.0, 10.0), "health": 100},
+        "4": {"position": (0.0, 1.0, 15.0), "health": 0},
+    }
+    simulator.spawn("1", shot(team="red"))
+    assert fly(simulator, players, PositionHistory()) == []
+
+
+def test_damage_and_speed_are_clamped():
+    simulator = ProjectileSimulator(boxes=[])
+    projectile = simulator.spawn("1", shot(damage=10 ** 6, speed=10 ** 6))
+    assert projectile.damage == MAX_DAMAGE
+    assert projectile.velocity[2] == pytest.approx(MAX_SPEED)
+    assert shot_speed(shot()) == DEFAULT_SPEED
+    assert shot_speed(shot(speed=-5)) == 0.0
+
+
+@pytest.mark.parametrize("fields", [
+    {"position": (0.0, 1.0)},
+    {"position": (0.0, 1.0, 0.0, 0.0)},
+    {"position": (float("inf"), 1.0, 0.0)},
+    {"position": (0.0, float("nan"), 0.0)},
+    {"position": (1000.0, 1.0, 0.0)},
+    {"position": (0.0, -50.0, 0.0)},
+    {"position": "abc"},
+    {"direction": float("inf")},
+    {"x_direction": "up"},
+    {"direction": None},
+])
+def test_invalid_shots_are_refused(fields):
+    msg = shot(**fields)
+    assert not valid_shot(msg)
+    with pytest.raises(ValueError):
+        ProjectileSimulator(boxes=[]).spawn("1", msg)
+
+
+def test_valid_shot():
+    assert valid_shot(shot())
+    assert valid_shot(shot(position=[139, 99, -139], direction=359.9, x_direction=-90))
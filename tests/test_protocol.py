@@ -0,0 +1,121 @@
+"""
+Every message kind through both codecs and back.
+
+Run with: python -m pytest tests
+"""
+
+import math
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from shared.protocol import BINARY, CODEC_JSON, CODECS, JSON, choose_codec
+
+MESSAGES = {
+    "player": {
+        "object": "player", "id": "7", "position": (-41.83, 1.0, 23.41), "rotation": 287.44, "health": 78,
+        "joined": False, "left": False
+    },
+    "join": {
+        "id": "3", "object": "player", "username": "alice", "position": (0.0, 1.0, -60.0), "health": 100,
+        "joined": True, "left": False
+    },
+    "leave": {"id": "3", "object": "player", "joined": False, "left": True},
+    "snapshot": {
+        "object": "snapshot", "tick": 1234, "baseline": 1230,
+        "players": [
+            {"id": "1", "position": (1.5, 1.0, -2.25), "rotation": 90.0, "health": 100},
+            {"id": "2", "rotation": 180.0},
+            {"id": "4", "health": 20},
+        ],
+        "removed": ["5", "6"]
+    },
+    "keyframe": {
+        "object": "snapshot", "tick": 7, "baseline": 0,
+        "players": [{"id": "1", "position": (0.0, 1.0, 0.0), "rotation": 0.0, "health": 100}],
+        "removed": []
+    },
+    "ack": {"object": "ack", "tick": 1234},
+    "welcome": {
+        "object": "welcome",
+        "players": [
+            {"id": "1", "username": "bob", "position": (3.0, 1.0, 4.0), "health": 100},
+            {"id": "2", "username": "émile", "position": (-3.0, 1.0, 4.0), "health": 35},
+        ]
+    },
+    "empty_welcome": {"object": "welcome", "players": []},
+    "udp_ready": {"object": "udp_ready"},
+    "input": {
+        "object": "input", "seq": 42, "dt": 0.016, "forward": 1, "right": -1, "yaw": 135.0, "sprint": True,
+        "jump": False
+    },
+    "moved": {
+        "object": "moved", "seq": 42, "position": (12.345678, 1.5, -7.25), "air_time": 0.125, "jump_time": 0.0,
+        "grounded": False
+    },
+    "bullet": {
+        "object": "bullet", "position": (10.0, 2.5, -4.0), "damage": 25, "direction": 270.0, "x_direction": -12.5,
+        "speed": 80.0, "tick": 99, "team": "red"
+    },
+    "health_update": {"object": "health_update", "id": "9", "health": 55},
+    "restart": {"object": "restart", "seed": 123456},
+}
+
+# Binary positions are quantized to 1 cm and angles to a 16 bit turn
+TOLERANCE = 0.01
+
+
+def assert_close(decoded, original, path="msg"):
+    if isinstance(original, dict):
+        assert isinstance(decoded, dict), path
+        assert decoded.keys() == original.keys(), path
+        for key in original:
+            assert_close(decoded[key], original[key], f"{path}.{key}")
+    elif isinstance(original, (list, tuple)):
+        assert isinstance(decoded, (list, tuple)), path
+        assert len(decoded) == len(original), path
+        for index, (a, b) in enumerate(zip(decoded, original)):
+            assert_close(a, b, f"{path}[{index}]")
+    elif isinstance(original, float):
+        assert math.isclose(decoded, original, abs_tol=TOLERANCE), f"{path}: {decoded} != {original}"
+    else:
+        assert decoded == original, path
+
+
+@pytest.mark.parametrize("codec", [JSON, BINARY], ids=lambda codec: codec.name)
+@pytest.mark.parametrize("kind", MESSAGES)
+def test_round_trip(codec, kind):
+    msg = MESSAGES[kind]
+    assert_close(codec.decode(codec.encode(msg)), msg)
+
+
+def test_binary_decode_is_stable():
+    # Encoding what was decoded gives the same bytes, so quantization does not drift when messages are relayed
+    for msg in MESSAGES.values():
+        payload = BINARY.encode(msg)
+        assert BINARY.encode(BINARY.decode(payload)) == payload
+
+
+def test_binary_yaw_wraps_around():
+    msg = dict(MESSAGES["player"], rotation=-90.0)
+    assert BINARY.decode(BINARY.encode(msg))["rotation"] == pytest.approx(270.0, abs=TOLERANCE)
+
+
+def test_binary_rejects_unknown_kinds():
+    with pytest.raises(ValueError):
+        BINARY.encode({"object": "chat", "text": "hi"})
+    with pytest.raises(ValueError):
+        BINARY.decode(b"\xff")
+
+
+def test_choose_codec():
+    assert choose_codec(["binary", "json"]) == "binary"
+    assert choose_codec(["msgpack", "json"]) == "json"
+    assert choose_codec(None) == CODEC_JSON
+    # Whatever a peer puts in its offer, only known names are picked
+    assert choose_codec([[], {}, None, 7, "binary"]) == "binary"
+    assert choose_codec([["binary"]]) == CODEC_JSON
+    assert set(CODECS) == {"binary", "json"}
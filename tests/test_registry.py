@@ -0,0 +1,88 @@
+"""
+Player identifiers and the table of connected players.
+
+Run with: python -m pytest tests
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "server")))
+
+from registry import MAX_ID, IdAllocator, PlayerRegistry
+
+
+def test_ids_run_out_and_come_back():
+    ids = IdAllocator(3)
+    taken = [ids.acquire() for _ in range(3)]
+    assert taken == ["1", "2", "3"]
+    assert ids.acquire() is None
+    assert len(ids) == 3 and ids.available() == 0
+
+    ids.release("2")
+    assert ids.acquire() == "2"
+
+
+def test_released_ids_are_reused_as_late_as_possible():
+    ids = IdAllocator(4)
+    first = ids.acquire()
+    ids.release(first)
+    assert [ids.acquire() for _ in range(4)] == ["2", "3", "4", first]
+
+
+def test_releasing_twice_or_an_unknown_id_changes_nothing():
+    ids = IdAllocator(2)
+    player = ids.acquire()
+    ids.release(player)
+    ids.release(player)
+    ids.release("9")
+    assert ids.available() == 2
+    assert len({ids.acquire(), ids.acquire()}) == 2
+
+
+@pytest.mark.parametrize("capacity", [0, -1, MAX_ID + 1])
+def test_capacity_fits_the_binary_codec(capacity):
+    with pytest.raises(ValueError):
+        IdAllocator(capacity)
+
+
+def test_registry_lookups():
+    players = PlayerRegistry()
+    players.add("1", {"username": "alice"})
+    players.add("2", {"username": "bob"})
+    assert len(players) == 2
+    assert "1" in players and "3" not in players
+    assert players["2"]["username"] == "bob"
+    assert players.get("3") is None
+    assert players.remove("1") == {"username": "alice"}
+    assert players.remove("1") is None
+    assert list(players) == ["2"]
+
+
+def test_iteration_survives_joins_and_leaves():
+    players = PlayerRegistry()
+    for player_id in "123":
+        players.add(player_id, {"id": player_id})
+
+    seen = []
+    for player_id, _ in players.items():
+        seen.append(player_id)
+        # A relay that makes players leave and join while it walks the table
+        players.remove("2")
+        players.add("4", {"id": "4"})
+    assert seen == ["1", "3"]
+    assert players.ids() == ("1", "3", "4")
+    assert [player_info["id"] for player_info in players.values()] == ["1", "3", "4"]
+
+
+def test_snapshot_is_rebuilt_only_on_changes():
+    players = PlayerRegistry()
+    players.add("1", {})
+    snapshot = players.ids()
+    players["1"]["health"] = 50
+    assert players.ids() is snapshot
+    players.remove("7")
+    assert players.ids() is snapshot
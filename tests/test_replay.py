@@ -0,0 +1,71 @@
+"""
+Replay clients put recorded ticks on the replay server's clock.
+
+Run with: python -m pytest tests
+"""
+
+import os
+import socket
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "server")))
+
+from shared.framing import encode_frame
+from shared.protocol import CODECS
+from replay import ReplayClient
+
+PLAYER = {
+    "object": "player", "id": "1", "position": (3.0, 1.0, 4.0), "rotation": 90.0, "health": 100, "joined": False,
+    "left": False
+}
+BULLET = {
+    "object": "bullet", "position": (0.0, 1.0, 0.0), "damage": 20, "direction": 0.0, "x_direction": 0.0,
+    "speed": 80.0, "tick": 5000, "team": None
+}
+
+
+@pytest.fixture(params=["json", "binary"])
+def client(request):
+    client = ReplayClient("replayed", "default", request.param)
+    server_end, client.conn = socket.socketpair()
+    client.conn.setblocking(False)
+    client.server_end = server_end
+    yield client
+    client.close()
+    server_end.close()
+
+
+def snapshot(tick: int) -> dict:
+    return {"object": "snapshot", "tick": tick, "baseline": 0, "players": [], "removed": []}
+
+
+def test_acks_and_bullets_follow_the_received_snapshots(client):
+    codec = CODECS[client.codec.name]
+    recorded_ack = codec.encode({"object": "ack", "tick": 4321})
+
+    # Nothing arrived yet, so there is nothing to acknowledge and bullets rewind nothing
+    assert client.rewrite(recorded_ack) is None
+    assert codec.decode(client.rewrite(codec.encode(BULLET)))["tick"] == 0
+
+    for tick in (12, 14, 13):
+        client.server_end.sendall(encode_frame(codec.encode(snapshot(tick))))
+    client.server_end.sendall(encode_frame(codec.encode(PLAYER)))
+    assert client.drain()
+    assert client.tick == 14
+    assert codec.decode(client.rewrite(recorded_ack)) == {"object": "ack", "tick": 14}
+    assert codec.decode(client.rewrite(codec.encode(BULLET)))["tick"] == 14
+
+
+def test_other_messages_are_sent_as_recorded(client):
+    payload = client.codec.encode(PLAYER)
+    assert client.rewrite(payload) is payload
+
+
+def test_drain_reports_a_closed_connection(client):
+    client.server_end.sendall(encode_frame(client.codec.encode(snapshot(3))))
+    client.server_end.close()
+    assert not client.drain()
+    assert client.tick == 3
@@ -0,0 +1,293 @@
+"""
+A live GameServer driven from the test: real sockets on localhost, with the event loop polled by hand.
+
+Run with: python -m pytest tests
+"""
+
+import json
+import os
+import socket
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "server")))
+
+from shared.framing import FrameDecoder, encode_frame, recv_frame
+from shared.map_layout import spawn_position
+from shared.protocol import BINARY
+from main import MAX_JOIN_SIZE, GameServer, decode_handoff, encode_handoff, parse_join
+
+
+class Peer:
+    """One client connection of the test."""
+
+    def __init__(self, conn: socket.socket):
+        self.conn = conn
+        self.decoder = FrameDecoder()
+        self.pending = []
+
+    def send(self, payload: bytes):
+        self.conn.sendall(encode_frame(payload))
+
+    def send_json(self, msg):
+        self.send(json.dumps(msg).encode("utf8"))
+
+    def receive(self) -> dict:
+        return json.loads(recv_frame(self.conn, self.decoder, self.pending))
+
+    def close(self):
+        self.conn.close()
+
+
+class LiveServer:
+    """A GameServer listening on a free port, polled by the test instead of serve_forever."""
+
+    def __init__(self, **options):
+        options.setdefault("stats_interval", 0)
+        self.server = GameServer(addr="127.0.0.1", port=0, udp=False, **options)
+        self.server.start()
+
+    def pump(self, rounds: int = 5):
+        for _ in range(rounds):
+            self.server.poll(0.01)
+
+    def greet(self) -> Peer:
+        # A connection that got its hello but has not joined yet
+        peer = Peer(socket.create_connection(("127.0.0.1", self.server.port), timeout=2))
+        self.pump()
+        hello = peer.receive()
+        assert hello["object"] == "hello"
+        peer.id = hello["id"]
+        return peer
+
+    def connect(self, username: str, codec: str = "json", room: str = None) -> Peer:
+        peer = self.greet()
+        join = {"object": "join", "username": username, "codec": codec}
+        if room is not None:
+            join["room"] = room
+        peer.send_json(join)
+        self.pump()
+        return peer
+
+    def close(self):
+        self.server.close()
+
+
+@pytest.fixture
+def live():
+    live = LiveServer()
+    yield live
+    live.close()
+
+
+def in_game(live: LiveServer, peer: Peer) -> bool:
+    client = live.server.clients.get(peer.id)
+    return client is not None and not client.closed
+
+
+@pytest.mark.parametrize("payload", [
+    b"[1, 2]", b'"hi"', b"null", b"42", b"{not json", b'{"object": "chat", "text": "hi"}',
+    b'{"object": "player", "position": [0, 1], "rotation": 0, "health": 100}',
+    b'{"object": "player", "position": [0, 1e999, 0], "rotation": 0, "health": 100}',
+    b'{"object": "player", "position": "abc", "rotation": 0, "health": 100}',
+    b'{"object": "bullet", "position": [0, 1, 0], "direction": "north", "x_direction": 0, "damage": 10}',
+    b'{"object": "ack", "tick": [1]}',
+    b'{"object": "input", "seq": 1, "dt": 0.016, "forward": 1, "right": 0}',
+])
+def test_malformed_message_is_dropped(live, payload):
+    shooter = live.connect("shooter")
+    other = live.connect("other")
+    before = live.server.metrics.malformed_messages
+
+    shooter.send(payload)
+    live.pump()
+    assert live.server.metrics.malformed_messages == before + 1
+    assert in_game(live, shooter)
+    assert in_game(live, other)
+
+    # The sender's next good message still counts
+    shooter.send_json({"object": "player", "position": [3, 1, 4], "rotation": 90, "health": 100})
+    live.pump()
+    assert live.server.rooms["default"].players[shooter.id]["position"] == [3, 1, 4]
+
+
+def test_garbage_binary_message_is_dropped(live):
+    peer = live.connect("binary", codec="binary")
+    for payload in (b"\x01", b"\xff\x00", b"\x07" + bytes(20)):
+        peer.send(payload)
+    live.pump()
+    assert in_game(live, peer)
+    peer.send(BINARY.encode({"object": "ack", "tick": 0}))
+    live.pump()
+    assert in_game(live, peer)
+
+
+def test_failing_message_only_costs_its_sender(live, monkeypatch):
+    sender = live.connect("sender")
+    other = live.connect("other")
+    handle_message = live.server.handle_message
+
+    def broken(client, msg, raw):
+        if client.id == sender.id:
+            raise RuntimeError("boom")
+        return handle_message(client, msg, raw)
+
+    monkeypatch.setattr(live.server, "handle_message", broken)
+    sender.send_json({"object": "player", "position": [0, 1, 0], "rotation": 0, "health": 100})
+    live.pump()
+    assert not in_game(live, sender)
+    assert in_game(live, other)
+
+    # The loop keeps serving everyone else, including new players
+    late = live.connect("late")
+    assert in_game(live, late)
+
+
+@pytest.mark.parametrize("fields", [
+    {"position": [0, 1]},
+    {"position": [1e999, 1, 0]},
+    {"position": [5000, 1, 0]},
+    {"direction": 1e999},
+])
+def test_impossible_shot_is_dropped(live, fields):
+    shooter = live.connect("shooter")
+    other = live.connect("other")
+    bullet = {"object": "bullet", "position": [0, 1, 0], "damage": 10, "direction": 0, "x_direction": 0}
+    bullet.update(fields)
+    shooter.send_json(bullet)
+    live.pump()
+    assert in_game(live, shooter)
+    assert in_game(live, other)
+    assert not live.server.rooms["default"].projectiles.projectiles
+
+
+def test_fast_vertical_shot_is_routed_with_a_clamped_speed(live):
+    shooter = live.connect("shooter")
+    shooter.send_json({
+        "object": "bullet", "position": [0, 1, 0], "damage": 10, "direction": 0, "x_direction": 90, "speed": 1e300
+    })
+    live.pump()
+    assert in_game(live, shooter)
+    assert len(live.server.rooms["default"].projectiles.projectiles) == 1
+
+
+@pytest.mark.parametrize("join", [
+    {"object": "join", "username": "x", "codec": []},
+    {"object": "join", "username": "x", "codec": {"name": "json"}},
+    {"object": "join", "username": ["x"], "codec": "json"},
+    {"object": "join", "username": "x", "codec": "json", "room": 5},
+])
+def test_malformed_join_is_rejected(live, join):
+    with pytest.raises(ValueError):
+        parse_join(json.dumps(join).encode("utf8"))
+
+    peer = live.greet()
+    peer.send_json(join)
+    live.pump()
+    assert peer.receive() == {"object": "rejected", "reason": "malformed join"}
+    assert live.server.metrics.rejected == 1
+    assert not live.server.handshakes
+
+    # The identifier went back to the pool and the server still takes players
+    assert in_game(live, live.connect("next"))
+
+
+def test_parse_join():
+    assert parse_join(b"old client")[0] == "old client"
+    username, codec, room = parse_join(b'{"object": "join", "username": "x", "codec": "binary", "room": " red "}')
+    assert (username, codec.name, room) == ("x", "binary", "red")
+    assert parse_join(b'{"object": "join", "username": "x"}')[1].name == "json"
+
+
+def test_oversized_join_is_dropped(live):
+    peer = live.greet()
+    peer.send_json({"object": "join", "username": "\u00e9" * MAX_JOIN_SIZE, "codec": "json"})
+    live.pump()
+    assert not live.server.handshakes
+    assert in_game(live, live.connect("next"))
+
+
+def test_handoff_round_trip():
+    join = json.dumps({"object": "join", "username": "\u00e9" * 100}, ensure_ascii=False).encode("utf8")
+    early = [b'{"object": "ack", "tick": 1}', bytes(range(256))]
+    msg = encode_handoff("7", ("127.0.0.1", 5000), join, early, b"\x00\x00")
+    player_id, addr, stream = decode_handoff(msg)
+    assert (player_id, addr) == ("7", ("127.0.0.1", 5000))
+    decoder = FrameDecoder()
+    assert decoder.feed(stream) == [join, *early]
+    assert decoder.pending() == 2
+    # Raw bytes, not escaped text: the handoff is only a few bytes longer than what was read from the client
+    assert len(msg) < len(stream) + 64
+
+
+@pytest.fixture
+def worker():
+    supervisor_end, worker_end = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+    server = GameServer(addr="127.0.0.1", port=0, udp=False, stats_interval=0, control=worker_end)
+    server.start()
+    yield server, supervisor_end
+    server.close()
+    supervisor_end.close()
+
+
+def hand_over(supervisor_end: socket.socket, msg: bytes) -> socket.socket:
+    client_end, server_end = socket.socketpair()
+    socket.send_fds(supervisor_end, [msg], [server_end.fileno()])
+    server_end.close()
+    client_end.settimeout(2)
+    return client_end
+
+
+@pytest.mark.parametrize("msg", [
+    b"\x00",
+    b"\x00\x05{nope",
+    encode_handoff("3", ("127.0.0.1", 1), b"", [], b"")[:-4],
+    encode_handoff("3", ("127.0.0.1", 1), b"", [], b"") + encode_frame(bytes(MAX_JOIN_SIZE + 1)),
+    b"x" * 70000,
+])
+def test_broken_handoff_only_drops_its_connection(worker, msg):
+    server, supervisor_end = worker
+    conn = hand_over(supervisor_end, msg)
+    server.poll(0.1)
+    assert server.running
+    assert conn.recv(100) == b""
+
+    # The next handoff is served as usual
+    join = json.dumps({"object": "join", "username": "next", "codec": "json"}).encode("utf8")
+    peer = Peer(hand_over(supervisor_end, encode_handoff("5", ("127.0.0.1", 2), join, [], b"")))
+    server.poll(0.1)
+    assert peer.receive()["object"] == "room"
+    assert "5" in server.clients
+
+
+def test_server_movement_only_takes_respawns_it_expects():
+    live = LiveServer(server_movement=True)
+    try:
+        peer = live.connect("runner")
+        other = live.connect("other")
+        room = live.server.rooms["default"]
+        client = live.server.clients.get(peer.id)
+        start = client.movement.position
+
+        # Without a restart a reported position is a teleport and is ignored
+        peer.send_json({"object": "player", "position": [50, 1, 50], "rotation": 0, "health": 100})
+        live.pump()
+        assert client.movement.position == start
+        assert room.players[peer.id]["position"] == start
+
+        # After one, the respawn puts the player where the seed says, wherever the client claims to be
+        other.send_json({"object": "restart", "seed": 1234})
+        live.pump()
+        peer.send_json({"object": "player", "position": [50, 1, 50], "rotation": 0, "health": 100})
+        live.pump()
+        assert client.movement.position == spawn_position(1234, peer.id)
+        assert room.players[peer.id]["position"] == spawn_position(1234, peer.id)
+
+        # and only once
+        peer.send_json({"object": "player", "position": [-50, 1, -50], "rotation": 0, "health": 100})
+        live.pump()
+        assert client.movement.position == spawn_position(1234, peer.id)
+    finally:
+        live.close()
@@ -0,0 +1,83 @@
+"""
+Delta snapshots rebuilt on the client from the baseline the server last saw acknowledged.
+
+Run with: python -m pytest tests
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from shared.protocol import BINARY
+from shared.snapshot import SnapshotReceiver, diff_states
+
+
+def delta(tick: int, baseline_tick: int, baseline: dict, current: dict) -> dict:
+    # The snapshot message the server builds for one client
+    players, removed = diff_states(baseline, current)
+    return {"object": "snapshot", "tick": tick, "baseline": baseline_tick, "players": players, "removed": removed}
+
+
+def as_state(msg: dict) -> dict:
+    return {entry["id"]: (tuple(entry["position"]), entry["rotation"], entry["health"]) for entry in msg["players"]}
+
+
+# Positions on the binary codec's centimetre grid and rotations it represents exactly, so states survive encoding
+STATES = {
+    1: {"1": ((0.0, 1.0, 0.0), 0.0, 100), "2": ((5.0, 1.0, 5.0), 90.0, 100)},
+    2: {"1": ((0.5, 1.0, 0.0), 0.0, 100), "2": ((5.0, 1.0, 5.0), 90.0, 80)},
+    3: {"1": ((1.0, 1.0, 0.0), 45.0, 100), "3": ((-2.0, 1.0, 3.0), 180.0, 100)},
+}
+
+
+def test_keyframe_then_delta():
+    receiver = SnapshotReceiver()
+    assert as_state(receiver.receive(delta(1, 0, {}, STATES[1]))) == STATES[1]
+    assert as_state(receiver.receive(delta(2, 1, STATES[1], STATES[2]))) == STATES[2]
+
+
+def test_delta_only_carries_changed_fields():
+    msg = delta(2, 1, STATES[1], STATES[2])
+    assert msg["players"] == [{"id": "1", "position": (0.5, 1.0, 0.0)}, {"id": "2", "health": 80}]
+    assert msg["removed"] == []
+
+
+def test_lost_ack_rebuilds_from_older_baseline():
+    receiver = SnapshotReceiver()
+    receiver.receive(delta(1, 0, {}, STATES[1]))
+    # The ack of tick 2 is lost, so the server still diffs tick 3 against tick 1
+    receiver.receive(delta(2, 1, STATES[1], STATES[2]))
+    full = receiver.receive(delta(3, 1, STATES[1], STATES[3]))
+    assert as_state(full) == STATES[3]
+
+
+def test_lost_snapshot_rebuilds_from_acked_baseline():
+    receiver = SnapshotReceiver()
+    receiver.receive(delta(1, 0, {}, STATES[1]))
+    # Tick 2 never arrives; tick 3 is still diffed against the acknowledged tick 1
+    full = receiver.receive(delta(3, 1, STATES[1], STATES[3]))
+    assert as_state(full) == STATES[3]
+
+
+def test_delta_survives_binary_codec():
+    receiver = SnapshotReceiver()
+    receiver.receive(BINARY.decode(BINARY.encode(delta(1, 0, {}, STATES[1]))))
+    full = receiver.receive(BINARY.decode(BINARY.encode(delta(3, 1, STATES[1], STATES[3]))))
+    assert as_state(full) == STATES[3]
+
+
+def test_unknown_baseline_is_dropped():
+    receiver = SnapshotReceiver(history_size=2)
+    for tick in (1, 2, 3):
+        receiver.receive(delta(tick, 0, {}, STATES[tick]))
+    # Tick 1 fell out of the history, a delta against it can not be rebuilt
+    assert receiver.receive(delta(4, 1, STATES[1], STATES[2])) is None
+    assert receiver.latest_tick == 3
+
+
+def test_stale_snapshot_is_dropped():
+    receiver = SnapshotReceiver()
+    receiver.receive(delta(2, 0, {}, STATES[2]))
+    assert receiver.receive(delta(1, 0, {}, STATES[1])) is None
+    assert receiver.receive(delta(2, 0, {}, STATES[2])) is None